@@ -2,6 +2,8 @@
 ASGI config for logistics project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Live tracking streams (/cargos/<id>/events/) are async views and need to be
+served through this entry point (e.g. uvicorn logistics.asgi:application).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # trigram/tsvector qidiruv lookup-lari (main/search.py)
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -62,16 +63,56 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.DjangoModelPermissions',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        # Har so'rovda User ni bazadan o'qimaslik uchun: 'main.authentication.StatelessJWTAuthentication'
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_PAGINATION_CLASS': 'main.pagination.KeysetPagination',
 }
 
 AUTHENTICATION_BACKENDS = [
-    'main.backends.PhoneNumberAuthBackend',  # Custom backend
-    'django.contrib.auth.backends.ModelBackend',  # Standart backend
+    'main.backends.PhoneNumberAuthBackend',  # Custom backend (username bo'yicha ham ishlaydi)
 ]
 
+# Bir nechta worker bo'lsa umumiy kesh (masalan Redis) ishlatilishi kerak
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Bir martalik kodlar (main/otp.py)
+OTP_CACHE_ALIAS = 'default'
+OTP_TTL = 300  # soniya
+OTP_MAX_ATTEMPTS = 5  # noto'g'ri kiritishlar soni, keyin kod bekor qilinadi
+OTP_SEND_LIMIT = 3  # OTP_SEND_WINDOW ichida bitta raqamga yuboriladigan kodlar soni
+OTP_SEND_WINDOW = 600  # soniya
+
+# Kuzatuv xabarlari uchun pub/sub. Bir nechta worker bo'lsa: 'main.pubsub.PostgresBroker'
+TRACKING_PUBSUB_BACKEND = 'main.pubsub.InMemoryBroker'
+TRACKING_STREAM_KEEPALIVE = 15  # soniya
+
+# Stateless JWT (main.authentication): token versiyalari va ruxsatlar keshi
+JWT_STATE_CACHE_ALIAS = 'default'
+JWT_STATE_CACHE_TIMEOUT = 3600  # soniya
+
+# Ruxsatlar keshi (main.permissions), guruh o'zgarishlari signal orqali yangilanadi
+PERMISSION_CACHE_ALIAS = 'default'
+PERMISSION_CACHE_TIMEOUT = 86400  # soniya
+
+# Viloyat/tuman ma'lumotnomasi versiyasi (main.reference) shu keshda saqlanadi
+REFERENCE_CACHE_ALIAS = 'default'
+
+# Ro'yxatlar javob keshi (main.response_cache). Signal yubormaydigan o'zgarishlar shu vaqtdan ko'p eskirmaydi
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 30  # soniya
+
+# /changes/ PostgreSQL da faqat tugagan tranzaksiyalarning yozuvlarini beradi (ChangeLog.feed).
+# Boshqa bazalarda esa faqat shuncha soniyadan eski yozuvlarni: yozgandan keyin bundan kechroq
+# commit bo'lgan tranzaksiyaning o'zgarishlari mijozga yetib bormaydi. Qiymat eng uzoq yozuvchi
+# tranzaksiyadan (Bid.accept, import) zaxira bilan katta bo'lsin
+CHANGE_FEED_SETTLE = 10  # soniya
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Your Project API',
     'DESCRIPTION': 'Your project description',
@@ -199,6 +240,14 @@ STATICFILES_DIRS = [ os.path.join(BASE_DIR, 'staticfiles')]
 
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Media fayllarni kim yuboradi (main.views.serve_media - ruxsat har doim Django da tekshiriladi):
+# None - Django o'zi (faqat DEBUG da, aks holda ImproperlyConfigured),
+# 'x-accel' - nginx: location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+# 'x-sendfile' - Apache mod_xsendfile / lighttpd. MEDIA_ROOT veb-serverda ochiq joylashtirilmasin
+MEDIA_DELIVERY = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Shundan katta yuklamalar xotirada emas, vaqtinchalik faylda saqlanadi va storage ga ko'chiriladi
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
 
 
 # Default primary key field type
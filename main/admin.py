@@ -1,10 +1,111 @@
-from django.contrib import admin
+from django import forms
+from django.apps import apps
+from django.contrib import admin, messages
+from django.contrib.admin.widgets import AdminFileWidget
 from django.contrib.auth.admin import UserAdmin
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.db import models
+from django.utils import timezone
+from django.utils.html import format_html
+from .images import derivative_url
+from .importers import IMPORTERS, detect_format, open_upload, read_rows
 from .models import User, Driver, Tracking, Vehicle, Payment, Cargo, Region, AdministrativeUnit, DeliveryConfirmation, OwnerDispatcher, DispatcherOrder, Bid
+from .pagination import EstimatedCountPaginator
+from .response_cache import response_cache
 from django.utils.translation import gettext_lazy as _
 # Register your models here.
 
-class CustomUserAdmin(UserAdmin):
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Katta jadvallar uchun: taxminiy son (COUNT(*) siz), filtrsiz umumiy son so'ralmaydi"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class AutocompleteScopeMixin:
+    """
+    Autocomplete natijalarini manba admindagi formfield_for_foreignkey queryseti bilan cheklaydi
+    (masalan, faqat tasdiqlangan haydovchilar), aks holda qidiruvda hamma yozuvlar chiqadi.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        # Parametrlar AutocompleteJsonView tomonidan allaqachon tekshirilgan
+        if request.path.endswith('/autocomplete/') and {'app_label', 'model_name', 'field_name'} <= request.GET.keys():
+            source_model = apps.get_model(request.GET['app_label'], request.GET['model_name'])
+            db_field = source_model._meta.get_field(request.GET['field_name'])
+            source_admin = self.admin_site._registry.get(source_model)
+            if source_admin is not None and (db_field.many_to_one or db_field.one_to_one):
+                formfield = source_admin.formfield_for_foreignkey(db_field, request)
+                queryset = queryset.filter(pk__in=formfield.queryset.values('pk'))
+        return queryset, may_have_duplicates
+
+
+class BulkImportForm(forms.Form):
+    file = forms.FileField(label="Fayl (CSV yoki NDJSON)")
+    dry_run = forms.BooleanField(label="Faqat tekshirish", required=False)
+
+
+class BulkImportAdminMixin:
+    """Ro'yxat sahifasiga "Import" tugmasi: main.importers orqali fayldan ommaviy yaratish"""
+    import_kind = None
+    change_list_template = 'admin/main/change_list_import.html'
+    max_reported_errors = 50
+
+    def get_urls(self):
+        name = f"{self.opts.app_label}_{self.opts.model_name}_import"
+        return [path('import/', self.admin_site.admin_view(self.import_view), name=name)] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = BulkImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            importer = IMPORTERS[self.import_kind](dry_run=form.cleaned_data['dry_run'])
+            result = importer.run(read_rows(open_upload(upload), detect_format(upload.name)))
+            action = "tekshirildi" if form.cleaned_data['dry_run'] else "yaratildi"
+            messages.success(request, f"{result.rows} ta qator, {result.created} ta {action}, {len(result.errors)} ta xato.")
+            for number, errors in result.errors[:self.max_reported_errors]:
+                details = "; ".join(f"{field}: {' '.join(map(str, texts))}" for field, texts in errors.items())
+                messages.warning(request, f"{number}-qator: {details}")
+            return redirect(f"admin:{self.opts.app_label}_{self.opts.model_name}_changelist")
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.opts,
+            'form': form,
+            'import_kind': self.import_kind,
+            'title': f"{self.opts.verbose_name_plural.capitalize()}: import",
+        }
+        return TemplateResponse(request, 'admin/main/bulk_import.html', context)
+
+
+class DerivativeImageWidget(AdminFileWidget):
+    """Asl rasm o'rniga kichik nusxa (thumbnail), bosilganda WebP preview ochiladi"""
+    template_name = 'admin/main/widgets/derivative_image.html'
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        if value and getattr(value, 'url', None):
+            context['widget']['thumbnail_url'] = derivative_url(value, 'thumbnail')
+            context['widget']['preview_url'] = derivative_url(value, 'preview')
+        return context
+
+
+def thumbnail_html(fieldfile):
+    if not fieldfile:
+        return "-"
+    return format_html(
+        '<a href="{}" target="_blank"><img src="{}" style="max-height: 48px" loading="lazy"></a>',
+        derivative_url(fieldfile, 'preview'), derivative_url(fieldfile, 'thumbnail'),
+    )
+
+
+class CustomUserAdmin(AutocompleteScopeMixin, UserAdmin):
     model = User
     list_display = ['username', 'first_name', 'last_name', 'phone_number', 'role'] 
     search_fields = ('username', 'first_name', 'last_name')
@@ -26,31 +127,50 @@ class CustomUserAdmin(UserAdmin):
     )
     
 
-class DriverAdmin(admin.ModelAdmin):
-    list_display = ('carrier', 'license_number', 'is_verified')
+class DriverAdmin(BulkImportAdminMixin, AutocompleteScopeMixin, admin.ModelAdmin):
+    import_kind = 'drivers'  # foydalanuvchi + haydovchi + transport
+    list_display = ('carrier', 'license_number', 'license_thumbnail', 'is_verified')
     list_filter = ('is_verified',)
+    list_select_related = ('carrier',)
     search_fields = ('carrier__username', 'license_number', 'passport_number')
+    ordering = ('-id',)  # autocomplete sahifalari barqaror bo'lishi uchun (modelda ordering yo'q)
+    autocomplete_fields = ('carrier',)
+    formfield_overrides = {models.ImageField: {'widget': DerivativeImageWidget}}
     actions = ['verify_drivers']
 
+    @admin.display(description="Guvohnoma")
+    def license_thumbnail(self, obj):
+        return thumbnail_html(obj.license_image)
+
     @admin.action(description="Haydovchini tasdiqlash")
     def verify_drivers(self, request, queryset):
-        queryset.update(is_verified=True)
+        queryset.update(is_verified=True, updated_at=timezone.now())
+        response_cache.bump(queryset.model)  # .update() signal yubormaydi
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
-        if db_field.name == "driver":
+        if db_field.name == "carrier":
             kwargs["queryset"] = User.objects.filter(role="carrier")  
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
-class OwnerDispatcherAdmin(admin.ModelAdmin):
-    list_display = ('user', 'passport_number', 'is_verified')  # Ko‘rinadigan maydonlar
+class OwnerDispatcherAdmin(AutocompleteScopeMixin, admin.ModelAdmin):
+    list_display = ('user', 'passport_number', 'passport_thumbnail', 'is_verified')  # Ko‘rinadigan maydonlar
     list_filter = ('is_verified',)  # Filter qilish imkoniyati
+    list_select_related = ('user',)  # __str__ user ga murojaat qiladi
     search_fields = ('user__username', 'passport_number')  # Qidirish imkoniyati
+    ordering = ('-id',)  # autocomplete sahifalari barqaror bo'lishi uchun (modelda ordering yo'q)
+    autocomplete_fields = ('user',)
+    formfield_overrides = {models.ImageField: {'widget': DerivativeImageWidget}}
     actions = ['verify_owners_dispatchers']  # Action tugmasi
 
+    @admin.display(description="Pasport")
+    def passport_thumbnail(self, obj):
+        return thumbnail_html(obj.passport_image)
+
     @admin.action(description="Owner va Dispatcherni tasdiqlash")
     def verify_owners_dispatchers(self, request, queryset):
-        queryset.update(is_verified=True)
+        queryset.update(is_verified=True, updated_at=timezone.now())
+        response_cache.bump(queryset.model)  # .update() signal yubormaydi
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == "user":
@@ -58,7 +178,10 @@ class OwnerDispatcherAdmin(admin.ModelAdmin):
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
-class DeliveryAdmin(admin.ModelAdmin):
+class DeliveryAdmin(LargeTableAdmin):
+    list_display = ('id', 'cargo', 'driver', 'is_delivered_by_driver', 'is_received_by_receiver')
+    list_select_related = ('cargo__customer__user', 'driver__carrier')
+    autocomplete_fields = ('cargo', 'driver', 'receiver')
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == "driver":
             kwargs["queryset"] = Driver.objects.filter(is_verified=True)  
@@ -67,28 +190,51 @@ class DeliveryAdmin(admin.ModelAdmin):
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
-class TrackingAdmin(admin.ModelAdmin):
+class TrackingAdmin(LargeTableAdmin):
+    list_display = ('id', 'cargo', 'driver', 'status', 'last_updated')
+    list_filter = ('status',)  # tracking_status_idx
+    list_select_related = ('cargo__customer__user', 'driver__carrier')
+    autocomplete_fields = ('cargo', 'driver', 'vehicle')
+    readonly_fields = ('last_position',)  # GPS nuqtalar jadvali juda katta, tanlash ro'yxati kerak emas
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == "driver":
             kwargs["queryset"] = Driver.objects.filter(is_verified=True) 
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
-class CargoAdmin(admin.ModelAdmin):
+class CargoAdmin(BulkImportAdminMixin, AutocompleteScopeMixin, LargeTableAdmin):
+    import_kind = 'cargos'
+    list_display = ('id', 'customer', 'cargo_type', 'cargo_status', 'loading_time')
+    list_filter = ('cargo_status',)  # cargo_status_idx
+    list_select_related = ('customer__user',)  # __str__ customer.user ga murojaat qiladi
+    search_fields = ('=id', 'customer__user__username', 'cargo_type')
+    autocomplete_fields = ('customer',)
+    exclude = ('search_document',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('search_document')
+
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == "customer":
-            kwargs["queryset"] = User.objects.filter(role="owner", is_verified=True)  
+            kwargs["queryset"] = OwnerDispatcher.objects.filter(user__role="owner", is_verified=True)  
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
     
 
-class BidAdmin(admin.ModelAdmin):
+class BidAdmin(LargeTableAdmin):
+    list_display = ('id', 'driver', 'cargo', 'proposed_price', 'status', 'created_at')
+    list_filter = ('status',)  # bid_status_idx
+    list_select_related = ('driver__carrier', 'cargo__customer__user')  # __str__ ikkalasiga ham murojaat qiladi
+    autocomplete_fields = ('driver', 'cargo')
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == "driver":
             kwargs["queryset"] = Driver.objects.filter(is_verified=True)  
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
-class DispatcherOrderAdmin(admin.ModelAdmin):
+class DispatcherOrderAdmin(LargeTableAdmin):
+    list_display = ('id', 'dispatcher', 'cargo', 'assigned_driver', 'created_at')
+    list_select_related = ('dispatcher__user', 'cargo__customer__user', 'assigned_driver__carrier')
+    autocomplete_fields = ('dispatcher', 'cargo', 'assigned_driver')
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == "assigned_driver":
             kwargs["queryset"] = Driver.objects.filter(is_verified=True)  
@@ -96,14 +242,29 @@ class DispatcherOrderAdmin(admin.ModelAdmin):
             kwargs["queryset"] = OwnerDispatcher.objects.filter(user__role="dispatcher", is_verified=True)  # Bu yerda qidiriladigan foydalanuvchilarni o'qib ko’ring 
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
+class PaymentAdmin(LargeTableAdmin):
+    list_display = ('id', 'cargo', 'amount', 'created_at')
+    list_select_related = ('cargo__customer__user',)
+    autocomplete_fields = ('cargo',)
+
+
+class VehicleAdmin(AutocompleteScopeMixin, admin.ModelAdmin):
+    list_display = ('vehicle', 'plate_number', 'driver', 'capacity', 'capacity_unit')
+    list_select_related = ('driver__carrier',)
+    search_fields = ('plate_number', 'vehicle')
+    ordering = ('-id',)  # autocomplete sahifalari barqaror bo'lishi uchun (modelda ordering yo'q)
+    autocomplete_fields = ('driver',)
+
+
 admin.site.register(OwnerDispatcher, OwnerDispatcherAdmin)
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Driver, DriverAdmin)
 admin.site.register(DeliveryConfirmation, DeliveryAdmin)    
 admin.site.register(DispatcherOrder, DispatcherOrderAdmin)
 admin.site.register(Tracking, TrackingAdmin)
-admin.site.register(Payment)
-admin.site.register(Vehicle)
+admin.site.register(Payment, PaymentAdmin)
+admin.site.register(Vehicle, VehicleAdmin)
 admin.site.register(Cargo, CargoAdmin)
+admin.site.register(Bid, BidAdmin)
 admin.site.register(AdministrativeUnit)
 admin.site.register(Region)
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+Bazaga murojaat qilmaydigan (stateless) JWT autentifikatsiya.
+
+Token ichida foydalanuvchi id, rol va token versiyasi (``ver``) bo'ladi.
+So'rov faqat shu claim-lar va keshdagi ma'lumotlar bilan avtorizatsiya qilinadi:
+
+* ``ver`` foydalanuvchining joriy token versiyasidan farq qilsa token bekor qilingan
+  hisoblanadi (parol, rol, telefon raqam yoki faollik o'zgarganda versiya oshadi);
+* ruxsatlar (permissions) umumiy ruxsatlar keshidan olinadi (main.permissions).
+
+Yoqish uchun (ixtiyoriy)::
+
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'] = ('main.authentication.StatelessJWTAuthentication',)
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .permissions import permission_cache
+
+REVOKED = -1  # foydalanuvchi o'chirilgan yoki faol emas
+
+
+def _cache():
+    return caches[settings.JWT_STATE_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f"jwt-version:{user_id}"
+
+
+def token_version(user_id):
+    """Foydalanuvchining joriy token versiyasi (keshdan, bo'lmasa bazadan bir marta)"""
+    version = _cache().get(_version_key(user_id))
+    if version is None:
+        version = get_user_model().objects.filter(pk=user_id, is_active=True).values_list(
+            'token_version', flat=True
+        ).first()
+        version = REVOKED if version is None else version
+        _cache().set(_version_key(user_id), version, timeout=settings.JWT_STATE_CACHE_TIMEOUT)
+    return version
+
+
+def forget_token_version(user_id):
+    _cache().delete(_version_key(user_id))
+
+
+def add_claims(token, user):
+    """Stateless rejim uchun kerakli claim-lar (ikkala rejimdagi tokenlarga ham qo'shiladi)"""
+    token['user_id'] = user.pk
+    token['role'] = user.role
+    token['is_staff'] = user.is_staff
+    token['is_superuser'] = user.is_superuser
+    token['ver'] = user.token_version
+    return token
+
+
+class ClaimsUser:
+    """Token claim-laridan yig'ilgan foydalanuvchi. Bazadagi User kerak bo'lsa: load()"""
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, token):
+        self.id = self.pk = token['user_id']
+        self.role = token.get('role')
+        self.is_staff = token.get('is_staff', False)
+        self.is_superuser = token.get('is_superuser', False)
+        self.phone_number = token.get(settings.SIMPLE_JWT['USER_ID_CLAIM'])
+        self.token = token
+
+    def __str__(self):
+        return f"{self.phone_number}"
+
+    def __eq__(self, other):
+        return isinstance(other, (ClaimsUser, get_user_model())) and self.pk == other.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def get_all_permissions(self, obj=None):
+        return permission_cache.for_user(self.pk) if obj is None else set()
+
+    def has_perm(self, perm, obj=None):
+        if self.is_superuser:
+            return True
+        return perm in self.get_all_permissions(obj)
+
+    def has_perms(self, perm_list, obj=None):
+        return all(self.has_perm(perm, obj) for perm in perm_list)
+
+    def load(self):
+        return get_user_model().objects.get(pk=self.pk)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication kabi, lekin har so'rovda User jadvalidan o'qimaydi"""
+
+    def get_user(self, validated_token):
+        if 'user_id' not in validated_token or 'ver' not in validated_token:
+            raise InvalidToken("Token stateless rejim uchun kerakli ma'lumotlarni o'z ichiga olmaydi")
+        if validated_token['ver'] != token_version(validated_token['user_id']):
+            raise InvalidToken("Token bekor qilingan")
+        return ClaimsUser(validated_token)
+
+
+def db_user(user):
+    """request.user ni bazadagi User ga aylantiradi (ClaimsUser bo'lsa yuklaydi)"""
+    return user.load() if isinstance(user, ClaimsUser) else user
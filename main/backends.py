@@ -1,15 +1,32 @@
 from django.contrib.auth.backends import ModelBackend
 from main.models import User  # User modelini import qilish
+from main.permissions import permission_cache
 
 class PhoneNumberAuthBackend(ModelBackend):
     """
     Telefon raqam orqali autentifikatsiya backend.
+    phone_number berilmasa (masalan admin panel) oddiy username bo'yicha tekshiradi.
+    Har bir urinishda parol faqat bir marta hash qilinadi.
     """
     def authenticate(self, request, phone_number=None, password=None, **kwargs):
+        if phone_number is None:
+            return super().authenticate(request, password=password, **kwargs)
+        if password is None:
+            return None
         try:
             user = User.objects.get(phone_number=phone_number)
-            if user.check_password(password):  # Parolni tekshiramiz
-                return user
         except User.DoesNotExist:
+            # Mavjud bo'lmagan raqam uchun ham hash hisoblaymiz (javob vaqti bo'yicha raqamni aniqlab bo'lmasin)
+            User().set_password(password)
             return None
+        if user.check_password(password):  # Parolni tekshiramiz
+            return user
         return None
+
+    def get_all_permissions(self, user_obj, obj=None):
+        """Ruxsatlar umumiy keshdan olinadi (guruhlar to'plami bo'yicha)"""
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None or user_obj.is_superuser:
+            return super().get_all_permissions(user_obj, obj)
+        if not hasattr(user_obj, '_perm_cache'):
+            user_obj._perm_cache = permission_cache.for_user(user_obj.pk)
+        return user_obj._perm_cache
@@ -0,0 +1,129 @@
+"""
+Hujjat rasmlari (haydovchilik guvohnomasi, pasport) uchun kichik nusxalar.
+
+Asl fayllar odatda telefon rasmlari (bir necha MB). Tekshiruv sahifalari va API
+ularning o'rniga quyidagi nusxalarni ko'rsatadi:
+
+* thumbnail - ro'yxat va forma uchun kichik JPEG;
+* preview - tekshiruv uchun yetarli o'lchamdagi WebP.
+
+Nusxa nomi asl fayl nomidan hisoblanadi (derivatives/<tur>/<asl nom>.<kengaytma>),
+shuning uchun bazada alohida ustun kerak emas. Nusxalar fon oqimida (ImageWorker)
+yaratiladi; tayyor bo'lmaguncha media view asl faylni beradi.
+Eski rasmlar uchun: ``manage.py build_image_derivatives``.
+"""
+import logging
+import posixpath
+import queue
+import threading
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import models, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = 'derivatives'
+# Kattasidan kichigiga: har bir nusxa oldingisidan kichraytiriladi (asl rasm bir marta o'qiladi)
+DERIVATIVES = {
+    'preview': {'size': (1280, 1280), 'format': 'WEBP', 'extension': 'webp', 'options': {'quality': 80, 'method': 4}},
+    'thumbnail': {'size': (320, 320), 'format': 'JPEG', 'extension': 'jpg', 'options': {'quality': 80, 'optimize': True, 'progressive': True}},
+}
+
+
+def derivative_name(name, kind):
+    return posixpath.join(DERIVATIVES_DIR, kind, f"{name}.{DERIVATIVES[kind]['extension']}")
+
+
+def original_name(name):
+    """derivative_name() ga teskari: nusxa nomidan asl fayl nomi. Nusxa bo'lmasa None"""
+    parts = name.split('/', 2)
+    if len(parts) < 3 or parts[0] != DERIVATIVES_DIR or parts[1] not in DERIVATIVES:
+        return None
+    original, dot, extension = parts[2].rpartition('.')
+    if not dot or extension != DERIVATIVES[parts[1]]['extension']:
+        return None
+    return original
+
+
+def derivative_url(fieldfile, kind):
+    """Nusxa manzili (fayl mavjudligi tekshirilmaydi - media view kerak bo'lsa asl faylga o'tadi)"""
+    if not fieldfile:
+        return None
+    return fieldfile.storage.url(derivative_name(fieldfile.name, kind))
+
+
+def image_fields(model):
+    return [field for field in model._meta.concrete_fields if isinstance(field, models.ImageField)]
+
+
+def generate_derivatives(storage, name, force=False):
+    """Barcha nusxalarni yaratadi. Yaratilgan nusxalar soni (hammasi bor bo'lsa va force=False - 0)"""
+    wanted = [kind for kind in DERIVATIVES if force or not storage.exists(derivative_name(name, kind))]
+    if not wanted:
+        return 0
+    largest = max(DERIVATIVES[kind]['size'] for kind in wanted)
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        # JPEG ni kerakli o'lchamga yaqin masshtabda dekodlash (1/2, 1/4, 1/8) - to'liq rasm xotiraga o'qilmaydi
+        image.draft('RGB', largest)
+        image = ImageOps.exif_transpose(image)  # telefon rasmlari aylantirilgan bo'lishi mumkin
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    for kind in DERIVATIVES:
+        spec = DERIVATIVES[kind]
+        image.thumbnail(spec['size'], Image.Resampling.LANCZOS, reducing_gap=3.0)
+        if kind not in wanted:
+            continue
+        output = image.convert('RGB') if spec['format'] == 'JPEG' and image.mode != 'RGB' else image
+        buffer = BytesIO()
+        output.save(buffer, spec['format'], **spec['options'])  # EXIF (GPS va h.k.) nusxaga o'tmaydi
+        target = derivative_name(name, kind)
+        if storage.exists(target):
+            storage.delete(target)
+        storage.save(target, ContentFile(buffer.getvalue()))
+    return len(wanted)
+
+
+class ImageWorker:
+    """
+    Jarayon ichidagi fon oqimi: nusxalar so'rov javobini kutdirmasdan yaratiladi.
+    Bazaga murojaat qilmaydi (faqat storage). Jarayon to'xtasa navbatdagi ishlar yo'qoladi -
+    build_image_derivatives buyrug'i ularni qayta yaratadi.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, storage, name):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='image-derivatives', daemon=True)
+                self._thread.start()
+        self._queue.put((storage, name))
+
+    def join(self):
+        """Navbat bo'shaguncha kutish (testlar va buyruqlar uchun)"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            storage, name = self._queue.get()
+            try:
+                generate_derivatives(storage, name)
+            except Exception:
+                logger.exception("Rasm nusxalarini yaratib bo'lmadi: %s", name)
+            finally:
+                self._queue.task_done()
+
+
+image_worker = ImageWorker()
+
+
+def schedule_derivatives(fieldfile):
+    """Tranzaksiya commit bo'lgach nusxalarni fon oqimida yaratish"""
+    storage, name = fieldfile.storage, fieldfile.name
+    transaction.on_commit(lambda: image_worker.submit(storage, name))
@@ -0,0 +1,324 @@
+"""
+Haydovchi/transport va yuklarni CSV yoki NDJSON fayldan ommaviy import qilish.
+
+Fayl oqim sifatida o'qiladi va bo'laklarga (chunk) bo'lib ishlanadi. Har bir bo'lakda:
+
+1. qatorlar formati tekshiriladi (bazaga murojaatsiz serializer);
+2. noyoblik (telefon, guvohnoma, pasport, davlat raqami) to'plam bo'yicha - har bir
+   maydon uchun bitta ``IN (...)`` so'rov bilan, fayl ichidagi takrorlar ham;
+3. to'g'ri qatorlar bulk_create bilan bitta tranzaksiyada yoziladi.
+
+Xato qatorlar hisobotga yoziladi, import to'xtamaydi. Ishlatish:
+``manage.py bulk_import drivers fleet.csv`` yoki admin paneldagi "Import" sahifasi.
+"""
+import csv
+import io
+import json
+from itertools import islice
+from operator import itemgetter
+
+from django.contrib.auth.models import Group
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from .models import Cargo, ChangeLog, Driver, OwnerDispatcher, User, Vehicle
+from .reference import get_snapshot
+from .response_cache import response_cache
+from .utils import normalize_phone_numbers
+
+CHUNK_SIZE = 2000
+
+
+def read_rows(stream, format):
+    """(qator raqami, qator lug'ati, xato matni) larni birma-bir qaytaradi. stream - matnli oqim"""
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # Bo'sh katak - qiymat berilmagan
+            yield reader.line_num, {key: value for key, value in row.items() if key and value not in ('', None)}, None
+    elif format == 'ndjson':
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield number, None, f"JSON xato: {exc}"
+                continue
+            if not isinstance(row, dict):
+                yield number, None, "Qator JSON obyekt bo'lishi kerak."
+                continue
+            yield number, row, None
+    else:
+        raise ValueError(f"Noma'lum format: {format}")
+
+
+def open_upload(uploaded_file):
+    """Admin/forma orqali yuklangan faylni matnli oqimga aylantiradi (BOM bo'lsa tashlab yuboriladi)"""
+    return io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+
+
+def detect_format(name):
+    return 'ndjson' if name.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.errors = []  # [(qator raqami, {maydon: [xatolar]})]
+
+    def add_error(self, number, errors):
+        self.errors.append((number, errors))
+
+
+class DriverRowSerializer(serializers.Serializer):
+    """Haydovchi qatori; transport ustunlari ixtiyoriy (berilsa, hammasi)"""
+    phone_number = serializers.CharField()
+    first_name = serializers.CharField(max_length=150, required=False, default='')
+    last_name = serializers.CharField(max_length=150, required=False, default='')
+    license_number = serializers.CharField(max_length=20)
+    passport_number = serializers.CharField(max_length=20)
+    vehicle = serializers.CharField(max_length=155, required=False)
+    plate_number = serializers.CharField(max_length=15, required=False)
+    capacity = serializers.IntegerField(min_value=1, required=False)
+    capacity_unit = serializers.ChoiceField(choices=Cargo.WEIGHT_UNITS, default='T')
+    volume_capacity = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+    VEHICLE_FIELDS = ('vehicle', 'plate_number', 'capacity')
+
+    def validate(self, data):
+        given = [field for field in self.VEHICLE_FIELDS if field in data]
+        if given and len(given) != len(self.VEHICLE_FIELDS):
+            missing = [field for field in self.VEHICLE_FIELDS if field not in data]
+            raise serializers.ValidationError({field: "Transport ma'lumotlari to'liq emas." for field in missing})
+        return data
+
+
+class CargoRowSerializer(serializers.Serializer):
+    """Yuk qatori. Viloyat/tuman - id yoki nomi, customer - yuk egasining telefon raqami"""
+    customer = serializers.CharField()
+    pickup_region = serializers.CharField()
+    pickup_location = serializers.CharField()
+    delivery_region = serializers.CharField()
+    delivery_location = serializers.CharField()
+    cargo_type = serializers.CharField(max_length=255)
+    loading_time = serializers.DateTimeField(required=False)
+    weight = serializers.DecimalField(max_digits=10, decimal_places=2)
+    weight_unit = serializers.ChoiceField(choices=Cargo.WEIGHT_UNITS)
+    volume = serializers.DecimalField(max_digits=10, decimal_places=2)
+    volume_unit = serializers.ChoiceField(choices=Cargo.VOLUME_UNITS, default='m³')
+    readiness_choice = serializers.ChoiceField(choices=Cargo.READNIESS_CHOICE)
+    readiness = serializers.CharField(required=False)
+    placement_method = serializers.CharField(max_length=155)
+    payment_method = serializers.ChoiceField(choices=Cargo.PAYMENT_CHOICES)
+    transport_type = serializers.CharField(max_length=155)
+    special_requirements = serializers.CharField(required=False)
+
+
+class BaseImporter:
+    row_serializer = None
+    # maydon -> (model, ustun): shu ustunlarda bazada ham, fayl ichida ham takror bo'lmasligi kerak
+    unique_fields = {}
+
+    def __init__(self, chunk_size=CHUNK_SIZE, dry_run=False):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.result = ImportResult()
+        self.seen = {field: set() for field in self.unique_fields}
+
+    def run(self, rows):
+        rows = iter(rows)
+        while chunk := list(islice(rows, self.chunk_size)):
+            reported = len(self.result.errors)
+            self.import_chunk(chunk)
+            self.result.errors[reported:] = sorted(self.result.errors[reported:], key=itemgetter(0))  # qator tartibida
+        return self.result
+
+    def import_chunk(self, chunk):
+        self.result.rows += len(chunk)
+        valid = []
+        validator = self.row_serializer()  # maydonlar bir marta yaratiladi (har qator uchun emas)
+        for number, row, error in chunk:
+            if error:
+                self.result.add_error(number, {'row': [error]})
+                continue
+            try:
+                valid.append((number, dict(validator.run_validation(row))))
+            except serializers.ValidationError as exc:
+                self.result.add_error(number, exc.detail)
+
+        valid = self.unique_rows(self.prepare(valid))
+        if not valid or self.dry_run:
+            self.result.created += len(valid)
+            return
+        try:
+            with transaction.atomic():
+                self.create([data for _, data in valid])
+            self.result.created += len(valid)
+        except IntegrityError:
+            # Tekshiruvdan keyin boshqa jarayon bir xil qiymat yozgan: qatorma-qator qayta urinamiz
+            for number, data in valid:
+                try:
+                    with transaction.atomic():
+                        self.create([data])
+                    self.result.created += 1
+                except IntegrityError as exc:
+                    self.result.add_error(number, {'row': [f"Yozib bo'lmadi: {exc}"]})
+
+    def prepare(self, valid):
+        """Bo'lak bo'yicha qo'shimcha tekshiruv/aylantirish (bazaga bo'lak uchun bitta so'rov bilan)"""
+        return valid
+
+    def unique_rows(self, valid):
+        existing = {}
+        for field, (model, column) in self.unique_fields.items():
+            values = {data[field] for _, data in valid if data.get(field) is not None}
+            existing[field] = set(map(str, model.objects.filter(**{f"{column}__in": values}).values_list(column, flat=True)))
+
+        accepted = []
+        for number, data in valid:
+            errors = {}
+            for field in self.unique_fields:
+                value = data.get(field)
+                if value is None:
+                    continue
+                if value in existing[field]:
+                    errors[field] = ["Bu qiymat allaqachon mavjud."]
+                elif value in self.seen[field]:
+                    errors[field] = ["Bu qiymat faylda takrorlangan."]
+            if errors:
+                self.result.add_error(number, errors)
+                continue
+            for field in self.unique_fields:
+                if data.get(field) is not None:
+                    self.seen[field].add(data[field])
+            accepted.append((number, data))
+        return accepted
+
+    def create(self, rows):
+        raise NotImplementedError
+
+
+class DriverImporter(BaseImporter):
+    """Foydalanuvchi (carrier, faol emas, parolsiz - parolni tiklash orqali kiradi) + haydovchi + transport"""
+    row_serializer = DriverRowSerializer
+    unique_fields = {
+        'phone_number': (User, 'phone_number'),
+        'username': (User, 'username'),
+        'license_number': (Driver, 'license_number'),
+        'passport_number': (Driver, 'passport_number'),
+        'plate_number': (Vehicle, 'plate_number'),
+    }
+
+    def prepare(self, valid):
+        phones, errors = normalize_phone_numbers([data['phone_number'] for _, data in valid])
+        prepared = []
+        for index, (number, data) in enumerate(valid):
+            if index in errors:
+                self.result.add_error(number, {'phone_number': [errors[index]]})
+                continue
+            data['phone_number'] = data['username'] = phones[index]
+            prepared.append((number, data))
+        return prepared
+
+    def create(self, rows):
+        users = []
+        for data in rows:
+            user = User(
+                username=data['username'], phone_number=data['phone_number'], role='carrier',
+                first_name=data['first_name'], last_name=data['last_name'],
+            )
+            user.set_unusable_password()
+            users.append(user)
+        users = User.objects.bulk_create(users)
+
+        # User.save() dagi guruh sinxronizatsiyasi - bitta INSERT bilan
+        group, _ = Group.objects.get_or_create(name=User.ROLE_GROUPS['carrier'])
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=user.pk, group_id=group.pk) for user in users
+        ])
+
+        drivers = Driver.objects.bulk_create([
+            Driver(carrier=user, license_number=data['license_number'], passport_number=data['passport_number'])
+            for user, data in zip(users, rows)
+        ])
+        vehicles = []
+        for driver, data in zip(drivers, rows):
+            if 'plate_number' in data:
+                vehicle = Vehicle(
+                    driver=driver, vehicle=data['vehicle'], plate_number=data['plate_number'], capacity=data['capacity'],
+                    capacity_unit=data['capacity_unit'], volume_capacity=data.get('volume_capacity'),
+                )
+                vehicle.normalize_capacity()
+                vehicles.append(vehicle)
+        Vehicle.objects.bulk_create(vehicles)
+
+
+class CargoImporter(BaseImporter):
+    """Yuklar. Viloyat/tumanlar ma'lumotnoma snapshot-idan, yuk egalari bo'lak uchun bitta so'rov bilan topiladi"""
+    row_serializer = CargoRowSerializer
+    LOCATIONS = (('pickup_region', 'pickup_location'), ('delivery_region', 'delivery_location'))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        snapshot = get_snapshot()
+        self.regions = {str(pk): pk for pk in snapshot.regions}
+        self.regions.update({region['name'].casefold(): pk for pk, region in snapshot.regions.items()})
+        self.units = {(unit['region_id'], str(pk)): pk for pk, unit in snapshot.units.items()}
+        self.units.update({(unit['region_id'], unit['name'].casefold()): pk for pk, unit in snapshot.units.items()})
+
+    def resolve_locations(self, data, errors):
+        for region_field, unit_field in self.LOCATIONS:
+            region_id = self.regions.get(data[region_field].strip().casefold())
+            if region_id is None:
+                errors[region_field] = ["Viloyat topilmadi."]
+                continue
+            unit_id = self.units.get((region_id, data[unit_field].strip().casefold()))
+            if unit_id is None:
+                errors[unit_field] = ["Tuman/shahar topilmadi yoki boshqa viloyatga tegishli."]
+                continue
+            data[f"{region_field}_id"], data[f"{unit_field}_id"] = region_id, unit_id
+            del data[region_field], data[unit_field]
+
+    def prepare(self, valid):
+        phones, phone_errors = normalize_phone_numbers([data['customer'] for _, data in valid])
+        customers = dict(
+            OwnerDispatcher.objects.filter(user__phone_number__in={phone for phone in phones if phone}, user__role='owner')
+            .values_list('user__phone_number', 'id')
+        )
+        prepared = []
+        for index, (number, data) in enumerate(valid):
+            errors = {}
+            if index in phone_errors:
+                errors['customer'] = [phone_errors[index]]
+            elif phones[index] not in customers:
+                errors['customer'] = ["Bu raqamli yuk egasi topilmadi."]
+            else:
+                data['customer_id'] = customers[phones[index]]
+                del data['customer']
+            self.resolve_locations(data, errors)
+            if errors:
+                self.result.add_error(number, errors)
+            else:
+                prepared.append((number, data))
+        return prepared
+
+    def create(self, rows):
+        cargos = []
+        for data in rows:
+            cargo = Cargo(**data)
+            cargo.normalize_units()
+            cargo.refresh_search_document()
+            cargos.append(cargo)
+        cargos = Cargo.objects.bulk_create(cargos)
+        # bulk_create signal yubormaydi
+        ChangeLog.record(Cargo, [cargo.pk for cargo in cargos])
+        response_cache.bump(Cargo)
+
+
+IMPORTERS = {
+    'drivers': DriverImporter,
+    'cargos': CargoImporter,
+}
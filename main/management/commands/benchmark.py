@@ -0,0 +1,457 @@
+import asyncio
+import io
+import multiprocessing
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from PIL import Image
+from django.contrib.auth import base_user
+from django.contrib.auth.models import Permission
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from main.authentication import StatelessJWTAuthentication
+from main.images import DERIVATIVES, derivative_name, generate_derivatives
+from main.importers import DriverImporter, read_rows
+from main.pagination import KeysetPagination
+from main.pubsub import InMemoryBroker
+from main.reference import bump_version as bump_reference_version
+from main.response_cache import response_cache
+from main.search import create_search_indexes, get_search_backend, search_cargos
+from main.utils import PRIORITY_COUNTRIES_CODES, normalize_phone_numbers, validate_priority_phone_number
+from main.ranking import CargoFeatures, DriverFeatures, top_k
+from main.models import (
+    User, Region, AdministrativeUnit, OwnerDispatcher, Driver, Vehicle, Cargo, CargoBidSummary, Bid, Tracking, TrackingPosition
+)
+
+
+# Qidiruv benchmarki uchun turli yozilishdagi qiymatlar
+CARGO_TYPES = ["Mebel", "Мебель", "Sement", "Meva", "Sabzavot", "Qurilish materiallari", "Paxta", "Don", "Maishiy texnika"]
+TRANSPORT_TYPES = ["Fura", "Фура", "Refrijerator", "Рефрижератор", "Tent", "Bortli", "Samosval", "Konteyner"]
+
+
+def timed(func, repeat):
+    """func ni repeat marta chaqirib, har birining vaqtini (ms) qaytaradi"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def legacy_validate_phone_number(phone):
+    """Oldingi (har chaqiruvda saralaydigan) tekshiruv - solishtirish uchun"""
+    phone = phone.replace(' ', '').replace('-', '')
+    for prefix, info in PRIORITY_COUNTRIES_CODES.items():
+        if phone.startswith(prefix):
+            without_prefix = phone[len(prefix):]
+            for code in sorted(info['valid_codes'], key=len, reverse=True):
+                if without_prefix.startswith(code):
+                    if len(without_prefix[len(code):]) != info['length']:
+                        raise ValueError(prefix)
+                    return True
+            raise ValueError(prefix)
+    raise ValueError(phone)
+
+
+def accept_worker(bid_ids, results):
+    """Alohida jarayon: har bir yukdagi o'z taklifini qabul qilishga urinadi"""
+    accepted = 0
+    started = time.perf_counter()
+    for bid in Bid.objects.filter(pk__in=bid_ids).only('id', 'cargo_id').order_by('cargo_id'):
+        try:
+            bid.accept()
+            accepted += 1
+        except ValidationError:
+            pass
+    results.put((accepted, len(bid_ids), time.perf_counter() - started))
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Ishlash tezligini o'lchash. Barcha yaratilgan ma'lumotlar oxirida rollback qilinadi."
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=[name[len('bench_'):] for name in dir(self) if name.startswith('bench_')])
+        parser.add_argument('--size', type=int, default=100_000, help="Yaratiladigan yozuvlar soni")
+        parser.add_argument('--repeat', type=int, default=50, help="O'lchovlar soni")
+
+    def handle(self, *args, scenario, size, repeat, **options):
+        bench = getattr(self, f'bench_{scenario}')
+        if getattr(bench, 'commits', False):  # bir nechta jarayon ishtirok etadi, tozalashni o'zi bajaradi
+            return bench(size, repeat)
+        with transaction.atomic():
+            bench(size, repeat)
+            transaction.set_rollback(True)
+
+    def report(self, label, samples):
+        samples = sorted(samples)
+        self.stdout.write(
+            f"{label}: median {statistics.median(samples):.2f} ms, "
+            f"p95 {samples[min(len(samples) - 1, int(len(samples) * 0.95))]:.2f} ms, n={len(samples)}"
+        )
+
+    def seed_reference(self, regions=14, units_per_region=12):
+        regions = Region.objects.bulk_create([Region(name=f"bench-{i}") for i in range(regions)])
+        units = AdministrativeUnit.objects.bulk_create([
+            AdministrativeUnit(region=region, name=f"{region.name}-{i}")
+            for region in regions for i in range(units_per_region)
+        ])
+        bump_reference_version()  # bulk_create signal yubormaydi
+        return regions, units
+
+    def seed_owner(self):
+        user = User.objects.create(username="bench-owner", phone_number="+998900000001", role="owner")
+        return OwnerDispatcher.objects.create(user=user, passport_number="BENCH0001", is_verified=True)
+
+    def seed_cargos(self, customer, units, size, open_ratio=0.01, batch_size=10_000):
+        now = timezone.now()
+        created = 0
+        while created < size:
+            batch = []
+            for _ in range(min(batch_size, size - created)):
+                pickup, delivery = random.choice(units), random.choice(units)
+                is_open = random.random() < open_ratio
+                batch.append(Cargo(
+                    customer=customer,
+                    pickup_region_id=pickup.region_id, pickup_location=pickup,
+                    delivery_region_id=delivery.region_id, delivery_location=delivery,
+                    cargo_type=random.choice(CARGO_TYPES), weight=random.randint(1, 40), weight_unit="T",
+                    volume=random.randint(1, 90), readiness_choice="ready", placement_method="Orqadan",
+                    payment_method="card", transport_type=random.choice(TRANSPORT_TYPES),
+                    cargo_status="pending" if is_open else random.choice(["completed", "cancelled"]),
+                    loading_time=now + timedelta(hours=random.randint(-24 * 365 * 3, 24 * 30)),
+                ))
+                batch[-1].normalize_units()
+                batch[-1].refresh_search_document()
+            Cargo.objects.bulk_create(batch)
+            created += len(batch)
+
+    def seed_trackings(self, count):
+        regions, units = self.seed_reference(regions=1, units_per_region=1)
+        owner = self.seed_owner()
+        self.seed_cargos(owner, units, count, open_ratio=1)
+        user = User.objects.create(username="bench-carrier", phone_number="+998910000001", role="carrier")
+        driver = Driver.objects.create(carrier=user, license_number="BENCH1", passport_number="BENCH1", is_verified=True)
+        vehicle = Vehicle.objects.create(vehicle="Isuzu", driver=driver, capacity=10, plate_number="BENCH1")
+        return Tracking.objects.bulk_create([
+            Tracking(cargo=cargo, driver=driver, vehicle=vehicle) for cargo in Cargo.objects.filter(customer=owner)
+        ])
+
+    def bench_pings(self, size, repeat):
+        """GPS nuqtalar: eski (har biri Tracking.save) va paketli yozish, nuqta/soniya"""
+        trackings = list(Tracking.objects.filter(pk__in=[t.pk for t in self.seed_trackings(10)]).select_related('cargo'))
+        batch = min(size, 1000)
+
+        def per_object():
+            for i in range(batch):
+                tracking = trackings[i % len(trackings)]
+                tracking.current_location = f"41.{i}, 69.{i}"
+                tracking.save()
+
+        def bulk():
+            now = timezone.now()
+            TrackingPosition.bulk_record([
+                TrackingPosition(tracking=trackings[i % len(trackings)], latitude=41, longitude=69, recorded_at=now)
+                for i in range(batch)
+            ])
+
+        for label, func in (("Tracking.save", per_object), ("bulk_record", bulk)):
+            samples = timed(func, max(1, repeat // 10))
+            self.stdout.write(f"{label}: {batch / (statistics.median(samples) / 1000):,.0f} nuqta/soniya ({batch} ta paket)")
+
+    def bench_subscribers(self, size, repeat):
+        """Bitta worker: size ta SSE obunachisiga repeat ta xabar tarqatish (InMemoryBroker)"""
+        broker = InMemoryBroker()
+
+        async def run():
+            tracemalloc.start()
+            subscriptions = [broker.subscribe(f"cargo.{i % 100}") for i in range(size)]
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            async def consume(subscription):
+                for _ in range(repeat):
+                    await subscription.get()
+
+            def publish():
+                for i in range(repeat):
+                    for channel in range(100):
+                        broker.publish(f"cargo.{channel}", {"type": "position", "n": i})
+
+            started = time.perf_counter()
+            threading.Thread(target=publish).start()
+            await asyncio.gather(*(consume(subscription) for subscription in subscriptions))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{size} obunachi: {size * repeat / elapsed:,.0f} xabar/soniya yetkazildi, "
+                f"obunachi boshiga ~{memory / size:,.0f} bayt"
+            )
+
+        asyncio.run(run())
+
+    def bench_ranking(self, size, repeat):
+        """Haydovchilar reytingi: size ta haydovchi × 1000 ta yuk (sintetik belgilar, DB siz)"""
+        rng = np.random.default_rng(0)
+        drivers = DriverFeatures(
+            np.arange(size), rng.uniform(1_000, 40_000, size),
+            rng.uniform(37, 45, size), rng.uniform(56, 73, size),
+            rng.integers(0, 200, size), rng.integers(0, 50, size), rng.integers(0, 3, size),
+        )
+        cargos = CargoFeatures(
+            np.arange(1000), rng.uniform(100, 30_000, 1000), rng.uniform(37, 45, 1000), rng.uniform(56, 73, 1000)
+        )
+        self.report(f"top-10, {size} haydovchi × 1000 yuk", timed(lambda: top_k(drivers, cargos, k=10), max(1, repeat // 10)))
+        single = CargoFeatures(cargos.ids[:1], cargos.weight_kg[:1], cargos.latitude[:1], cargos.longitude[:1])
+        self.report(f"top-10, {size} haydovchi × 1 yuk", timed(lambda: top_k(drivers, single, k=10), repeat))
+
+    def bench_accept_race(self, size, repeat):
+        """Raqobatli qabul qilish: repeat ta jarayon size ta yukning har birida o'z taklifini qabul qilishga urinadi"""
+        regions, units = self.seed_reference(regions=1, units_per_region=1)
+        owner = self.seed_owner()
+        try:
+            self.seed_cargos(owner, units, size, open_ratio=1)
+            cargo_ids = list(Cargo.objects.filter(customer=owner).values_list('id', flat=True))
+            drivers = [
+                Driver.objects.create(
+                    carrier=User.objects.create(username=f"bench-race-{n}", phone_number=f"+99891{n:07d}", role="carrier"),
+                    license_number=f"RACE{n}", passport_number=f"RACE{n}", is_verified=True,
+                )
+                for n in range(repeat)
+            ]
+            bids = Bid.objects.bulk_create([
+                Bid(driver=driver, cargo_id=cargo_id, propose="bench", proposed_price=100)
+                for cargo_id in cargo_ids for driver in drivers
+            ])
+            CargoBidSummary.refresh(cargo_ids)
+
+            connections.close_all()  # fork qilingan jarayonlar ulanishni bo'lishmasligi kerak
+            results = multiprocessing.get_context('fork').Queue()
+            workers = [
+                multiprocessing.get_context('fork').Process(
+                    target=accept_worker, args=([bid.id for bid in bids if bid.driver_id == driver.id], results)
+                )
+                for driver in drivers
+            ]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            outcomes = [results.get() for _ in workers]
+            elapsed = time.perf_counter() - started
+            for worker in workers:
+                worker.join()
+
+            attempts = sum(total for _, total, _ in outcomes)
+            per_cargo = Bid.objects.filter(cargo_id__in=cargo_ids, status='accepted').values('cargo_id').annotate(n=Count('id'))
+            double = sum(1 for row in per_cargo if row['n'] > 1)
+            self.stdout.write(
+                f"{repeat} jarayon, {size} yuk: {attempts / elapsed:,.0f} urinish/soniya, "
+                f"qabul qilingan {sum(accepted for accepted, _, _ in outcomes)}, "
+                f"qabul qilinmagan yuklar {size - len(per_cargo)}, ikki marta qabul qilingan {double}"
+            )
+        finally:
+            Cargo.objects.filter(customer=owner).delete()
+            User.objects.filter(username__startswith="bench-").delete()
+            Region.objects.filter(pk__in=[region.pk for region in regions]).delete()
+
+    bench_accept_race.commits = True
+
+    def bench_route_search(self, size, repeat):
+        """Marshrut qidiruvi: size ta tarixiy yuk ichida ochiqlarini qidirish"""
+        regions, units = self.seed_reference()
+        owner = self.seed_owner()
+        self.seed_cargos(owner, units, size)
+        self.stdout.write(f"{size} ta yuk yaratildi ({Cargo.objects.open().count()} tasi ochiq)")
+
+        client = APIClient()
+        client.force_authenticate(owner.user)
+        now = timezone.now()
+
+        def search():
+            region_from, region_to = random.choice(regions), random.choice(regions)
+            client.get('/cargos/route-search/', {
+                'pickup_region': region_from.id,
+                'delivery_region': region_to.id,
+                'loading_from': now.isoformat(),
+                'loading_to': (now + timedelta(days=30)).isoformat(),
+            })
+
+        self.report("route-search", timed(search, repeat))
+        plan = Cargo.objects.open().on_route(pickup_region=regions[0].id, delivery_region=regions[1].id) \
+            .filter(cargo_status='pending', loading_time__gte=now).order_by('loading_time', 'id')[:21].explain()
+        self.stdout.write(plan)
+
+    def bench_phone_validation(self, size, repeat):
+        """Telefon raqam tekshiruvi: size ta raqam (har 10-chisi noto'g'ri), eski va yangi usul"""
+        rng = random.Random(0)
+        phones = []
+        for i in range(size):
+            prefix, info = rng.choice(list(PRIORITY_COUNTRIES_CODES.items()))
+            number = prefix + rng.choice(info['valid_codes']) + ''.join(rng.choices('0123456789', k=info['length']))
+            phones.append(number + '1' if i % 10 == 0 else number)
+
+        def run(validate):
+            for phone in phones:
+                try:
+                    validate(phone)
+                except Exception:
+                    pass
+
+        self.report(f"eski, {size} raqam", timed(lambda: run(legacy_validate_phone_number), repeat))
+        self.report(f"yangi, {size} raqam", timed(lambda: run(validate_priority_phone_number), repeat))
+        self.report(f"yangi batch, {size} raqam", timed(lambda: normalize_phone_numbers(phones), repeat))
+
+    def bench_login(self, size, repeat):
+        """Kirish (login): repeat ta so'rov, har biriga nechta parol hash hisoblanishi (PASSWORD_HASHERS bo'yicha)"""
+        user = User.objects.create(username="bench-login", phone_number="+998900000002", role="owner", is_active=True)
+        user.set_password("bench-parol")
+        user.save()
+        client = APIClient()
+        for label, password, status in (("to'g'ri parol", "bench-parol", 200), ("noto'g'ri parol", "xato", 400)):
+            with mock.patch.object(base_user, 'check_password', wraps=base_user.check_password) as check:
+                def login():
+                    response = client.post('/api/token/login/', {'phone_number': user.phone_number, 'password': password})
+                    assert response.status_code == status, response.data
+
+                samples = timed(login, repeat)
+            self.report(f"login ({label})", samples)
+            self.stdout.write(f"  {repeat / (sum(samples) / 1000):.1f} login/s, {check.call_count / repeat:.2f} hash/login")
+
+    def bench_auth(self, size, repeat):
+        """JWT autentifikatsiya: oddiy va stateless rejimda repeat ta GET /regions/ so'rovi (size ta viloyat)"""
+        from main.serializers import CustomTokenObtainSerializer
+
+        self.seed_reference(regions=size, units_per_region=0)
+        user = User.objects.create(username="bench-auth", phone_number="+998900000003", role="carrier", is_active=True)
+        user.user_permissions.add(*Permission.objects.filter(codename='view_region'))
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {CustomTokenObtainSerializer.get_token(user).access_token}")
+
+        def get():
+            assert client.get('/regions/').status_code == 200
+
+        for label, authentication in (("JWTAuthentication", JWTAuthentication),
+                                      ("StatelessJWTAuthentication", StatelessJWTAuthentication)):
+            with mock.patch.object(APIView, 'authentication_classes', [authentication]):
+                get()  # keshni isitish
+                queries = []
+                with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+                    get()
+                samples = timed(get, repeat)
+            self.report(label, samples)
+            self.stdout.write(f"  {repeat / (sum(samples) / 1000):.1f} so'rov/s, {len(queries)} SQL so'rov/so'rov")
+
+    def bench_pagination(self, size, repeat):
+        """Sahifalash: size ta yuk, GET /cargos/ (haqiqiy endpoint) boshidagi va chuqur sahifada,
+        to'liq javob va 304; taqqoslash uchun OFFSET bilan xuddi shu sahifa"""
+        regions, units = self.seed_reference(regions=1, units_per_region=2)
+        owner = self.seed_owner()
+        self.seed_cargos(owner, units, size)
+        ids = list(Cargo.objects.order_by('-id').values_list('id', flat=True))
+        client = APIClient()
+        client.force_authenticate(owner.user)
+
+        def get(params, **headers):
+            response_cache.bump(Cargo)  # javob keshini chetlab o'tamiz: har safar view ishlaydi
+            return client.get('/cargos/', params, **headers)
+
+        for depth in (0, len(ids) // 2, len(ids) - 51):
+            params = {}
+            if depth:
+                keyset = KeysetPagination()
+                keyset.base_url = 'http://testserver/cargos/'
+                url = keyset.encode_cursor(Cursor(offset=0, reverse=False, position=str(ids[depth - 1])))
+                params['cursor'] = parse_qs(urlparse(url).query)['cursor'][0]
+            queries = []
+            with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+                response = get(params)
+            assert response.status_code == 200 and response.data['results'][0]['id'] == ids[depth], response.status_code
+            counted = sum('COUNT(' in sql.upper() for sql in queries)
+            self.stdout.write(f"{depth}-yozuvdan: {len(queries)} SQL so'rov, {counted} tasi COUNT")
+            self.report(f"  GET /cargos/, {depth}-yozuvdan", timed(lambda: get(params), repeat))
+            etag = response['ETag']
+            self.report(f"  304, {depth}-yozuvdan", timed(lambda: get(params, HTTP_IF_NONE_MATCH=etag), repeat))
+            # Taqqoslash uchun: OFFSET bilan xuddi shu sahifa (faqat ORM, COUNT siz)
+            self.report(f"  offset, {depth}-yozuvdan",
+                        timed(lambda: list(Cargo.objects.for_board().order_by('-id')[depth:depth + 50]), repeat))
+
+    def bench_search(self, size, repeat):
+        """Matnli qidiruv: size ta yuk ichida (icontains bilan to'liq skan va main.search bilan solishtirish)"""
+        regions, units = self.seed_reference(regions=1, units_per_region=2)
+        self.seed_cargos(self.seed_owner(), units, size, open_ratio=0.2)
+        create_search_indexes(connection.alias)  # PostgreSQL da indekslar (syncdb dan keyin)
+        queryset = Cargo.objects.filter(cargo_status='pending')
+        self.stdout.write(f"{size} ta yuk yaratildi ({queryset.count()} tasi ochiq), backend: "
+                          f"{type(get_search_backend(connection.alias)).__name__}")
+        terms = ["fura", "рефрижератор", "refrejirator", "mebel", "sabzavod"]
+
+        def icontains():
+            term = random.choice(terms)
+            list(queryset.filter(Q(cargo_type__icontains=term) | Q(transport_type__icontains=term))[:20])
+
+        self.report("icontains", timed(icontains, repeat))
+        self.report("search", timed(lambda: search_cargos(queryset, random.choice(terms)), repeat))
+        for term in terms:
+            found = search_cargos(queryset, term, limit=3)
+            self.stdout.write(f"  {term!r}: " + ", ".join(f"{cargo.transport_type}/{cargo.cargo_type}" for cargo in found))
+
+    def bench_import(self, size, repeat):
+        """Ommaviy import: size ta haydovchi + transport qatori (CSV), har 50-qator xato"""
+        lines = ["phone_number,first_name,license_number,passport_number,vehicle,plate_number,capacity"]
+        for i in range(size):
+            phone = f"+99893{i:07d}" if i % 50 else "+99893"
+            lines.append(f"{phone},Ali,BL{i},BP{i},Isuzu,BV{i},{random.randint(1, 40)}")
+        content = "\n".join(lines) + "\n"
+
+        queries = []
+        started = time.perf_counter()
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            result = DriverImporter().run(read_rows(io.StringIO(content), 'csv'))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{result.rows} qator: {result.created} yaratildi, {len(result.errors)} xato, {elapsed:.2f} s "
+            f"({result.rows / elapsed * 60:.0f} qator/daqiqa), {len(queries)} SQL so'rov"
+        )
+
+    def bench_images(self, size, repeat):
+        """Rasm nusxalari: size piksel kenglikdagi telefon rasmi (JPEG), to'liq dekodlash va draft bilan"""
+        storage = FileSystemStorage(location=tempfile.mkdtemp())
+        try:
+            noise = np.random.default_rng(0).integers(0, 256, (size * 3 // 4, size, 3), dtype=np.uint8)
+            buffer = io.BytesIO()
+            Image.fromarray(noise).save(buffer, 'JPEG', quality=90)
+            name = storage.save('licenses/photo.jpg', ContentFile(buffer.getvalue()))
+            self.stdout.write(f"asl rasm: {size}x{size * 3 // 4}, {len(buffer.getvalue()) / 1e6:.1f} MB")
+
+            def full_decode():
+                with storage.open(name, 'rb') as source:
+                    image = Image.open(source)
+                    image.load()
+                for spec in DERIVATIVES.values():
+                    image.copy().resize(spec['size']).save(io.BytesIO(), spec['format'])
+
+            self.report("to'liq dekodlash", timed(full_decode, repeat))
+            self.report("generate_derivatives", timed(lambda: generate_derivatives(storage, name, force=True), repeat))
+            for kind in DERIVATIVES:
+                self.stdout.write(f"  {kind}: {storage.size(derivative_name(name, kind)) / 1e3:.0f} KB")
+        finally:
+            shutil.rmtree(storage.location, ignore_errors=True)
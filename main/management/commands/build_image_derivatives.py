@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from main.images import generate_derivatives, image_fields
+from main.models import Driver, OwnerDispatcher
+
+
+class Command(BaseCommand):
+    help = "Hujjat rasmlari uchun kichik nusxalarni yaratish (eski yuklamalar yoki fon oqimida yo'qolgan ishlar uchun)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Mavjud nusxalarni ham qayta yaratish")
+
+    def handle(self, *args, force, **options):
+        images = created = failed = 0
+        for model in (Driver, OwnerDispatcher):
+            fields = image_fields(model)
+            storages = {field.name: field.storage for field in fields}
+            rows = model.objects.values_list(*storages).iterator(chunk_size=2000)
+            for names in rows:
+                for (field, storage), name in zip(storages.items(), names):
+                    if not name:
+                        continue
+                    images += 1
+                    try:
+                        created += generate_derivatives(storage, name, force=force)
+                    except Exception as exc:  # buzilgan yoki yo'qolgan fayl qolganlarini to'xtatmasin
+                        failed += 1
+                        self.stderr.write(f"{model.__name__}.{field}: {name}: {exc}")
+        self.stdout.write(f"{images} ta rasm, {created} ta nusxa yaratildi, {failed} ta xato")
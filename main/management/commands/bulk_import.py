@@ -0,0 +1,46 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.importers import CHUNK_SIZE, IMPORTERS, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = "Haydovchi/transport yoki yuklarni CSV/NDJSON fayldan ommaviy import qilish (xato qatorlar o'tkazib yuboriladi)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help="Fayl yo'li ('-' - standart kirish)")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help="Standart: fayl kengaytmasidan (.ndjson/.jsonl yoki csv)")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Bir tranzaksiyada yoziladigan qatorlar soni")
+        parser.add_argument('--dry-run', action='store_true', help="Faqat tekshirish, hech narsa yozilmaydi")
+        parser.add_argument('--errors', help="Xatolar hisoboti (NDJSON) yoziladigan fayl. Standart: stderr")
+
+    def handle(self, *args, kind, path, format, chunk_size, dry_run, errors, **options):
+        format = format or detect_format(path)
+        importer = IMPORTERS[kind](chunk_size=chunk_size, dry_run=dry_run)
+        started = time.perf_counter()
+        try:
+            stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        except OSError as exc:
+            raise CommandError(f"Faylni ochib bo'lmadi: {exc}")
+        with stream:
+            result = importer.run(read_rows(stream, format))
+        elapsed = time.perf_counter() - started
+
+        report = open(errors, 'w', encoding='utf-8') if errors else None
+        for number, row_errors in result.errors:
+            line = json.dumps({'line': number, 'errors': row_errors}, ensure_ascii=False)
+            if report:
+                report.write(line + '\n')
+            else:
+                self.stderr.write(line)
+        if report:
+            report.close()
+
+        self.stdout.write(
+            f"{result.rows} ta qator, {result.created} ta {'tekshirildi' if dry_run else 'yaratildi'}, "
+            f"{len(result.errors)} ta xato ({result.rows / elapsed * 60 if elapsed else 0:.0f} qator/daqiqa)"
+        )
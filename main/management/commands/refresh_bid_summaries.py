@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Bid, CargoBidSummary
+
+
+class Command(BaseCommand):
+    help = "Bid-lari bor yuklar uchun yig'indilarni (CargoBidSummary) qayta hisoblash (eski ma'lumotlar uchun)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Bitta tranzaksiyadagi yuklar soni")
+
+    def handle(self, *args, batch_size, **options):
+        cargo_ids = list(Bid.objects.values_list('cargo_id', flat=True).distinct().order_by('cargo_id'))
+        for start in range(0, len(cargo_ids), batch_size):
+            CargoBidSummary.refresh(cargo_ids[start:start + batch_size])
+        self.stdout.write(f"{len(cargo_ids)} ta yuk yig'indisi yangilandi")
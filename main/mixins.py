@@ -0,0 +1,183 @@
+import hashlib
+
+from django.db.models import Count, F, Max
+from django.db.models.functions import Coalesce, Greatest
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .response_cache import response_cache
+
+
+class ConditionalGetMixin:
+    """
+    list/retrieve uchun ETag va Last-Modified.
+
+    Ro'yxatda validatorlar faqat joriy sahifa bo'yicha hisoblanadi: avval sahifaning o'zi yengil
+    so'rov bilan (id, tartib maydoni va o'zgarish vaqti, LIMIT bilan) o'qiladi. Mijozdagi nusxa
+    eskirmagan bo'lsa 304 qaytadi: to'liq qatorlar, prefetch va serializatsiya bo'lmaydi, butun
+    jadval bo'yicha agregat (COUNT/MAX) ham hisoblanmaydi. Detail da - bitta qator bo'yicha agregat.
+    O'zgarish vaqti maydoni (yoki ifodasi) get_last_modified_expression() da beriladi, ?expand= dagi
+    bog'lanishlarning updated_at i unga qo'shiladi (get_validator_expression).
+    """
+    last_modified_field = 'updated_at'
+
+    def get_response_scope(self):
+        return self.request.user.pk
+
+    def get_last_modified_expression(self):
+        return F(self.last_modified_field)
+
+    def get_validator_expression(self):
+        """O'zgarish vaqti; ?expand= bo'lsa javobga qo'shilgan bog'lanishlarning updated_at i ham hisobga olinadi"""
+        expression = self.get_last_modified_expression()
+        expanded = sorted(getattr(self.get_serializer(), 'expanded', ()))
+        if not expanded:
+            return expression
+        return Greatest(expression, *(Coalesce(f'{name}__updated_at', expression) for name in expanded))
+
+    def make_validators(self, last_modified, *parts):
+        # Javob so'rov parametrlari, foydalanuvchi va formatga ham bog'liq
+        key = "|".join(map(str, (
+            self.__class__.__name__, self.request.get_full_path(), self.get_response_scope(),
+            self.request.accepted_media_type, last_modified.isoformat(), *parts,
+        )))
+        return quote_etag(hashlib.md5(key.encode()).hexdigest()), last_modified.timestamp()
+
+    def conditional_response(self, etag, last_modified, handler, *args, **kwargs):
+        if etag is not None:
+            not_modified = get_conditional_response(self.request._request, etag=etag, last_modified=int(last_modified))
+            if not_modified is not None:
+                return not_modified
+        response = handler(*args, **kwargs)
+        if etag is not None and response.status_code == 200:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = self.paginator.get_ordering(request, queryset, self) if self.paginator is not None else ()
+        probe = (
+            queryset.select_related(None).prefetch_related(None)
+            .only(*{name.lstrip('-') for name in ordering})
+            .annotate(conditional_last_modified=self.get_validator_expression())
+        )
+        page = self.paginate_queryset(probe)
+        rows = list(probe) if page is None else page
+        pks = [row.pk for row in rows]
+        last_modified = max((row.conditional_last_modified for row in rows), default=None)
+
+        etag = None
+        if last_modified is not None:
+            links = (self.paginator.get_next_link(), self.paginator.get_previous_link()) if page is not None else ()
+            etag, last_modified = self.make_validators(last_modified, pks, *links, getattr(self.paginator, 'count', None))
+
+        def render():
+            objects = queryset.in_bulk(pks)  # faqat sahifa qatorlari (prefetch ham shular uchun)
+            data = self.get_serializer([objects[pk] for pk in pks if pk in objects], many=True).data
+            return self.get_paginated_response(data) if page is not None else Response(data)
+
+        return self.conditional_response(etag, last_modified, render)
+
+    def retrieve(self, request, *args, **kwargs):
+        # Obyektni yuklamasdan, faqat bitta qator bo'yicha agregat bilan tekshiramiz; topilmasa odatiy yo'l (404)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+        row = queryset.order_by().aggregate(last_modified=Max(self.get_validator_expression()), count=Count('pk'))
+        etag = last_modified = None
+        if row['count'] and row['last_modified'] is not None:
+            etag, last_modified = self.make_validators(row['last_modified'], row['count'])
+        return self.conditional_response(etag, last_modified, super().retrieve, request, *args, **kwargs)
+
+
+class ResponseCacheMixin:
+    """
+    list javobini (serializatsiya qilingan data va ETag/Last-Modified) keshlaydi.
+    cache_dependencies - javob bog'liq modellar, ular o'zgarsa kesh yangilanadi
+    (?expand= dagi bog'lanishlar modellari avtomatik qo'shiladi).
+    Javobda X-Cache: HIT/MISS sarlavhasi bo'ladi.
+    """
+    cache_dependencies = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.cache_dependencies:
+            response_cache.endpoints.add(cls.__name__)
+
+    def get_response_scope(self):
+        """Bir xil javob oladigan foydalanuvchilar guruhi. Ro'yxat foydalanuvchiga bog'liq bo'lsa override qiling"""
+        user = self.request.user
+        if not user.is_authenticated:
+            return "anon"
+        return f"{user.role}:{int(user.is_staff)}"
+
+    def get_cache_dependencies(self):
+        """cache_dependencies va ?expand= bilan javobga qo'shilgan bog'lanishlarning modellari"""
+        serializer = self.get_serializer()
+        meta = serializer.Meta.model._meta
+        expanded = [meta.get_field(name).related_model for name in sorted(getattr(serializer, 'expanded', ()))]
+        return (*self.cache_dependencies, *expanded)
+
+    def get_response_cache_key(self):
+        generations = response_cache.generations(self.get_cache_dependencies())
+        variant = "|".join(map(str, (
+            self.request.build_absolute_uri(), self.request.accepted_media_type, self.get_response_scope(), *generations,
+        )))
+        return f"{self.__class__.__name__}:{hashlib.md5(variant.encode()).hexdigest()}"
+
+    def list(self, request, *args, **kwargs):
+        endpoint = self.__class__.__name__
+        key = self.get_response_cache_key()
+        entry = response_cache.get(key)
+        if entry is not None:
+            response_cache.count(endpoint, 'hit')
+            headers = entry['headers']
+            if 'ETag' in headers:
+                not_modified = get_conditional_response(request._request, etag=headers['ETag'])
+                if not_modified is not None:
+                    not_modified['X-Cache'] = 'HIT'
+                    return not_modified
+            return Response(entry['data'], headers={**headers, 'X-Cache': 'HIT'})
+
+        response_cache.count(endpoint, 'miss')
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            headers = {name: response[name] for name in ('ETag', 'Last-Modified') if name in response}
+            response_cache.set(key, {'data': response.data, 'headers': headers})
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class SparseFieldsetsMixin:
+    """
+    ?fields= / ?view=compact / ?expand= (DynamicFieldsMixin) tanlovini SQL ga ham qo'llaydi:
+    faqat kerakli ustunlar (only), kerak bo'lmagan select_related/prefetch olib tashlanadi,
+    kengaytirilgan bog'lanishlar select_related bilan bitta so'rovda yuklanadi.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        serializer = self.get_serializer()
+        if getattr(serializer, 'expanded', None):
+            queryset = queryset.select_related(*serializer.expanded)
+        if not getattr(serializer, 'sparse', False) or queryset.query.select_related is True:
+            return queryset
+
+        roots = {
+            name if field.source == '*' else field.source.split('.')[0] for name, field in serializer.fields.items()
+        } | {queryset.model._meta.pk.name}
+        selected = [name for name in (queryset.query.select_related or {}) if name in roots]
+        prefetched = [
+            lookup for lookup in queryset._prefetch_related_lookups
+            if getattr(lookup, 'prefetch_through', lookup).split('__')[0] in roots
+        ]
+        concrete = {field.name for field in queryset.model._meta.concrete_fields}
+        return (
+            queryset.select_related(None).select_related(*selected)
+            .prefetch_related(None).prefetch_related(*prefetched)
+            .only(*(roots & concrete), *selected)
+        )
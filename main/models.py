@@ -1,31 +1,97 @@
 import phonenumbers
 import random
 
+from datetime import timedelta
+from decimal import Decimal
 
-from django.db import models
+
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models.expressions import RawSQL
 from django.contrib.auth.models import AbstractUser, Group
-from time import timezone
+from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
 from django.core.validators import RegexValidator
 from phonenumbers import parse, is_valid_number, region_code_for_number
 from rest_framework.exceptions import ValidationError
-from .utils import generate_auth_code
+from .pubsub import publish_cargo_event
+from .response_cache import response_cache
+from .utils import normalize_search_text
 from phonenumbers import parse, NumberParseException, is_valid_number
 
 
-class User(AbstractUser):
+class TrackedFieldsMixin:
+    """Bazadan yuklangan qiymatlarni eslab qoladi: save() faqat o'zgargan ustunlarni yozadi,
+    hech narsa o'zgarmagan bo'lsa umuman yozmaydi"""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded_values()
+        return instance
+
+    def _remember_loaded_values(self, fields=None):
+        concrete = [field for field in self._meta.concrete_fields if fields is None or field.name in fields or field.attname in fields]
+        loaded = {field.attname: self.__dict__[field.attname] for field in concrete if field.attname in self.__dict__}
+        if fields is None or not hasattr(self, '_loaded_values'):
+            self._loaded_values = loaded
+        else:
+            self._loaded_values.update(loaded)
+
+    def changed_fields(self):
+        """O'zgargan maydon nomlari. Bazadan yuklanmagan (yangi) obyekt uchun None"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or self._state.adding:
+            return None
+        return {
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname in self.__dict__
+            and (field.attname not in loaded or loaded[field.attname] != self.__dict__[field.attname])
+        }
+
+    def has_changed(self, *names):
+        changed = self.changed_fields()
+        return changed is None or any(name in changed for name in names)
+
+    def save(self, *args, **kwargs):
+        changed = self.changed_fields()
+        if changed is not None and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            if not changed:
+                return
+            auto_now = {field.name for field in self._meta.concrete_fields if getattr(field, 'auto_now', False)}
+            kwargs['update_fields'] = changed | auto_now
+        super().save(*args, **kwargs)
+        self._remember_loaded_values(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._remember_loaded_values(fields)
+
+
+class ChangeLogMixin:
+    """save() tranzaksiya ichida bajariladi: post_save dagi o'zgarishlar jurnali (ChangeLog)
+    yozuvi o'zgarishning o'zi bilan birga commit yoki rollback bo'ladi.
+    O'chirishda post_delete allaqachon o'chirish tranzaksiyasi ichida yuboriladi."""
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+
+
+class User(TrackedFieldsMixin, AbstractUser):
     ROLE_CHOICES = (
         ('dispatcher', 'Dispetcher'),
         ('carrier', 'Yuk tashuvchi'),
         ('owner', 'Yuk egasi'),
     )
     phone_number = PhoneNumberField(unique=True, region='UZ')
-    temp_phone_number = models.CharField(max_length=25, blank=True, null=True)
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
-    auth_code = models.CharField(max_length=6, blank=True, null=True)
     is_active = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    token_version = models.PositiveIntegerField(default=0, editable=False)  # oshirilsa eski JWT lar bekor bo'ladi
+
+    # Shu maydonlar o'zgarsa berilgan tokenlar bekor qilinadi
+    TOKEN_FIELDS = ('password', 'role', 'phone_number', 'is_active', 'is_staff', 'is_superuser')
 
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}"
@@ -34,28 +100,39 @@ class User(AbstractUser):
     #     from utils import validate_uz_phone_number
     #     validate_uz_phone_number(self.phone_number)
 
+    ROLE_GROUPS = {
+        'dispatcher': 'dispatcher_group',
+        'carrier': 'carrier_group',
+        'owner': 'owner_group',
+    }
+
     def save(self, *args, **kwargs):
-        if not self.auth_code:  # Agar auth_code hali bo'sh bo'lsa, uni yaratish
-            self.auth_code = generate_auth_code() 
+        role_changed = self.has_changed('role')  # guruhni faqat yangi foydalanuvchi yoki rol o'zgarganda yangilaymiz
+        if not self._state.adding and self.has_changed(*self.TOKEN_FIELDS):
+            self.revoke_tokens(save=False)
 
         super().save(*args, **kwargs)  # Foydalanuvchini saqlaymiz
 
         # Role'ga mos keladigan guruhni topamiz va qo‘shamiz
-        role_group_map = {
-            'dispatcher': 'dispatcher_group',
-            'carrier': 'carrier_group',
-            'owner': 'owner_group',
-        }
-        group_name = role_group_map.get(self.role)
-        if group_name:
+        group_name = self.ROLE_GROUPS.get(self.role)
+        if group_name and role_changed:
             group, created = Group.objects.get_or_create(name=group_name)
             self.groups.add(group)
 
+    def revoke_tokens(self, save=True):
+        """Foydalanuvchiga berilgan barcha JWT larni bekor qilish (stateless rejim uchun)"""
+        from .authentication import forget_token_version
+
+        self.token_version += 1
+        if save:
+            User.objects.filter(pk=self.pk).update(token_version=models.F('token_version') + 1)
+        transaction.on_commit(lambda: forget_token_version(self.pk))
+
     def __str__(self):
         return f"{self.username}"
     
 
-class Region(models.Model):
+class Region(TrackedFieldsMixin, models.Model):
     name = models.CharField(max_length=155)
 
     class Meta:
@@ -66,19 +143,25 @@ class Region(models.Model):
         return f"{self.name.title()} viloyati"
 
 
-class AdministrativeUnit(models.Model):
+class AdministrativeUnit(TrackedFieldsMixin, models.Model):
     region = models.ForeignKey(Region, on_delete=models.CASCADE, related_name="units")
     name = models.CharField(max_length=155)
+    latitude = models.FloatField(null=True, blank=True)  # markaz koordinatasi (haydovchilar reytingi uchun)
+    longitude = models.FloatField(null=True, blank=True)
 
     class Meta:
         verbose_name = "Ma'muriy birlik"
         verbose_name_plural = "Ma'muriy birliklar"
 
     def __str__(self):
-        return f"{self.name.title()} ({self.region.name.title()} viloyati)"
+        from .reference import get_snapshot
+
+        region = get_snapshot().regions.get(self.region_id)  # viloyatni bazadan yuklamaslik uchun
+        region_name = region['name'] if region else self.region.name
+        return f"{self.name.title()} ({region_name.title()} viloyati)"
 
 
-class OwnerDispatcher(models.Model):
+class OwnerDispatcher(TrackedFieldsMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     passport_number = models.CharField(max_length=20, unique=True)  # Pasport raqami
     passport_image = models.ImageField(upload_to='passports/', null=True, blank=True)
@@ -90,7 +173,47 @@ class OwnerDispatcher(models.Model):
         return f"{self.user.get_full_name()} (Verified: {self.is_verified})"
 
 
-class Cargo(models.Model):
+class CargoQuerySet(models.QuerySet):
+    def for_board(self):
+        """Yuk doskasi uchun: bid-larni faqat kerakli ustunlar bilan oldindan yuklaymiz (qidiruv matni kerak emas)"""
+        return self.select_related("bid_summary").defer("search_document").prefetch_related(
+            models.Prefetch(
+                "bids",
+                queryset=Bid.objects.only("id", "cargo_id", "propose", "status", "proposed_price").order_by("id"),
+            )
+        )
+
+    def open(self):
+        return self.filter(cargo_status__in=Cargo.OPEN_STATUSES)
+
+    def on_route(self, pickup_region=None, pickup_location=None, delivery_region=None, delivery_location=None):
+        """Marshrut bo'yicha filtr (A nuqtadan B nuqtaga)"""
+        filters = {
+            "pickup_region": pickup_region,
+            "pickup_location": pickup_location,
+            "delivery_region": delivery_region,
+            "delivery_location": delivery_location,
+        }
+        return self.filter(**{field: value for field, value in filters.items() if value is not None})
+
+    def fitting(self, vehicle):
+        """Mashina sig'imiga mos keladigan kutilayotgan yuklar (hisob-kitob to'liq SQL da)"""
+        cargos = self.filter(cargo_status='pending', weight_kg__lte=vehicle.capacity_kg)
+        if vehicle.volume_capacity_l is not None:
+            cargos = cargos.filter(volume_l__lte=vehicle.volume_capacity_l)
+        return cargos
+
+    def after(self, loading_time, pk):
+        """
+        Keyset: (loading_time, id) juftligidan keyingi yuklar (loading_time bo'sh yuklar kirmaydi).
+        loading_time >= x sharti indeksda oraliq beradi, OR faqat shu oraliq boshidagi qatorlarga qo'llanadi
+        """
+        return self.filter(loading_time__gte=loading_time).filter(
+            models.Q(loading_time__gt=loading_time) | models.Q(id__gt=pk)
+        )
+
+
+class Cargo(ChangeLogMixin, TrackedFieldsMixin, models.Model):
     PAYMENT_CHOICES = (
     ("card", "Bank Karta"),
     ("e_wallet", "Elektron Hamyon"),
@@ -111,8 +234,11 @@ class Cargo(models.Model):
         ('m³', 'Cubic Meter'),
         ('L', 'Liter'),
     ]
+    KG_PER_WEIGHT_UNIT = {'Kg': 1, 'T': 1000}
+    LITRES_PER_VOLUME_UNIT = {'m³': 1000, 'L': 1}
     READNIESS_CHOICE = (('ready', "tayyor"),
                         ('not_ready', "tayyormas"))
+    OPEN_STATUSES = ('pending', 'in_progress')  # qidiruvda ko'rinadigan (yopilmagan) holatlar
     
     customer = models.ForeignKey(OwnerDispatcher, on_delete=models.CASCADE, related_name="cargos")
 
@@ -126,26 +252,82 @@ class Cargo(models.Model):
     weight = models.DecimalField(max_digits=10, decimal_places=2) #yuk ogirligi
     weight_unit = models.CharField(max_length=15, choices=WEIGHT_UNITS) # tonna, kg
     volume = models.DecimalField(max_digits=10, decimal_places=2) #yuk hajmi
+    volume_unit = models.CharField(max_length=15, choices=VOLUME_UNITS, default='m³') # m³, litr
+    weight_kg = models.DecimalField(max_digits=14, decimal_places=3, editable=False) # kg ga keltirilgan og'irlik
+    volume_l = models.DecimalField(max_digits=14, decimal_places=3, editable=False) # litrga keltirilgan hajm
     readiness_choice = models.CharField(max_length=20, choices=READNIESS_CHOICE) #yuk tayyorligi
     readiness = models.TextField(null=True, blank=True) # yuk tayyorligi biror sabab (bahona)
     placement_method = models.CharField(max_length=155) # Yuk yuklash usuli
     payment_method = models.CharField(max_length=20, choices=PAYMENT_CHOICES)
     transport_type = models.CharField(max_length=155, help_text="transfort turi misol uchun: Fura") #transport turi (qolda kiritiladi)
     special_requirements = models.TextField(null=True, blank=True) # qoshimcha (qolda kiritiladi)
+    updated_at = models.DateTimeField(auto_now=True)  # ETag/Last-Modified uchun; .update() da qo'lda beriladi
+    # Qidiruv matni (SEARCH_FIELDS dan, normallashtirilgan). PostgreSQL da tsvector va trigram indekslari shu ustunda (main/search.py)
+    search_document = models.TextField(editable=False, default='')
+
+    SEARCH_FIELDS = ('cargo_type', 'transport_type', 'placement_method', 'special_requirements')
+
+    objects = CargoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Marshrut qidiruvi: faqat ochiq yuklar, loading_time bo'yicha keyset tartibida
+            models.Index(
+                fields=["pickup_region", "delivery_region", "cargo_status", "loading_time", "id"],
+                condition=models.Q(cargo_status__in=('pending', 'in_progress')),
+                name="cargo_route_region_open_idx",
+            ),
+            models.Index(
+                fields=["pickup_location", "delivery_location", "cargo_status", "loading_time", "id"],
+                condition=models.Q(cargo_status__in=('pending', 'in_progress')),
+                name="cargo_route_unit_open_idx",
+            ),
+            # Sig'im bo'yicha moslash: faqat kutilayotgan yuklar
+            models.Index(
+                fields=["weight_kg", "volume_l"],
+                condition=models.Q(cargo_status='pending'),
+                name="cargo_capacity_pending_idx",
+            ),
+            # Admin ro'yxatidagi status filtri (yopilgan yuklar ham)
+            models.Index(fields=["cargo_status", "id"], name="cargo_status_idx"),
+        ]
+
+    def normalize_units(self):
+        """weight_kg va volume_l ni weight/volume va birliklardan hisoblaydi (bulk_create dan oldin ham chaqiriladi)"""
+        self.weight_kg = Decimal(self.weight) * self.KG_PER_WEIGHT_UNIT[self.weight_unit]
+        self.volume_l = Decimal(self.volume) * self.LITRES_PER_VOLUME_UNIT[self.volume_unit]
+
+    @classmethod
+    def lock_rows(cls, pks):
+        """Yuk qatorlarini id tartibida qulflaydi (tranzaksiya ichida chaqiriladi). Bid yozuvlari, yig'indi
+        hisobi va Bid.accept() shu qulf orqali ketma-ket bajariladi: qulflar tartibi yuk -> bid -> yig'indi.
+        NO KEY UPDATE bid INSERT dagi FK tekshiruvi (KEY SHARE) bilan to'qnashmaydi"""
+        using = router.db_for_write(cls)
+        if connections[using].features.has_select_for_update:  # SQLite da yozuvchilar baribir ketma-ket
+            list(cls.objects.using(using).select_for_update(no_key=True).filter(pk__in=pks).order_by('pk').values_list('pk'))
+
+    def refresh_search_document(self):
+        """search_document ni qo'lda kiritiladigan matn maydonlaridan yig'adi (bulk_create dan oldin ham chaqiriladi)"""
+        self.search_document = normalize_search_text(*(getattr(self, name) for name in self.SEARCH_FIELDS))
 
     def save(self, *args, **kwargs):
         if self.readiness_choice == 'not_ready':
             self.cargo_status = 'pending'     
-        if self.cargo_status == 'completed' and not self.delivery_region:
+        if self.cargo_status == 'completed' and self.delivery_region_id is None:  # FK ni yuklamasdan
             raise ValidationError("Buyurtma tugallanganda yetkazib berish manzili kiritilishi kerak!")
+        self.normalize_units()
+        self.refresh_search_document()
+        status_changed = self.has_changed('cargo_status')
         super().save(*args, **kwargs)
+        if status_changed:
+            publish_cargo_event(self.id, 'status', cargo_status=self.cargo_status)
 
     def __str__(self):
         return f"cargo's owner {self.customer.user.get_full_name()} ({self.readiness_choice}) "
     
 
 
-class Driver(models.Model):
+class Driver(TrackedFieldsMixin, models.Model):
     carrier = models.OneToOneField(User, on_delete=models.CASCADE, related_name="driver_profile")
     license_number = models.CharField(max_length=20, unique=True)  # Haydovchilik guvohnomasi raqami
     license_image = models.ImageField(upload_to='licenses/', null=True, blank=True)
@@ -160,7 +342,7 @@ class Driver(models.Model):
         return f"{self.carrier.get_full_name()} - {self.license_number} (Verified: {self.is_verified})"
 
 
-class DeliveryConfirmation(models.Model):
+class DeliveryConfirmation(TrackedFieldsMixin, models.Model):
     cargo = models.OneToOneField(Cargo, on_delete=models.CASCADE, related_name="confirmation")
 
     driver = models.ForeignKey(Driver, on_delete=models.SET_NULL, null=True, blank=True, related_name="deliveries_made")
@@ -179,29 +361,58 @@ class DeliveryConfirmation(models.Model):
             self.delivered_at = timezone.now()
             self.received_at = timezone.now()
             self.cargo.cargo_status = "completed"
-            self.cargo.save()
-            tracking = Tracking.objects.filter(cargo=self.cargo).first()
-            if tracking:
-                tracking.status = "delivered"
-                tracking.save()
-
-            self.notify_dispatcher()
-            self.save()
-
-
-class Vehicle(models.Model):
+            with transaction.atomic():  # o'zgarishlar jurnali yozuvi bilan birga
+                self.cargo.save()  # faqat cargo_status yoziladi
+                # Tracking.save() cargo ni qayta saqlamasligi uchun to'g'ridan-to'g'ri UPDATE
+                trackings = Tracking.objects.filter(cargo_id=self.cargo_id).exclude(status="delivered")
+                tracking_ids = list(trackings.values_list('pk', flat=True))
+                if tracking_ids and Tracking.objects.filter(pk__in=tracking_ids).update(
+                    status="delivered", last_updated=timezone.now()
+                ):
+                    response_cache.bump(Tracking)  # .update() signal yubormaydi
+                    ChangeLog.record(Tracking, tracking_ids)
+                    publish_cargo_event(self.cargo_id, 'tracking_status', status="delivered")
+
+                self.notify_dispatcher()
+                self.save()
+
+    def notify_dispatcher(self):
+        """Dispetcherga xabar berilganini belgilaydi (saqlash chaqiruvchida)"""
+        self.dispatcher_notified = True
+
+
+class Vehicle(TrackedFieldsMixin, models.Model):
     vehicle = models.CharField(max_length=155)
     driver = models.OneToOneField(Driver, on_delete=models.CASCADE)
     capacity = models.PositiveIntegerField()
+    capacity_unit = models.CharField(max_length=15, choices=Cargo.WEIGHT_UNITS, default='T')
+    volume_capacity = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # kuzov hajmi, m³
+    capacity_kg = models.PositiveIntegerField(editable=False)  # kg ga keltirilgan yuk ko'tarish quvvati
+    volume_capacity_l = models.DecimalField(max_digits=14, decimal_places=3, null=True, editable=False)
     plate_number = models.CharField(max_length=15, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    def normalize_capacity(self):
+        """capacity_kg va volume_capacity_l ni hisoblaydi (bulk_create dan oldin ham chaqiriladi)"""
+        self.capacity_kg = self.capacity * Cargo.KG_PER_WEIGHT_UNIT[self.capacity_unit]
+        self.volume_capacity_l = None if self.volume_capacity is None else Decimal(self.volume_capacity) * 1000
+
+    def save(self, *args, **kwargs):
+        self.normalize_capacity()
+        super().save(*args, **kwargs)
   
     def __str__(self):
         return f"{self.vehicle} - {self.plate_number}"
 
 
-class Bid(models.Model):
+class BidQuerySet(models.QuerySet):
+    def for_owner(self, user):
+        """Yuk egasi (OwnerDispatcher) ko'radigan bid-lar: o'z yuklariga berilgan va hali tasdiqlanmaganlari"""
+        return self.filter(cargo__customer__user_id=user.pk, cargo__bid_summary__accepted_bid__isnull=True)
+
+
+class Bid(ChangeLogMixin, TrackedFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('pending', 'Kutilmoqda'),
         ('accepted', 'Qabul qilindi'),
@@ -213,32 +424,205 @@ class Bid(models.Model):
     proposed_price = models.DecimalField(max_digits=10, decimal_places=2)  # Haydovchi narx taklif qiladi
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # ETag/Last-Modified uchun; .update() da qo'lda beriladi
+
+    objects = BidQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Bitta yukda faqat bitta qabul qilingan taklif bo'lishi mumkin
+            models.UniqueConstraint(fields=['cargo'], condition=models.Q(status='accepted'), name='unique_accepted_bid_per_cargo'),
+        ]
+        indexes = [
+            # Admin ro'yxatidagi status filtri (id bo'yicha kamayish tartibida sahifalanadi)
+            models.Index(fields=['status', 'id'], name='bid_status_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            Cargo.lock_rows([self.cargo_id])  # yig'indi (post_save) accept() bilan bir vaqtda hisoblanmasin
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            Cargo.lock_rows([self.cargo_id])
+            return super().delete(*args, **kwargs)
+
+    def accept(self):
+        """Taklifni bitta tranzaksiyada qabul qiladi: yuk qatori qulflanadi, yig'indi qatori shartli yangilanadi,
+        g'olib accepted bo'ladi, qolgan kutilayotgan takliflar bitta UPDATE bilan rad etiladi"""
+        try:
+            with transaction.atomic():
+                Cargo.lock_rows([self.cargo_id])
+                now = timezone.now()
+                claimed = CargoBidSummary.objects.filter(cargo_id=self.cargo_id, accepted_bid__isnull=True).update(
+                    accepted_bid=self.pk, updated_at=now
+                )
+                if not claimed and not CargoBidSummary.objects.filter(cargo_id=self.cargo_id).exists():
+                    # Yig'indisiz eski yuk (refresh_bid_summaries ishga tushirilmagan): qulf ostida yaratib, qayta urinamiz
+                    CargoBidSummary.refresh([self.cargo_id])
+                    claimed = CargoBidSummary.objects.filter(
+                        cargo_id=self.cargo_id, accepted_bid__isnull=True
+                    ).update(accepted_bid=self.pk, updated_at=now)
+                if not claimed:
+                    raise ValidationError({"detail": "Bu yukga allaqachon biror taklif tasdiqlangan."})
+                if not Bid.objects.filter(pk=self.pk, status='pending').update(status='accepted', updated_at=now):
+                    raise ValidationError({"detail": "Faqat kutilayotgan taklifni qabul qilish mumkin."})
+                rejected = list(Bid.objects.filter(cargo_id=self.cargo_id, status='pending').values_list('pk', flat=True))
+                Bid.objects.filter(pk__in=rejected).update(status='rejected', updated_at=now)
+                ChangeLog.record(Bid, [self.pk, *rejected])
+        except IntegrityError:
+            raise ValidationError({"detail": "Bu yukga allaqachon biror taklif tasdiqlangan."})
+        response_cache.bump(Bid)  # .update() signal yubormaydi
+        self.status = 'accepted'
 
     def __str__(self):
         return f"Bid by {self.driver.carrier.get_full_name()} for {self.cargo}"
 
 
-class Tracking(models.Model):
+class CargoBidSummary(models.Model):
+    """
+    Yuk bo'yicha bid-lar yig'indisi. Bid o'zgarganda shu tranzaksiya ichida yangilanadi (main/signals.py).
+    Yig'indidan oldin yaratilgan bid-lar uchun: ``manage.py refresh_bid_summaries``.
+    """
+    cargo = models.OneToOneField(Cargo, on_delete=models.CASCADE, primary_key=True, related_name='bid_summary')
+    bid_count = models.PositiveIntegerField(default=0)
+    lowest_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    highest_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    accepted_bid = models.ForeignKey(Bid, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Qayta hisoblashda yoziladigan ustunlar. accepted_bid faqat Bid.accept() da yoziladi (qayta hisoblash
+    # eski holatni ko'rgan bo'lsa, qabul qilingan taklifni NULL bilan bosib ketmasligi uchun); yangi qatorda hisoblanadi
+    FIELDS = ['bid_count', 'lowest_price', 'highest_price', 'updated_at']
+
+    @classmethod
+    def compute(cls, cargo_ids):
+        """Berilgan yuklar uchun yig'indilarni bitta GROUP BY so'rovi bilan hisoblaydi"""
+        rows = Bid.objects.filter(cargo_id__in=cargo_ids).values('cargo_id').annotate(
+            bid_count=models.Count('id'),
+            lowest_price=models.Min('proposed_price'),
+            highest_price=models.Max('proposed_price'),
+            accepted_bid_id=models.Max('id', filter=models.Q(status='accepted')),
+        ).order_by()
+        summaries = {row['cargo_id']: cls(updated_at=timezone.now(), **row) for row in rows}
+        return [summaries.get(cargo_id) or cls(cargo_id=cargo_id, updated_at=timezone.now()) for cargo_id in cargo_ids]
+
+    @classmethod
+    def refresh(cls, cargo_ids):
+        """Yig'indilarni yuk qatorlari qulfi ostida qayta hisoblab, bitta upsert bilan yozadi"""
+        cargo_ids = list(cargo_ids)
+        with transaction.atomic(savepoint=False):
+            Cargo.lock_rows(cargo_ids)
+            cls.objects.bulk_create(
+                cls.compute(cargo_ids), update_conflicts=True, unique_fields=['cargo'], update_fields=cls.FIELDS
+            )
+
+    @classmethod
+    def refresh_existing(cls, cargo_ids):
+        """Faqat mavjud qatorlarni yangilaydi (kaskad o'chirishda yangi qator yaratmaslik uchun)"""
+        cargo_ids = list(cargo_ids)
+        with transaction.atomic(savepoint=False):
+            Cargo.lock_rows(cargo_ids)
+            for summary in cls.compute(cargo_ids):
+                cls.objects.filter(cargo_id=summary.cargo_id).update(
+                    **{field: getattr(summary, field) for field in cls.FIELDS}
+                )
+
+    def __str__(self):
+        return f"{self.cargo_id}: {self.bid_count} ta bid"
+
+
+class Tracking(ChangeLogMixin, TrackedFieldsMixin, models.Model):
     cargo = models.OneToOneField(Cargo, on_delete=models.CASCADE, related_name='tracking')
     driver = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name='trackings')
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='trackings')
-    current_location = models.CharField(max_length=255)
+    current_location = models.CharField(max_length=255, blank=True)  # matnli manzil (ixtiyoriy)
+    last_position = models.ForeignKey('TrackingPosition', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')  # oxirgi GPS nuqta
     status = models.CharField(max_length=20, choices=[('pending', 'Kutilmoqda'),('in_transit', 'Yukda'),('delivered', 'Yetkazildi')], default='pending')
     last_updated = models.DateTimeField(auto_now=True)
 
+    CARGO_STATUS_FOR = {'delivered': 'completed', 'in_transit': 'in_progress'}
+
+    class Meta:
+        indexes = [
+            # Admin ro'yxatidagi status filtri
+            models.Index(fields=['status', 'id'], name='tracking_status_idx'),
+        ]
+
     def save(self, *args, **kwargs):
-        if self.status == "delivered":
-            self.cargo.cargo_status = 'completed'
-        elif self.status == "in_transit":
-            self.cargo.cargo_status = 'in_progress'
-        self.cargo.save()
+        status_changed = self.has_changed('status')
+        # Cargo faqat kuzatuv holati o'zgarib, yuk holatiga ta'sir qilsagina saqlanadi
+        cargo_status = self.CARGO_STATUS_FOR.get(self.status)
+        if status_changed and cargo_status and self.cargo.cargo_status != cargo_status:
+            self.cargo.cargo_status = cargo_status
+            self.cargo.save()
         super().save(*args, **kwargs)
+        if status_changed:
+            publish_cargo_event(self.cargo_id, 'tracking_status', status=self.status)
+
+    def record_position(self, latitude, longitude, speed=None, recorded_at=None):
+        """Yangi GPS nuqtani qo'shadi va faqat oxirgi nuqta ko'rsatkichini yangilaydi (cargo saqlanmaydi)"""
+        with transaction.atomic():
+            position = TrackingPosition.objects.create(
+                tracking=self, latitude=latitude, longitude=longitude, speed=speed,
+                recorded_at=recorded_at or timezone.now(),
+            )
+            # Kechikib kelgan (eskiroq) nuqta oxirgi nuqtani almashtirmasligi kerak
+            Tracking.objects.filter(
+                models.Q(last_position__isnull=True) | models.Q(last_position__recorded_at__lte=position.recorded_at),
+                pk=self.pk,
+            ).update(last_position=position, last_updated=timezone.now())
+            ChangeLog.record(Tracking, [self.pk])
+        response_cache.bump(Tracking)
+        publish_cargo_event(
+            self.cargo_id, 'position', latitude=position.latitude, longitude=position.longitude,
+            speed=position.speed, recorded_at=position.recorded_at,
+        )
+        return position
 
     def __str__(self):
         return f"Tracking {self.id}: {self.status} at {self.current_location}"
+
+
+class TrackingPosition(models.Model):
+    """Haydovchining GPS nuqtalari tarixi (faqat qo'shiladi, o'zgartirilmaydi)"""
+    tracking = models.ForeignKey(Tracking, on_delete=models.CASCADE, related_name='positions', db_index=False)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    speed = models.FloatField(null=True, blank=True)  # km/soat
+    recorded_at = models.DateTimeField()  # qurilmada qayd etilgan vaqt
+
+    class Meta:
+        indexes = [
+            # (tracking, recorded_at) indeksi FK indeksini ham o'rnini bosadi
+            models.Index(fields=['tracking', 'recorded_at'], name='tracking_position_time_idx'),
+        ]
+
+    @classmethod
+    def bulk_record(cls, positions):
+        """Ko'p nuqtani bitta multi-row INSERT bilan yozadi, so'ng oxirgi nuqta ko'rsatkichlarini bitta UPDATE bilan yangilaydi"""
+        tracking_ids = sorted({position.tracking_id for position in positions})
+        latest = cls.objects.filter(tracking=models.OuterRef('pk')).order_by('-recorded_at', '-id').values('pk')[:1]
+        trackings = Tracking.objects.filter(pk__in=tracking_ids)
+        with transaction.atomic():
+            positions = cls.objects.bulk_create(positions)
+            trackings.update(last_position=models.Subquery(latest), last_updated=timezone.now())
+            ChangeLog.record(Tracking, tracking_ids)
+        response_cache.bump(Tracking)
+        for cargo_id, *position in trackings.values_list(
+            'cargo_id', 'last_position__latitude', 'last_position__longitude', 'last_position__speed', 'last_position__recorded_at'
+        ):
+            publish_cargo_event(
+                cargo_id, 'position', **dict(zip(('latitude', 'longitude', 'speed', 'recorded_at'), position))
+            )
+        return positions
+
+    def __str__(self):
+        return f"{self.latitude}, {self.longitude} ({self.recorded_at})"
     
 
-class DispatcherOrder(models.Model):
+class DispatcherOrder(ChangeLogMixin, TrackedFieldsMixin, models.Model):
     dispatcher = models.ForeignKey(OwnerDispatcher, on_delete=models.CASCADE, related_name='managed_cargos',)
     cargo = models.OneToOneField(Cargo,  on_delete=models.CASCADE,  related_name='dispatcher_assignment')
     assigned_driver = models.ForeignKey(Driver,  on_delete=models.SET_NULL,  null=True, blank=True,  related_name='assigned_cargos')
@@ -263,10 +647,69 @@ class DispatcherOrder(models.Model):
             raise ValidationError("Buyurtmaga tayinlangan haydovchi mavjud emas!")
 
 
-class Payment(models.Model):
+class Payment(TrackedFieldsMixin, models.Model):
     cargo = models.ForeignKey(Cargo, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
 
+class ChangeLog(models.Model):
+    """
+    O'zgarishlar jurnali (outbox): yuk, bid, kuzatuv va dispetcher buyurtmalarining har bir
+    o'zgarishi yoki o'chirilishi (tombstone) o'sha tranzaksiyada shu yerga yoziladi.
+    Mijozlar "shu kursordan keyingi o'zgarishlar"ni so'raydi. Kursor - (txid, id) juftligi:
+    id insert vaqtida beriladi, commit tartibi esa boshqacha bo'lishi mumkin, shuning uchun
+    PostgreSQL da yozuvlar tranzaksiya raqami (txid) bo'yicha tartiblanadi va faqat tugagan
+    tranzaksiyalarniki beriladi (feed() ga qarang).
+    """
+    ACTIONS = [('upsert', "Yaratildi/o'zgardi"), ('delete', "O'chirildi")]
+
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTIONS, default='upsert')
+    created_at = models.DateTimeField(default=timezone.now)
+    # PostgreSQL: yozgan tranzaksiya raqami (pg_current_xact_id). Boshqa bazalarda 0 - tartib id bo'yicha
+    txid = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'id'], name='changelog_model_seq_idx'),
+            models.Index(fields=['txid', 'id'], name='changelog_commit_order_idx'),
+        ]
+
+    @classmethod
+    def record(cls, model, object_ids, action='upsert'):
+        """Bir nechta obyekt uchun yozuvlar (queryset.update() dan keyin ham chaqiriladi)"""
+        now = timezone.now()
+        txid = 0
+        if connections[router.db_for_write(cls)].vendor == 'postgresql':
+            txid = RawSQL("pg_current_xact_id()::text::bigint", [])
+        cls.objects.bulk_create([
+            cls(model=model._meta.model_name, object_id=object_id, action=action, created_at=now, txid=txid)
+            for object_id in object_ids
+        ])
+
+    @classmethod
+    def feed(cls, after, settle):
+        """
+        after=(txid, id) kursoridan keyingi yozuvlar, kursor tartibida.
+        PostgreSQL da faqat tugagan tranzaksiyalarning yozuvlari: txid < eng eski ochiq tranzaksiya
+        (pg_snapshot_xmin). Ochiq tranzaksiya commit bo'lganda uning yozuvlari berilgan kursordan
+        keyin tushadi, demak hech narsa yo'qolmaydi (uzoq ochiq tranzaksiya oqimni ushlab turadi).
+        Boshqa bazalarda txid yo'q: faqat settle soniyadan eski yozuvlar beriladi - bu vaqtdan
+        kechroq commit bo'lgan yozuv mijoz kursori ortida qolib ketishi mumkin.
+        """
+        txid, last_id = after
+        queryset = cls.objects.filter(models.Q(txid__gt=txid) | models.Q(txid=txid, id__gt=last_id)).order_by('txid', 'id')
+        if connections[router.db_for_read(cls)].vendor == 'postgresql':
+            return queryset.filter(txid__lt=RawSQL("pg_snapshot_xmin(pg_current_snapshot())::text::bigint", []))
+        return queryset.filter(created_at__lte=timezone.now() - timedelta(seconds=settle))
+
+    @property
+    def cursor(self):
+        return f"{self.txid}:{self.id}"
+
+    def __str__(self):
+        return f"#{self.id} {self.model}:{self.object_id} {self.action}"
@@ -0,0 +1,115 @@
+import hashlib
+import hmac
+import secrets
+import time
+
+import phonenumbers
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.exceptions import Throttled, ValidationError
+
+from .utils import generate_auth_code
+
+
+class OTPStore:
+    """
+    Bir martalik kodlar (OTP) keshda saqlanadi, User jadvaliga yozilmaydi.
+    Kod faqat HMAC ko'rinishida saqlanadi, muddati (TTL) va urinishlar soni cheklangan,
+    bitta raqamga yuborish soni ham vaqt oynasi bo'yicha cheklanadi.
+
+    Urinishlar alohida atomik hisoblagichda (add + incr) sanaladi va kod solishtirishdan oldin
+    tekshiriladi, to'g'ri kod bir martalik add() bilan "band qilinadi": parallel so'rovlar
+    urinishlar chegarasini chetlab o'tolmaydi va bitta kodni ikki marta ishlatolmaydi.
+    """
+
+    def __init__(self, cache=None):
+        self._cache = cache
+
+    @property
+    def cache(self):
+        return self._cache or caches[settings.OTP_CACHE_ALIAS]
+
+    @staticmethod
+    def phone_number(value):
+        """
+        Kod User.phone_number (E164) bo'yicha saqlanadi, shuning uchun so'rovdagi raqam ham E164 ga
+        keltiriladi: "90 123 45 67", "998901234567" va "+998901234567" bitta kalitga tushadi
+        """
+        try:
+            number = phonenumbers.parse(str(value or ''), 'UZ')
+        except phonenumbers.NumberParseException:
+            number = None
+        if number is None or not phonenumbers.is_valid_number(number):
+            raise ValidationError({"phone_number": ["Telefon raqam noto‘g‘ri."]})
+        return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+
+    @staticmethod
+    def normalize(value):
+        return str(value).replace(' ', '').replace('-', '')
+
+    def _key(self, purpose, subject):
+        return f"otp:{purpose}:{self.normalize(subject)}"
+
+    def _hash(self, purpose, subject, code):
+        message = f"{purpose}:{self.normalize(subject)}:{code}".encode()
+        return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+    def throttle(self, phone_number):
+        """Bitta raqamga OTP_SEND_WINDOW soniya ichida OTP_SEND_LIMIT tadan ortiq kod yuborilmaydi"""
+        key = f"otp-sends:{self.normalize(phone_number)}"
+        if self.cache.add(key, 1, timeout=settings.OTP_SEND_WINDOW):
+            return
+        try:
+            sent = self.cache.incr(key)
+        except ValueError:  # kalit shu orada eskirgan
+            self.cache.add(key, 1, timeout=settings.OTP_SEND_WINDOW)
+            return
+        if sent > settings.OTP_SEND_LIMIT:
+            raise Throttled(detail="Juda ko'p kod so'raldi. Birozdan keyin qayta urinib ko'ring.")
+
+    def issue(self, purpose, subject, phone_number=None, **payload):
+        """Yangi kod yaratadi va saqlaydi. Ochiq kodni qaytaradi (SMS yuborish uchun)"""
+        self.throttle(phone_number or subject)
+        code = generate_auth_code()
+        entry = {
+            'id': secrets.token_hex(8),  # urinishlar va band qilish kalitlari har bir kod uchun alohida
+            'hash': self._hash(purpose, subject, code),
+            'expires_at': time.time() + settings.OTP_TTL,
+            'payload': payload,
+        }
+        self.cache.set(self._key(purpose, subject), entry, timeout=settings.OTP_TTL)
+        return code
+
+    def check(self, purpose, subject, code):
+        """Kod to'g'ri bo'lsa payload (dict) ni qaytaradi va kodni o'chiradi, aks holda None"""
+        key = self._key(purpose, subject)
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        remaining = entry['expires_at'] - time.time()
+        if remaining <= 0:
+            self.cache.delete(key)
+            return None
+
+        attempts_key = f"otp-attempts:{key}:{entry['id']}"
+        self.cache.add(attempts_key, 0, timeout=remaining)
+        try:
+            attempts = self.cache.incr(attempts_key)
+        except ValueError:  # kalit shu orada eskirgan
+            return None
+        if attempts > settings.OTP_MAX_ATTEMPTS:
+            self.cache.delete(key)
+            return None
+
+        if not hmac.compare_digest(entry['hash'], self._hash(purpose, subject, code)):
+            if attempts >= settings.OTP_MAX_ATTEMPTS:
+                self.cache.delete(key)
+            return None
+        if not self.cache.add(f"otp-claimed:{key}:{entry['id']}", 1, timeout=remaining):
+            return None  # parallel so'rov shu kodni allaqachon ishlatgan
+        self.cache.delete_many([key, attempts_key])
+        return entry['payload']
+
+
+otp_store = OTPStore()
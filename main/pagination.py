@@ -0,0 +1,74 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+def estimate_count(queryset):
+    """Qatorlar sonini taxminan aniqlash (PostgreSQL rejalashtiruvchisi bahosi). Baholab bo'lmasa None"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Barcha ro'yxatlar uchun cursor (keyset) sahifalash: chuqur sahifalar ham
+    birinchi sahifa kabi tez (OFFSET yo'q, "id < oxirgi id" bo'yicha indeksdan o'qiladi).
+
+    Umumiy son faqat so'ralganda: ?count=exact (COUNT(*)) yoki ?count=estimate
+    (PostgreSQL bahosi, boshqa bazalarda null).
+    """
+    ordering = '-id'  # id har doim indekslangan va yaratilish tartibiga mos
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            self.count = queryset.count()
+        elif mode == 'estimate':
+            self.count = estimate_count(queryset)
+        else:
+            self.count = None
+        self.count_mode = mode
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        payload = {'next': self.get_next_link(), 'previous': self.get_previous_link()}
+        if self.count_mode in ('exact', 'estimate'):
+            payload['count'] = self.count
+        payload['results'] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count'] = {'type': 'integer', 'nullable': True}
+        return response_schema
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin ro'yxatlari uchun: katta jadvallarda COUNT(*) o'rniga rejalashtiruvchi bahosi.
+    Baho kichik bo'lsa (yoki baholab bo'lmasa) aniq son hisoblanadi.
+    """
+    exact_count_below = 10_000
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < self.exact_count_below:
+            return super().count
+        return estimate
@@ -0,0 +1,45 @@
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Har bir qatorda bitta JSON obyekt (application/x-ndjson) -> obyektlar ro'yxati.
+    So'rov tanasi DATA_UPLOAD_MAX_MEMORY_SIZE dan, qatorlar soni max_items dan oshsa - o'qish darhol to'xtaydi
+    (butun tana dekodlanmaydi).
+    """
+    media_type = 'application/x-ndjson'
+    max_items = 1000
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        max_size = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        request = parser_context.get('request')
+        if max_size is not None and request is not None:
+            try:
+                content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                content_length = 0
+            if content_length > max_size:
+                raise ParseError("So'rov hajmi juda katta.")
+
+        items = []
+        size = 0
+        for number, line in enumerate(stream, start=1):
+            size += len(line)
+            if max_size is not None and size > max_size:  # Content-Length siz (chunked) so'rovlar uchun
+                raise ParseError("So'rov hajmi juda katta.")
+            line = line.strip()
+            if not line:
+                continue
+            if len(items) >= self.max_items:
+                raise ParseError(f"Bitta so'rovda {self.max_items} tadan ortiq qator bo'lishi mumkin emas.")
+            try:
+                items.append(json.loads(line.decode(encoding)))
+            except ValueError as exc:
+                raise ParseError(f"{number}-qatorda JSON xato: {exc}")
+        return items
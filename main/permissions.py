@@ -0,0 +1,85 @@
+"""
+Ruxsatlar (permissions) uchun umumiy kesh.
+
+Foydalanuvchilar asosan uchta rol guruhida (dispatcher_group, carrier_group, owner_group),
+shuning uchun guruh ruxsatlari guruhlar to'plami bo'yicha bitta marta keshlanadi va
+shu to'plamdagi barcha foydalanuvchilar uchun ishlatiladi. Har bir foydalanuvchi uchun
+faqat uning guruhlari ro'yxati va to'g'ridan-to'g'ri berilgan ruxsatlari saqlanadi.
+
+Guruh ruxsatlari o'zgarsa versiya oshadi (eski yozuvlar ishlatilmay qoladi), foydalanuvchi
+guruhi yoki ruxsati o'zgarsa faqat uning yozuvi o'chiriladi. Kesh umumiy bo'lsa (Redis)
+bu barcha worker jarayonlarga birdaniga ta'sir qiladi. Ikkalasi ham darhol va commit dan keyin
+bajariladi: commit dan oldin parallel so'rov eski ruxsatlarni yangi versiya ostida keshlab
+qo'ygan bo'lsa ham, ular commit dan keyin ishlatilmaydi.
+"""
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.cache import caches
+from django.db import transaction
+
+
+def _format(rows):
+    return {f"{app_label}.{codename}" for app_label, codename in rows}
+
+
+class PermissionCache:
+    version_key = 'perms:groups-version'
+
+    def __init__(self, cache=None):
+        self._cache = cache
+
+    @property
+    def cache(self):
+        return self._cache or caches[settings.PERMISSION_CACHE_ALIAS]
+
+    def _version(self):
+        return self.cache.get_or_set(self.version_key, 0, timeout=None)
+
+    def _bump(self):
+        try:
+            self.cache.incr(self.version_key)
+        except ValueError:
+            self.cache.set(self.version_key, 1, timeout=None)
+
+    def bump(self):
+        """Guruh ruxsatlari o'zgardi - barcha guruh to'plamlari qayta hisoblanadi"""
+        self._bump()
+        transaction.on_commit(self._bump)
+
+    def forget_users(self, user_ids):
+        keys = [f"perms:user:{user_id}" for user_id in user_ids]
+        self.cache.delete_many(keys)
+        transaction.on_commit(lambda: self.cache.delete_many(keys))
+
+    def _user_entry(self, user_id):
+        from .models import User
+
+        key = f"perms:user:{user_id}"
+        entry = self.cache.get(key)
+        if entry is None:
+            entry = {
+                'groups': tuple(sorted(User.groups.through.objects.filter(user_id=user_id).values_list('group_id', flat=True))),
+                'perms': _format(Permission.objects.filter(user=user_id).values_list('content_type__app_label', 'codename')),
+            }
+            self.cache.set(key, entry, timeout=settings.PERMISSION_CACHE_TIMEOUT)
+        return entry
+
+    def group_permissions(self, group_ids):
+        if not group_ids:
+            return set()
+        key = f"perms:groups:{self._version()}:{','.join(map(str, group_ids))}"
+        perms = self.cache.get(key)
+        if perms is None:
+            perms = _format(
+                Permission.objects.filter(group__in=group_ids).values_list('content_type__app_label', 'codename')
+            )
+            self.cache.set(key, perms, timeout=settings.PERMISSION_CACHE_TIMEOUT)
+        return perms
+
+    def for_user(self, user_id):
+        """Foydalanuvchining barcha ruxsatlari ("app_label.codename" to'plami)"""
+        entry = self._user_entry(user_id)
+        return entry['perms'] | self.group_permissions(entry['groups'])
+
+
+permission_cache = PermissionCache()
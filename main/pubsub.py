@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Bitta kanal obunasi. Xabarlar istalgan oqimdan (thread) kelishi mumkin, o'qish esa event loop ichida"""
+
+    def __init__(self, broker, channel, maxsize=100):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, message):
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        if self.queue.full():  # sekin mijoz: eng eski xabarni tashlab yuboramiz
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+
+class BaseBroker:
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InMemoryBroker(BaseBroker):
+    """Bitta jarayon (process) ichidagi pub/sub. Testlar va bitta worker uchun"""
+
+    def __init__(self):
+        self._channels = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.put(message)
+            except RuntimeError:  # event loop yopilgan
+                self.unsubscribe(subscription)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._channels[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._channels.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._channels[subscription.channel]
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._channels.get(channel, ()))
+
+
+class PostgresBroker(InMemoryBroker):
+    """PostgreSQL LISTEN/NOTIFY orqali bir nechta worker o'rtasida tarqatish.
+    Har bir jarayon bitta tinglovchi oqim ochadi va xabarlarni o'z obunachilariga tarqatadi.
+    Ulanish uzilsa (baza qayta ishga tushishi, idle timeout) oqim kutib qayta ulanadi; uzilish
+    vaqtidagi xabarlar yo'qoladi, mijozlar qayta ulanganda snapshot oladi."""
+    notify_channel = 'tracking_events'
+    idle_timeout = 60  # soniya: shuncha vaqt xabar bo'lmasa ulanish SELECT 1 bilan tekshiriladi
+    reconnect_delays = (1, 2, 5, 10, 30)  # soniya, ketma-ket muvaffaqiyatsiz urinishlar uchun
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def publish(self, channel, message):
+        payload = json.dumps({'channel': channel, 'message': message}, cls=DjangoJSONEncoder)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.notify_channel, payload])
+
+    def subscribe(self, channel):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='pubsub-listener', daemon=True)
+                self._listener.start()
+        return super().subscribe(channel)
+
+    def _connect(self):
+        import psycopg2
+
+        db = settings.DATABASES['default']
+        conn = psycopg2.connect(
+            dbname=db['NAME'], user=db['USER'], password=db['PASSWORD'], host=db['HOST'], port=db['PORT']
+        )
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.notify_channel}")
+        return conn
+
+    def _listen(self):
+        failures = 0
+        while True:
+            conn = None
+            try:
+                conn = self._connect()
+                if failures:
+                    logger.warning("pubsub: LISTEN ulanishi tiklandi")
+                failures = 0
+                self._receive(conn)
+            except Exception:
+                delay = self.reconnect_delays[min(failures, len(self.reconnect_delays) - 1)]
+                failures += 1
+                logger.exception("pubsub: LISTEN ulanishi uzildi, %s soniyadan keyin qayta ulanamiz", delay)
+                time.sleep(delay)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+
+    def _receive(self, conn):
+        while True:
+            if select.select([conn], [], [], self.idle_timeout) == ([], [], []):
+                with conn.cursor() as cursor:  # yarim ochiq (uzilgan) ulanishni aniqlash uchun
+                    cursor.execute("SELECT 1")
+                continue
+            conn.poll()
+            while conn.notifies:
+                event = json.loads(conn.notifies.pop(0).payload)
+                InMemoryBroker.publish(self, event['channel'], event['message'])
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.TRACKING_PUBSUB_BACKEND)()
+    return _broker
+
+
+def cargo_channel(cargo_id):
+    return f"cargo.{cargo_id}"
+
+
+def publish_cargo_event(cargo_id, event, **data):
+    """Yuk obunachilariga xabar yuborish. Tranzaksiya muvaffaqiyatli yakunlangandan keyingina yuboriladi"""
+    message = {'type': event, 'cargo': cargo_id, **data}
+    transaction.on_commit(lambda: get_broker().publish(cargo_channel(cargo_id), message))
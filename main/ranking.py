@@ -0,0 +1,136 @@
+"""
+Dispetcher uchun haydovchilarni reytinglash.
+
+Barcha tasdiqlangan haydovchilarning belgilari (features) bitta so'rov bilan
+NumPy massivlariga yuklanadi va yuklar bo'yicha ballar matritsa ko'rinishida
+birdaniga hisoblanadi (haydovchilar × yuklar).
+"""
+import numpy as np
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Bid, Cargo, DispatcherOrder, Driver, Tracking
+
+
+WEIGHTS = {
+    'capacity': 0.35,    # mashina sig'imi yukka qanchalik mos (to'liq yuklangan yaxshiroq)
+    'distance': 0.30,    # haydovchining oxirgi joylashuvi yuk olish nuqtasiga yaqinligi
+    'acceptance': 0.20,  # bid-lari qabul qilinish tarixi
+    'workload': 0.15,    # hozirgi bajarilayotgan buyurtmalar soni
+}
+DISTANCE_SCALE_KM = 150  # shu masofada distance balli ~0.37 ga tushadi
+UNKNOWN_DISTANCE_SCORE = 0.5  # koordinata bo'lmasa neytral ball
+EARTH_RADIUS_KM = 6371.0
+CARGO_CHUNK = 256  # katta matritsalarni xotirada bo'laklab hisoblaymiz
+
+
+def _count(queryset, group_by):
+    return Coalesce(Subquery(queryset.order_by().values(group_by).annotate(n=Count('pk')).values('n')[:1]), 0)
+
+
+class DriverFeatures:
+    def __init__(self, ids, capacity_kg, latitude, longitude, bids_total, bids_accepted, active_orders):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.capacity_kg = np.asarray(capacity_kg, dtype=np.float64)  # mashinasi yo'q bo'lsa nan
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.bids_total = np.asarray(bids_total, dtype=np.float64)
+        self.bids_accepted = np.asarray(bids_accepted, dtype=np.float64)
+        self.active_orders = np.asarray(active_orders, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, drivers=None):
+        """Tasdiqlangan haydovchilar belgilarini bitta SQL so'rov bilan yuklaydi"""
+        drivers = Driver.objects.filter(is_verified=True) if drivers is None else drivers
+        last_position = Tracking.objects.filter(driver=OuterRef('pk'), last_position__isnull=False).order_by('-last_updated')
+        rows = drivers.annotate(
+            latitude=Subquery(last_position.values('last_position__latitude')[:1]),
+            longitude=Subquery(last_position.values('last_position__longitude')[:1]),
+            bids_total=_count(Bid.objects.filter(driver=OuterRef('pk')), 'driver'),
+            bids_accepted=_count(Bid.objects.filter(driver=OuterRef('pk'), status='accepted'), 'driver'),
+            active_orders=_count(DispatcherOrder.objects.filter(
+                assigned_driver=OuterRef('pk'), cargo__cargo_status='in_progress'
+            ), 'assigned_driver'),
+        ).values_list(
+            'id', 'vehicle__capacity_kg', 'latitude', 'longitude', 'bids_total', 'bids_accepted', 'active_orders'
+        ).order_by('id')
+        columns = list(zip(*rows)) or [()] * 7
+        return cls(*[[np.nan if value is None else value for value in column] for column in columns])
+
+
+class CargoFeatures:
+    def __init__(self, ids, weight_kg, latitude, longitude):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.weight_kg = np.asarray(weight_kg, dtype=np.float64)
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, cargos):
+        rows = Cargo.objects.filter(pk__in=[getattr(cargo, 'pk', cargo) for cargo in cargos]).values_list(
+            'id', 'weight_kg', 'pickup_location__latitude', 'pickup_location__longitude'
+        ).order_by('id')
+        columns = list(zip(*rows)) or [()] * 4
+        return cls(*[[np.nan if value is None else float(value) for value in column] for column in columns])
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def score(drivers, cargos):
+    """(yuklar × haydovchilar) ball matritsasi. Sig'maydigan yoki mashinasi yo'q haydovchilar -inf oladi"""
+    weight = cargos.weight_kg[:, None]
+    capacity = drivers.capacity_kg[None, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fits = capacity >= weight  # nan bilan taqqoslash False beradi
+        capacity_score = np.where(fits, weight / capacity, 0.0)
+
+        distance = _haversine_km(cargos.latitude[:, None], cargos.longitude[:, None],
+                                 drivers.latitude[None, :], drivers.longitude[None, :])
+        distance_score = np.where(np.isnan(distance), UNKNOWN_DISTANCE_SCORE, np.exp(-distance / DISTANCE_SCALE_KM))
+
+    acceptance_score = (drivers.bids_accepted + 1) / (drivers.bids_total + 2)  # Laplace silliqlash
+    workload_score = 1 / (1 + drivers.active_orders)
+
+    total = (
+        WEIGHTS['capacity'] * capacity_score
+        + WEIGHTS['distance'] * distance_score
+        + (WEIGHTS['acceptance'] * acceptance_score + WEIGHTS['workload'] * workload_score)[None, :]
+    )
+    return np.where(fits, total, -np.inf)
+
+
+def top_k(drivers, cargos, k=10):
+    """Har bir yuk uchun eng yaxshi k ta haydovchi: {cargo_id: [(driver_id, ball), ...]}"""
+    result = {}
+    k = min(k, len(drivers))
+    if k == 0:
+        return {int(cargo_id): [] for cargo_id in cargos.ids}
+    for start in range(0, len(cargos), CARGO_CHUNK):
+        chunk = slice(start, start + CARGO_CHUNK)
+        scores = score(drivers, CargoFeatures(cargos.ids[chunk], cargos.weight_kg[chunk],
+                                              cargos.latitude[chunk], cargos.longitude[chunk]))
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best, best_scores = np.take_along_axis(best, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+        for cargo_id, indexes, values in zip(cargos.ids[chunk], best, best_scores):
+            result[int(cargo_id)] = [
+                (int(drivers.ids[index]), round(float(value), 4))
+                for index, value in zip(indexes, values) if np.isfinite(value)
+            ]
+    return result
+
+
+def rank_drivers(cargo, k=10):
+    """Bitta yuk uchun haydovchilar reytingi"""
+    return top_k(DriverFeatures.load(), CargoFeatures.load([cargo]), k)[cargo.pk]
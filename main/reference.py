@@ -0,0 +1,103 @@
+"""
+Viloyat va tuman/shaharlar ma'lumotnomasi (deyarli o'zgarmaydi).
+
+Butun daraxt har bir jarayonda bir marta yuklanadi va xotirada saqlanadi.
+Umumiy keshdagi versiya o'zgarsa (Region yoki AdministrativeUnit saqlansa/o'chirilsa)
+keyingi murojaatda qayta yuklanadi. bulk_create/update ishlatilsa bump_version()
+ni qo'lda chaqirish kerak.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import AdministrativeUnit, Region
+
+VERSION_KEY = 'reference:version'
+
+
+def _cache():
+    return caches[settings.REFERENCE_CACHE_ALIAS]
+
+
+def current_version():
+    # Hisoblagich emas, vaqt: kesh tozalansa ham eski ETag bilan to'qnashmaydi
+    return _cache().get_or_set(VERSION_KEY, time.time_ns, timeout=None)
+
+
+def bump_version():
+    """Barcha jarayonlardagi snapshot-ni eskirgan deb belgilash"""
+    _cache().set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def bump_version_on_change():
+    # Darhol (shu jarayon o'z o'zgarishini ko'rishi uchun) va commit dan keyin
+    # (boshqa jarayonlar commit qilinmagan ma'lumotni yuklab olgan bo'lsa) yangilaymiz
+    bump_version()
+    transaction.on_commit(bump_version)
+
+
+class ReferenceSnapshot:
+    def __init__(self, version):
+        self.version = version
+        self.regions = {row['id']: row for row in Region.objects.values('id', 'name').order_by('id')}
+        self.units = {
+            row['id']: row
+            for row in AdministrativeUnit.objects.values('id', 'region_id', 'name', 'latitude', 'longitude').order_by('id')
+        }
+        self.units_by_region = {region_id: [] for region_id in self.regions}
+        for unit in self.units.values():
+            self.units_by_region[unit['region_id']].append(unit)
+
+    @property
+    def etag(self):
+        return f'"reference-{self.version}"'
+
+    def instance(self, model, pk):
+        """Snapshot-dagi yozuvdan model obyekti (bazaga murojaatsiz). Topilmasa None"""
+        rows = self.regions if model is Region else self.units
+        row = rows.get(pk)
+        if row is None:
+            return None
+        instance = model(**row)
+        instance._state.adding = False
+        instance._state.db = DEFAULT_DB_ALIAS
+        return instance
+
+    def unit_data(self, unit):
+        """AdministrativeUnitSerializer (depth=1) bilan bir xil ko'rinish"""
+        return {
+            'id': unit['id'],
+            'name': unit['name'],
+            'latitude': unit['latitude'],
+            'longitude': unit['longitude'],
+            'region': self.regions[unit['region_id']],
+        }
+
+    def as_data(self):
+        return {
+            'version': str(self.version),
+            'regions': [
+                {**region, 'units': [
+                    {key: unit[key] for key in ('id', 'name', 'latitude', 'longitude')}
+                    for unit in self.units_by_region[region_id]
+                ]}
+                for region_id, region in self.regions.items()
+            ],
+        }
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def get_snapshot():
+    global _snapshot
+    version = current_version()
+    if _snapshot is None or _snapshot.version != version:
+        with _lock:
+            if _snapshot is None or _snapshot.version != version:
+                _snapshot = ReferenceSnapshot(version)
+    return _snapshot
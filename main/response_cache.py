@@ -0,0 +1,73 @@
+"""
+Ko'p o'qiladigan ro'yxatlar uchun server tomonidagi javob keshi.
+
+Har bir model uchun keshda "avlod" (generation) kaliti bor. Javob kaliti endpoint,
+so'rov parametrlari, foydalanuvchi doirasi (rol yoki o'zi) va bog'liq modellar
+avlodlaridan tuziladi. Model o'zgarsa (post_save/post_delete yoki .update() dan keyin
+bump() qo'lda chaqirilganda) uning avlodi yangilanadi va unga bog'liq javoblar
+ishlatilmay qoladi. Signal yubormaydigan yo'llar uchun eskirish RESPONSE_CACHE_TIMEOUT
+bilan chegaralangan.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+class ResponseCache:
+    def __init__(self, cache=None):
+        self._cache = cache
+        self.endpoints = set()  # statistikasi ko'rsatiladigan endpointlar
+
+    @property
+    def cache(self):
+        return self._cache or caches[settings.RESPONSE_CACHE_ALIAS]
+
+    @staticmethod
+    def _generation_key(model):
+        return f"response-cache:generation:{model._meta.label_lower}"
+
+    def generations(self, models):
+        keys = [self._generation_key(model) for model in models]
+        found = self.cache.get_many(keys)
+        missing = {key: time.time_ns() for key in keys if key not in found}
+        if missing:
+            self.cache.set_many(missing, timeout=None)
+        return [found.get(key) or missing[key] for key in keys]
+
+    def _bump(self, models):
+        self.cache.set_many({self._generation_key(model): time.time_ns() for model in models}, timeout=None)
+
+    def bump(self, *models):
+        """Modellarga bog'liq javoblarni eskirgan deb belgilash (darhol va commit dan keyin)"""
+        self._bump(models)
+        transaction.on_commit(lambda: self._bump(models))
+
+    def get(self, key):
+        return self.cache.get(f"response-cache:entry:{key}")
+
+    def set(self, key, entry):
+        self.cache.set(f"response-cache:entry:{key}", entry, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+
+    def count(self, endpoint, outcome):
+        key = f"response-cache:stats:{endpoint}:{outcome}"
+        if not self.cache.add(key, 1, timeout=None):
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, 1, timeout=None)
+
+    def stats(self):
+        keys = {
+            (endpoint, outcome): f"response-cache:stats:{endpoint}:{outcome}"
+            for endpoint in sorted(self.endpoints) for outcome in ('hit', 'miss')
+        }
+        values = self.cache.get_many(keys.values())
+        return {
+            endpoint: {outcome: values.get(keys[endpoint, outcome], 0) for outcome in ('hit', 'miss')}
+            for endpoint in sorted(self.endpoints)
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,129 @@
+"""
+Yuk doskasida matnli qidiruv (yuk turi, transport turi, yuklash usuli, qo'shimcha talablar).
+
+Qidiruv Cargo.search_document ustunida bajariladi: u save() da normallashtiriladi
+(kichik harf, kirill -> lotin, apostrof va tinish belgilarisiz), shuning uchun
+"Фура", "FURA" va "fura" bir xil topiladi.
+
+* PostgreSQL: to'liq so'z mosligi tsvector (GIN) indeksi bilan, xato yozilgan so'zlar
+  pg_trgm trigram (GIN) indeksi bilan topiladi. Indekslar post_migrate da yaratiladi
+  (loyihada migratsiyalar yo'q, pg_trgm kengaytmasi esa jadvaldan oldin kerak).
+* Boshqa bazalar (SQLite testlarda): o'sha trigram o'xshashligi Python da hisoblanadi.
+
+Natijalar moslik darajasi (rank) bo'yicha kamayish tartibida qaytadi.
+"""
+from functools import lru_cache
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField, TrigramWordSimilarity
+from django.db import connections, models
+
+from .models import Cargo
+from .utils import normalize_search_text
+
+CONFIG = 'simple'  # o'zbek/rus lug'ati yo'q: so'zlar o'zgarishsiz (stemming siz) indekslanadi
+WORD_SIMILARITY_THRESHOLD = 0.6  # pg_trgm.word_similarity_threshold standart qiymati
+
+
+class DocumentVector(models.Func):
+    """to_tsvector('simple', search_document) - indeks ifodasi bilan aynan bir xil bo'lishi kerak"""
+    function = 'to_tsvector'
+    output_field = SearchVectorField()
+
+    def __init__(self, expression):
+        super().__init__(models.Value(CONFIG), expression)
+
+
+@lru_cache(maxsize=65536)
+def trigrams(word):
+    """pg_trgm kabi: so'z boshiga ikki, oxiriga bitta bo'shliq qo'shib 3 belgili bo'laklar"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def word_similarity(query, document):
+    """Har bir so'rov so'zi uchun hujjatdagi eng o'xshash so'z (umumiy trigramlar ulushi), o'rtachasi"""
+    words = [trigrams(word) for word in document.split()]
+    scores = []
+    for query_word in query.split():
+        wanted = trigrams(query_word)
+        scores.append(max((len(wanted & word) / len(wanted) for word in words), default=0))
+    return sum(scores) / len(scores) if scores else 0
+
+
+class PostgresCargoSearch:
+    def search(self, queryset, text, limit):
+        query = SearchQuery(text, config=CONFIG, search_type='plain')
+        return (
+            queryset.annotate(
+                search_vector=DocumentVector('search_document'),
+                similarity=TrigramWordSimilarity(text, 'search_document'),
+            )
+            .filter(models.Q(search_vector=query) | models.Q(search_document__trigram_word_similar=text))
+            .annotate(rank=SearchRank(models.F('search_vector'), query) + models.F('similarity'))
+            .order_by('-rank', '-id')[:limit]
+        )
+
+
+class FallbackCargoSearch:
+    """Indekssiz bazalar uchun: nomzodlarning faqat (id, search_document) ustunlari o'qiladi va Python da baholanadi"""
+
+    def search(self, queryset, text, limit):
+        words = set(text.split())
+        scores = {}  # bir xil matnli yuklar ko'p: har bir matn bir marta baholanadi
+        ranked = []
+        candidates = queryset.prefetch_related(None).values_list('pk', 'search_document')
+        for pk, document in candidates.iterator(chunk_size=2000):
+            if document not in scores:
+                similarity = word_similarity(text, document)
+                exact = words <= set(document.split())
+                scores[document] = similarity + exact if exact or similarity >= WORD_SIMILARITY_THRESHOLD else None
+            if scores[document] is not None:
+                ranked.append((scores[document], pk))
+        ranked.sort(key=lambda item: (-item[0], -item[1]))
+        ranks = {pk: rank for rank, pk in ranked[:limit]}
+        cargos = queryset.in_bulk(ranks)
+        for pk, cargo in cargos.items():
+            cargo.rank = ranks[pk]
+        return sorted(cargos.values(), key=lambda cargo: (-cargo.rank, -cargo.pk))
+
+
+def get_search_backend(using):
+    return PostgresCargoSearch() if connections[using].vendor == 'postgresql' else FallbackCargoSearch()
+
+
+def search_cargos(queryset, text, limit=20):
+    """Matn bo'yicha yuklar (moslik darajasi bo'yicha). Har bir natijada rank atributi bor"""
+    text = normalize_search_text(text)
+    if not text:
+        return []
+    return list(get_search_backend(queryset.db).search(queryset, text, limit))
+
+
+def create_search_indexes(using, **kwargs):
+    """post_migrate: pg_trgm kengaytmasi, tsvector va trigram GIN indekslari (faqat ochiq yuklar uchun),
+    so'ng search_document bo'sh qolgan eski yozuvlarni to'ldirish"""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        table = connection.ops.quote_name(Cargo._meta.db_table)
+        open_statuses = ", ".join(f"'{status}'" for status in Cargo.OPEN_STATUSES)
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS cargo_search_tsv_idx ON {table} "
+                f"USING gin (to_tsvector('{CONFIG}', search_document)) WHERE cargo_status IN ({open_statuses})"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS cargo_search_trgm_idx ON {table} "
+                f"USING gin (search_document gin_trgm_ops) WHERE cargo_status IN ({open_statuses})"
+            )
+
+    stale = Cargo.objects.using(using).filter(search_document='').only('pk', *Cargo.SEARCH_FIELDS)
+    batch = []
+    for cargo in stale.iterator(chunk_size=2000):
+        cargo.refresh_search_document()
+        batch.append(cargo)
+        if len(batch) == 2000:
+            Cargo.objects.using(using).bulk_update(batch, ['search_document'])
+            batch = []
+    if batch:
+        Cargo.objects.using(using).bulk_update(batch, ['search_document'])
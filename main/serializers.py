@@ -1,27 +1,98 @@
+import base64
+
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from django.contrib.auth import get_user_model
 from rest_framework.reverse import reverse
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from .models import User, Driver, Vehicle, Tracking, Payment, Cargo, Region, AdministrativeUnit, DeliveryConfirmation, OwnerDispatcher, DispatcherOrder, Bid
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .authentication import add_claims
+from .images import DERIVATIVES, derivative_url
+from .reference import get_snapshot
+from .models import User, Driver, Vehicle, Tracking, TrackingPosition, Payment, Cargo, CargoBidSummary, Region, AdministrativeUnit, DeliveryConfirmation, OwnerDispatcher, DispatcherOrder, Bid, ChangeLog
 from django.contrib.auth import authenticate
+from django.contrib.auth.models import update_last_login
 from phonenumber_field.serializerfields import PhoneNumberField
 
 
+class DynamicFieldsMixin:
+    """
+    O'qish (GET) so'rovlarida javob maydonlarini query parametrlar bo'yicha toraytiradi:
+
+    * ``?fields=id,cargo_status`` - faqat shu maydonlar;
+    * ``?view=compact`` - Meta.compact_fields (mobil ro'yxat ekranlari uchun qisqa ko'rinish);
+    * ``?expand=customer`` - Meta.expandable_fields dagi bog'lanish id o'rniga obyekt bo'lib qaytadi.
+
+    SparseFieldsetsMixin (views) shu tanlov bo'yicha SQL ni ham toraytiradi (only/select_related).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sparse = False
+        self.expanded = set()
+        request = self._context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return
+        params = request.query_params
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        self.expanded = {name for name in params.get('expand', '').split(',') if name in expandable}
+        for name in self.expanded:
+            serializer_class = globals()[expandable[name]]
+            self.fields[name] = serializer_class(read_only=True)
+
+        selected = None
+        if params.get('view') == 'compact' and hasattr(self.Meta, 'compact_fields'):
+            selected = set(self.Meta.compact_fields)
+        if params.get('fields'):
+            selected = {name.strip() for name in params['fields'].split(',')}
+        if selected is not None:
+            for name in set(self.fields) - selected - self.expanded:
+                self.fields.pop(name)
+            self.sparse = True
+
+
+class ImageDerivativesField(serializers.Field):
+    """Rasmning kichik nusxalari manzillari: {"preview": ..., "thumbnail": ...} (main.images)"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+        urls = {kind: derivative_url(value, kind) for kind in DERIVATIVES}
+        return {kind: request.build_absolute_uri(url) if request else url for kind, url in urls.items()}
+
+
 class CustomTokenObtainSerializer(TokenObtainPairSerializer):
-    phone_number = serializers.CharField()
+    """Telefon raqam va parol bilan kirish. Parol bir marta tekshiriladi, tokenlar shu natijadan beriladi"""
+    username_field = "phone_number"
 
-    def validate(self, attrs):
-        phone_number = attrs.get("phone_number")
-        password = attrs.get("password")
+    @classmethod
+    def get_token(cls, user):
+        return add_claims(super().get_token(user), user)
 
-        user = authenticate(phone_number=phone_number, password=password)  # CustomBackend ishlaydi
+    def validate(self, attrs):
+        self.user = authenticate(
+            self.context.get("request"), phone_number=attrs["phone_number"], password=attrs["password"]
+        )  # CustomBackend ishlaydi
 
-        if user is None:
+        if self.user is None:
             raise serializers.ValidationError("Telefon raqam yoki parol noto‘g‘ri.")
-
-        data = super().validate(attrs)
-        data["phone_number"] = user.phone_number  # Token ichiga phone_number qo‘shamiz
-        return data
+        if not jwt_settings.USER_AUTHENTICATION_RULE(self.user):
+            raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+
+        refresh = self.get_token(self.user)
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, self.user)
+        return {
+            "refresh": str(refresh),
+            "access": str(refresh.access_token),
+            "phone_number": str(self.user.phone_number),  # Token ichiga phone_number qo‘shamiz
+        }
 
 
 class UserUpdateSerializer(serializers.ModelSerializer):
@@ -35,34 +106,31 @@ class UserUpdateSerializer(serializers.ModelSerializer):
 class PhoneNumberField(serializers.CharField):
     def to_internal_value(self, data):
         data = super().to_internal_value(data)
-        from .utils import validate_priority_phone_number
-        validate_priority_phone_number(data)
-        return data
+        from .utils import normalize_phone_number
+        return normalize_phone_number(data)  # tekshirilgan va normallashgan raqam
 
 
 class ChangePhoneRequestSerializer(serializers.Serializer):
     new_phone_number = PhoneNumberField()
 
     def validate_new_phone_number(self, value):
-        normalized = value.replace(' ', '').replace('-', '')
-        from .utils import validate_priority_phone_number
-        validate_priority_phone_number(normalized)
-
-        if User.objects.filter(phone_number=normalized).exists():
+        # value PhoneNumberField da tekshirilib, normallashtirilgan
+        if User.objects.filter(phone_number=value).exists():
             raise serializers.ValidationError("Bu raqam allaqachon ro'yxatdan o'tgan.")
 
-        return normalized
+        return value
     
 
 class ConfirmPhoneChangeSerializer(serializers.Serializer):
     auth_code = serializers.CharField()
 
     def validate(self, data):
+        from .otp import otp_store
         user = self.context['request'].user
-        if not user.temp_phone_number:
-            raise serializers.ValidationError("Avval telefon raqam o'zgartirishni boshlang.")
-        if user.auth_code != data['auth_code']:
-            raise serializers.ValidationError("Tasdiqlash kodi noto‘g‘ri.")
+        payload = otp_store.check('phone_change', user.pk, data['auth_code'])
+        if payload is None:
+            raise serializers.ValidationError("Tasdiqlash kodi noto‘g‘ri yoki muddati o‘tgan. Avval telefon raqam o'zgartirishni boshlang.")
+        data['new_phone_number'] = payload['new_phone_number']
         return data
 
 
@@ -82,17 +150,13 @@ class UserCreateSerializer(serializers.ModelSerializer):
         }
 
     def validate_phone_number(self, value):
-        normalized = value.replace(' ', '').replace('-', '')  # `normalize_phone` o‘rniga
-
-        # Telefon raqamini priority davlatlar uchun validatsiya qilish
-        from .utils import validate_priority_phone_number
-        validate_priority_phone_number(normalized)
+        # value PhoneNumberField da priority davlatlar bo'yicha tekshirilib, normallashtirilgan
 
         # Foydalanuvchi allaqachon ro‘yxatdan o‘tganmi?
-        if User.objects.filter(phone_number=normalized).exists():
+        if User.objects.filter(phone_number=value).exists():
             raise serializers.ValidationError("Bu raqam allaqachon ro‘yxatdan o‘tgan.")
         
-        return normalized
+        return value
 
     def validate(self, data):
         if data['password'] != data['password_confirmation']:
@@ -127,23 +191,29 @@ class VerifyCodeSerializer(serializers.Serializer):
     auth_code = serializers.CharField(max_length=6)
 
 
-class DriverSerializer(serializers.ModelSerializer):
+class DriverSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     carrier = serializers.PrimaryKeyRelatedField(queryset=User.objects.filter(role='carrier'))
+    license_image_derivatives = ImageDerivativesField(source='license_image')
+    passport_image_derivatives = ImageDerivativesField(source='passport_image')
 
     class Meta:
         model = Driver
         fields = '__all__'
-        depth = 1
         read_only_fields = ('is_verified',)
+        compact_fields = ['id', 'carrier', 'is_verified']
+        expandable_fields = {'carrier': 'UserUpdateSerializer'}  # parol va boshqa auth maydonlarisiz
 
  
-class Owner_dispatcherSerializer(serializers.ModelSerializer):
+class Owner_dispatcherSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(queryset=User.objects.filter(role__in=['owner', 'dispatcher']))
+    passport_image_derivatives = ImageDerivativesField(source='passport_image')
 
     class Meta:
         model = OwnerDispatcher
         fields = '__all__'
         read_only_fields = ('is_verified',)
+        compact_fields = ['id', 'user', 'is_verified']
+        expandable_fields = {'user': 'UserUpdateSerializer'}
     
 
 class AdminDriverVerificationSerializer(serializers.ModelSerializer):
@@ -152,13 +222,19 @@ class AdminDriverVerificationSerializer(serializers.ModelSerializer):
         fields = ['is_verified']
     
 
-class DispatcherOrderSerializer(serializers.ModelSerializer):
+class DispatcherOrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     dispatcher = serializers.PrimaryKeyRelatedField(queryset=OwnerDispatcher.objects.filter(user__role='dispatcher', is_verified=True))
     assigned_driver = serializers.PrimaryKeyRelatedField(queryset=Driver.objects.filter(is_verified=True))
     
     class Meta:
         model = DispatcherOrder
         fields = '__all__'  
+        compact_fields = ['id', 'cargo', 'assigned_driver']
+        expandable_fields = {'dispatcher': 'Owner_dispatcherSerializer', 'assigned_driver': 'DriverSerializer'}
+
+
+class DriverRankingSerializer(serializers.Serializer):
+    k = serializers.IntegerField(min_value=1, max_value=100, default=10)
 
 
 class AdminOwnerDispatcherVerificationSerializer(serializers.ModelSerializer):
@@ -167,7 +243,7 @@ class AdminOwnerDispatcherVerificationSerializer(serializers.ModelSerializer):
         model = Driver
         fields = ['is_verified']
 
-class DeliverySerializer(serializers.ModelSerializer):
+class DeliverySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     driver = serializers.PrimaryKeyRelatedField(queryset=Driver.objects.filter(is_verified=True))
     receiver = serializers.PrimaryKeyRelatedField(queryset=OwnerDispatcher.objects.filter(user__role="owner", is_verified=True))
 
@@ -175,22 +251,29 @@ class DeliverySerializer(serializers.ModelSerializer):
         model = DeliveryConfirmation
         fields = '__all__'
         read_only_fields = ['id']
+        expandable_fields = {'driver': 'DriverSerializer', 'receiver': 'Owner_dispatcherSerializer'}
 
 
-class VehicleSerializer(serializers.ModelSerializer):
+class VehicleSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     driver = serializers.PrimaryKeyRelatedField(queryset=Driver.objects.filter(is_verified=True))
     
     class Meta:
         model = Vehicle
         fields = '__all__'
+        compact_fields = ['id', 'vehicle', 'plate_number', 'capacity_kg', 'volume_capacity_l']
+        expandable_fields = {'driver': 'DriverSerializer'}
     
 
-class BidSerializer(serializers.ModelSerializer):
+class BidSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     driver = serializers.PrimaryKeyRelatedField(queryset=Driver.objects.filter(is_verified=True))
+    cargo = serializers.PrimaryKeyRelatedField(queryset=Cargo.objects.select_related('bid_summary'))  # accepted tekshiruvi uchun
 
     class Meta:
         model = Bid
-        fields = ['driver', 'cargo', 'propose', 'proposed_price']
+        fields = ['id', 'driver', 'cargo', 'propose', 'proposed_price', 'status']
+        read_only_fields = ['status']  # status faqat update-status orqali o'zgaradi
+        compact_fields = ['cargo', 'proposed_price']
+        expandable_fields = {'driver': 'DriverSerializer'}
 
 
 class BidStatusUpdateSerializer(serializers.ModelSerializer):
@@ -201,24 +284,108 @@ class BidStatusUpdateSerializer(serializers.ModelSerializer):
         fields = ["status"]
     
 
-class TrackingSerializer(serializers.ModelSerializer):
+class TrackingPositionSerializer(serializers.ModelSerializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    speed = serializers.FloatField(min_value=0, required=False, allow_null=True)
+    recorded_at = serializers.DateTimeField(required=False)
+
+    class Meta:
+        model = TrackingPosition
+        fields = ['latitude', 'longitude', 'speed', 'recorded_at']
+
+
+class TrackingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     driver = serializers.PrimaryKeyRelatedField(queryset=Driver.objects.filter(is_verified=True))
+    last_position = TrackingPositionSerializer(read_only=True)
 
     class Meta:
         model = Tracking
-        fields = ['id', 'cargo', 'driver', 'vehicle', 'current_location', 'status', 'last_updated']
+        fields = ['id', 'cargo', 'driver', 'vehicle', 'current_location', 'last_position', 'status', 'last_updated']
         read_only_fields = ['id']
+        compact_fields = ['id', 'cargo', 'status', 'last_position']
+        expandable_fields = {'driver': 'DriverSerializer', 'vehicle': 'VehicleSerializer'}
+
+
+class TrackingPingSerializer(TrackingPositionSerializer):
+    """Paket (batch) ko'rinishida yuboriladigan GPS nuqta"""
+    cargo = serializers.IntegerField()
+
+    class Meta(TrackingPositionSerializer.Meta):
+        fields = ['cargo'] + TrackingPositionSerializer.Meta.fields
+
+
+class TrackingHistorySerializer(serializers.Serializer):
+    """Marshrut tarixi uchun vaqt oralig'i (query params)"""
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=5000, default=1000)
+
+
+
+class ChangeFeedSerializer(serializers.Serializer):
+    """O'zgarishlar oqimi parametrlari (query params)"""
+    MODELS = ['cargo', 'bid', 'tracking', 'dispatcherorder']
+
+    after = serializers.RegexField(r'^\d+:\d+$', default='0:0', error_messages={'invalid': "Kursor noto'g'ri"})
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=500)
+    models = serializers.CharField(required=False)
+
+    def validate_after(self, value):
+        txid, last_id = value.split(':')
+        return int(txid), int(last_id)
+
+    def validate_models(self, value):
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = sorted(names - set(self.MODELS))
+        if unknown:
+            raise serializers.ValidationError(f"Noma'lum model(lar): {', '.join(unknown)}")
+        return names
+
+
+class ChangeLogSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChangeLog
+        fields = ['id', 'model', 'object_id', 'action', 'created_at']
 
     
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     
     class Meta:
         model = Payment
         fields = '__all__'
+        compact_fields = ['id', 'cargo', 'amount']
+
+
+class CargoBidSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CargoBidSummary
+        fields = ['bid_count', 'lowest_price', 'highest_price', 'accepted_bid']
+
 
+class ReferenceRelatedField(serializers.PrimaryKeyRelatedField):
+    """Viloyat/tuman maydoni: bazaga emas, xotiradagi ma'lumotnoma snapshot-iga qaraydi"""
 
-class CargoSerializer(serializers.ModelSerializer):
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instance = get_snapshot().instance(self.queryset.model, pk)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
+
+
+class CargoSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     bids = serializers.SerializerMethodField()  # Barcha bid-larni olish uchun
+    pickup_region = ReferenceRelatedField(queryset=Region.objects.all())
+    pickup_location = ReferenceRelatedField(queryset=AdministrativeUnit.objects.all())
+    delivery_region = ReferenceRelatedField(queryset=Region.objects.all())
+    delivery_location = ReferenceRelatedField(queryset=AdministrativeUnit.objects.all())
+    bid_summary = CargoBidSummarySerializer(read_only=True, allow_null=True)
     customer = serializers.PrimaryKeyRelatedField(queryset=OwnerDispatcher.objects.filter(user__role='owner'))
     
     class Meta:
@@ -236,16 +403,27 @@ class CargoSerializer(serializers.ModelSerializer):
             "weight",
             "weight_unit",
             "volume",
+            "volume_unit",
+            "weight_kg",
+            "volume_l",
             "readiness_choice",
             "readiness",
             "transport_type",
             "placement_method",
             "special_requirements",
+            'bid_summary',
             'bids'
         ]
+        # Ro'yxat ekrani uchun: marshrut, holat, o'lcham va bid-lar yig'indisi (bid-larning o'zisiz)
+        compact_fields = [
+            "id", "pickup_region", "pickup_location", "delivery_region", "delivery_location",
+            "cargo_status", "loading_time", "weight_kg", "volume_l", "bid_summary",
+        ]
+        expandable_fields = {'customer': 'Owner_dispatcherSerializer'}
 
     def validate(self, data):
-        """Pickup location va delivery location noto‘g‘ri viloyatga tegishli emasligini tekshiramiz"""
+        """Pickup location va delivery location noto‘g‘ri viloyatga tegishli emasligini tekshiramiz
+        (obyektlar ma'lumotnoma snapshot-idan, region_id uchun so'rov yo'q)"""
         if data["pickup_location"].region_id != data["pickup_region"].id:
             raise serializers.ValidationError(
                 {"pickup_location": "Tuman/shahar noto‘g‘ri viloyatga tegishli."}
@@ -258,22 +436,73 @@ class CargoSerializer(serializers.ModelSerializer):
 
         return data
 
+    def get_bid_update_url_template(self):
+        """'update-status' URL shablonini bir marta hisoblaymiz (har bir bid uchun reverse() chaqirmaslik uchun)"""
+        if not hasattr(self, "_bid_update_url_template"):
+            url = reverse("bid-update-status", kwargs={"pk": 0}, request=self.context.get("request"))
+            head, _, tail = url.rpartition("/0/")
+            self._bid_update_url_template = head + "/{pk}/" + tail
+        return self._bid_update_url_template
+
     def get_bids(self, obj):
         """Har bir Bid uchun 'update-status' URL yaratamiz"""
-        request = self.context.get("request")
-        bids = obj.bids.all()  # Ushbu yukga tegishli barcha bid-larni olamiz
+        url_template = self.get_bid_update_url_template()
+        bids = obj.bids.all()  # for_board() orqali oldindan yuklangan
         return [
             {
                 "bid_id": bid.id,
                 "propose": bid.propose,
                 "status": bid.status,
                 "proposed_price": bid.proposed_price,
-                "update_url": reverse("bid-update-status", kwargs={"pk": bid.id}, request=request),
+                "update_url": url_template.format(pk=bid.id),
             }
             for bid in bids
         ]
 
-    
+
+class CargoCursorSerializer(serializers.Serializer):
+    """(loading_time, id) bo'yicha keyset sahifalash parametrlari. loading_time bo'sh yuklar oxirida keladi"""
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+    def validate_cursor(self, value):
+        try:
+            loading_time, pk = base64.urlsafe_b64decode(value.encode()).decode().split("|")
+            if not loading_time:
+                return None, int(pk)
+            return serializers.DateTimeField().to_internal_value(loading_time), int(pk)
+        except (ValueError, UnicodeDecodeError, serializers.ValidationError):
+            raise serializers.ValidationError("Cursor noto‘g‘ri.")
+
+    @staticmethod
+    def encode_cursor(cargo):
+        loading_time = cargo.loading_time.isoformat() if cargo.loading_time else ""
+        return base64.urlsafe_b64encode(f"{loading_time}|{cargo.id}".encode()).decode()
+
+
+class CargoRouteSearchSerializer(CargoCursorSerializer):
+    """Marshrut qidiruvi parametrlari (query params)"""
+    pickup_region = serializers.IntegerField(required=False)
+    pickup_location = serializers.IntegerField(required=False)
+    delivery_region = serializers.IntegerField(required=False)
+    delivery_location = serializers.IntegerField(required=False)
+    cargo_status = serializers.ChoiceField(choices=Cargo.OPEN_STATUSES, default='pending')
+    loading_from = serializers.DateTimeField(required=False)
+    loading_to = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if not any(field in data for field in ("pickup_region", "pickup_location", "delivery_region", "delivery_location")):
+            raise serializers.ValidationError("Kamida bitta marshrut nuqtasini kiriting.")
+        return data
+
+
+class CargoTextSearchSerializer(serializers.Serializer):
+    """Matnli qidiruv parametrlari (query params)"""
+    q = serializers.CharField(max_length=200)
+    cargo_status = serializers.ChoiceField(choices=Cargo.OPEN_STATUSES, default='pending')
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
 class RegionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Region
@@ -0,0 +1,113 @@
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import forget_token_version
+from .images import image_fields, schedule_derivatives
+from .models import (
+    AdministrativeUnit, Bid, Cargo, CargoBidSummary, ChangeLog, DispatcherOrder, Driver, OwnerDispatcher, Region, Tracking, User,
+    Vehicle,
+)
+from .permissions import permission_cache
+from .reference import bump_version_on_change
+from .response_cache import response_cache
+
+
+@receiver(post_save, sender=Bid)
+def refresh_bid_summary_on_save(sender, instance, **kwargs):
+    CargoBidSummary.refresh([instance.cargo_id])
+
+
+@receiver(post_delete, sender=Bid)
+def refresh_bid_summary_on_delete(sender, instance, **kwargs):
+    # Yuk bilan birga kaskad o'chirilayotgan bo'lsa, yig'indi qatori ham o'chadi - qayta yaratmaymiz
+    CargoBidSummary.refresh_existing([instance.cargo_id])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def forget_user_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    # user.groups.add(...) da instance - User, group.user_set.add(...) da pk_set - foydalanuvchilar
+    if not reverse:
+        if action.startswith('post_'):
+            permission_cache.forget_users([instance.pk])
+    elif action == 'pre_clear':
+        instance._cleared_user_ids = list(instance.user_set.values_list('pk', flat=True))  # Group yoki Permission
+    elif action == 'post_clear':
+        permission_cache.forget_users(getattr(instance, '_cleared_user_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        permission_cache.forget_users(pk_set)
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    # Keshdagi token versiyasi bilan o'chirilgan foydalanuvchining tokenlari o'tib ketmasin
+    # (darhol va commit dan keyin: oradagi so'rov eski versiyani qayta keshlagan bo'lishi mumkin)
+    user_id = instance.pk
+    forget_token_version(user_id)
+    transaction.on_commit(lambda: forget_token_version(user_id))
+    permission_cache.forget_users([user_id])
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def bump_group_permissions(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        permission_cache.bump()
+
+
+@receiver(post_delete, sender=Group)
+def bump_group_permissions_on_delete(sender, **kwargs):
+    permission_cache.bump()
+
+
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+@receiver(post_save, sender=AdministrativeUnit)
+@receiver(post_delete, sender=AdministrativeUnit)
+def invalidate_reference_snapshot(sender, **kwargs):
+    bump_version_on_change()
+
+
+@receiver(post_save, sender=Cargo)
+@receiver(post_delete, sender=Cargo)
+@receiver(post_save, sender=Bid)
+@receiver(post_delete, sender=Bid)
+@receiver(post_save, sender=Tracking)
+@receiver(post_delete, sender=Tracking)
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+@receiver(post_save, sender=Driver)  # ?expand= bilan ro'yxatlarga qo'shiladigan modellar
+@receiver(post_delete, sender=Driver)
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Vehicle)
+@receiver(post_save, sender=OwnerDispatcher)
+@receiver(post_delete, sender=OwnerDispatcher)
+def invalidate_cached_responses(sender, **kwargs):
+    response_cache.bump(sender)
+
+
+@receiver(post_save, sender=Cargo)
+@receiver(post_save, sender=Bid)
+@receiver(post_save, sender=Tracking)
+@receiver(post_save, sender=DispatcherOrder)
+def record_change_on_save(sender, instance, **kwargs):
+    ChangeLog.record(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Cargo)
+@receiver(post_delete, sender=Bid)
+@receiver(post_delete, sender=Tracking)
+@receiver(post_delete, sender=DispatcherOrder)
+def record_change_on_delete(sender, instance, **kwargs):
+    ChangeLog.record(sender, [instance.pk], action='delete')
+
+
+@receiver(post_save, sender=Driver)
+@receiver(post_save, sender=OwnerDispatcher)
+def build_image_derivatives(sender, instance, update_fields=None, **kwargs):
+    # TrackedFieldsMixin tufayli update_fields faqat o'zgargan maydonlar: rasm o'zgarmasa navbatga qo'yilmaydi
+    for field in image_fields(sender):
+        fieldfile = getattr(instance, field.name)
+        if fieldfile and (update_fields is None or field.name in update_fields):
+            schedule_derivatives(fieldfile)
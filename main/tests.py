@@ -1,3 +1,1313 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+import warnings
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from PIL import Image
+from django.contrib.auth import base_user
+from django.contrib.auth.models import Group, Permission
+from django.core.exceptions import ImproperlyConfigured, ValidationError as DjangoValidationError
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.paginator import UnorderedObjectListWarning
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import (
+    User, Region, AdministrativeUnit, OwnerDispatcher, Driver, Vehicle, Cargo, CargoBidSummary, Bid, Tracking,
+    DeliveryConfirmation, DispatcherOrder, Payment, ChangeLog,
+)
+from .authentication import StatelessJWTAuthentication
+from .images import derivative_name, image_worker
+from .otp import otp_store
+from .parsers import NDJSONParser
+from .response_cache import response_cache
+from .permissions import permission_cache
+from .pubsub import PostgresBroker
+from .serializers import CargoSerializer
+from .utils import normalize_phone_number, normalize_phone_numbers
+from .ranking import CargoFeatures, DriverFeatures, rank_drivers, top_k
+
+
+def make_user(phone_number, role, **kwargs):
+    kwargs.setdefault("is_active", True)
+    return User.objects.create(username=phone_number, phone_number=phone_number, role=role, **kwargs)
+
+
+def grant(user, *codenames):
+    user.user_permissions.add(*Permission.objects.filter(content_type__app_label="main", codename__in=codenames))
+
+
+def make_cargo(customer, region, unit, **kwargs):
+    data = dict(
+        customer=customer,
+        pickup_region=region, pickup_location=unit,
+        delivery_region=region, delivery_location=unit,
+        cargo_type="Mebel", weight=10, weight_unit="T", volume=20,
+        readiness_choice="ready", placement_method="Orqadan",
+        payment_method="card", transport_type="Fura",
+    )
+    data.update(kwargs)
+    return Cargo.objects.create(**data)
+
+
+class LogisticsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.region = Region.objects.create(name="toshkent")
+        cls.unit = AdministrativeUnit.objects.create(region=cls.region, name="chilonzor")
+        cls.owner_user = make_user("+998901234567", "owner")
+        cls.owner = OwnerDispatcher.objects.create(user=cls.owner_user, passport_number="AA1234567", is_verified=True)
+        cls.carrier_user = make_user("+998911234567", "carrier")
+        cls.driver = Driver.objects.create(
+            carrier=cls.carrier_user, license_number="LIC1", passport_number="AB1234567", is_verified=True
+        )
+
+    def setUp(self):
+        cache.clear()  # ruxsatlar keshi testlar orasida saqlanib qolmasin
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner_user)
+
+
+class CargoBoardTests(LogisticsTestCase):
+    def make_board(self, cargo_count, bids_per_cargo):
+        for _ in range(cargo_count):
+            cargo = make_cargo(self.owner, self.region, self.unit)
+            for price in range(bids_per_cargo):
+                Bid.objects.create(driver=self.driver, cargo=cargo, propose="Olaman", proposed_price=price + 100)
+
+    def test_board_query_count_does_not_grow_with_cargos_and_bids(self):
+        self.make_board(2, 1)
+        with self.assertNumQueries(3):  # sahifa (id/vaqt) + yuklar + bid-lar
+            small = self.client.get("/cargos/")
+        self.make_board(20, 5)
+        with self.assertNumQueries(3):
+            large = self.client.get("/cargos/")
+        self.assertEqual(len(small.data["results"]), 2)
+        self.assertEqual(len(large.data["results"]), 22)
+
+    def test_bid_update_url_comes_from_template(self):
+        self.make_board(1, 2)
+        response = self.client.get("/cargos/")
+        bids = response.data["results"][0]["bids"]
+        self.assertEqual(
+            [bid["update_url"] for bid in bids],
+            [f"http://testserver/bids/{bid['bid_id']}/update-status/" for bid in bids],
+        )
+
+
+class CargoRouteSearchTests(LogisticsTestCase):
+    def test_keyset_pages_follow_loading_time_and_skip_closed_cargos(self):
+        now = timezone.now()
+        other_region = Region.objects.create(name="samarqand")
+        expected = [make_cargo(self.owner, self.region, self.unit, loading_time=now + timedelta(hours=i)) for i in range(5)]
+        make_cargo(self.owner, self.region, self.unit, loading_time=now, cargo_status="completed")
+        make_cargo(self.owner, other_region, AdministrativeUnit.objects.create(region=other_region, name="urgut"),
+                   loading_time=now)
+
+        found, cursor = [], None
+        while True:
+            params = {"pickup_region": self.region.id, "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.client.get("/cargos/route-search/", params)
+            self.assertEqual(response.status_code, 200)
+            found += [cargo["id"] for cargo in response.data["results"]]
+            cursor = response.data["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(found, [cargo.id for cargo in expected])
+
+    def test_cursor_is_a_range_on_loading_time(self):
+        now = timezone.now()
+        same_time = [make_cargo(self.owner, self.region, self.unit, loading_time=now) for _ in range(3)]
+        later = make_cargo(self.owner, self.region, self.unit, loading_time=now + timedelta(hours=1))
+        cargos = Cargo.objects.after(now, same_time[0].id)
+        self.assertEqual(sorted(cargos.values_list("id", flat=True)), [same_time[1].id, same_time[2].id, later.id])
+        sql = str(cargos.query)
+        self.assertIn('"loading_time" >=', sql)  # indeksda oraliq, OR faqat uning ichida
+        self.assertNotIn("IS NULL", sql)
+
+    def test_route_point_is_required(self):
+        response = self.client.get("/cargos/route-search/")
+        self.assertEqual(response.status_code, 400)
+
+
+class CargoTextSearchTests(LogisticsTestCase):
+    def search(self, q, **params):
+        response = self.client.get("/cargos/search/", {"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [cargo["id"] for cargo in response.data["results"]]
+
+    def test_document_is_normalized_on_save(self):
+        cargo = make_cargo(self.owner, self.region, self.unit, cargo_type="Мебель", transport_type="FURA",
+                           special_requirements="O‘ta ehtiyot, shisha!")
+        self.assertEqual(cargo.search_document, "mebel fura orqadan ota ehtiyot shisha")
+
+    def test_cyrillic_and_misspelled_queries_match(self):
+        fridge = make_cargo(self.owner, self.region, self.unit, transport_type="Refrijerator")
+        truck = make_cargo(self.owner, self.region, self.unit, transport_type="Fura")
+        self.assertEqual(self.search("рефрижератор"), [fridge.id])
+        self.assertEqual(self.search("refrejirator"), [fridge.id])
+        self.assertEqual(self.search("фура"), [truck.id])
+
+    def test_exact_matches_rank_first_and_closed_cargos_are_skipped(self):
+        close = make_cargo(self.owner, self.region, self.unit, cargo_type="Mevalar")
+        exact = make_cargo(self.owner, self.region, self.unit, cargo_type="Meva")
+        make_cargo(self.owner, self.region, self.unit, cargo_type="Meva", cargo_status="completed")
+        make_cargo(self.owner, self.region, self.unit, cargo_type="Sement")
+        self.assertEqual(self.search("meva"), [exact.id, close.id])
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get("/cargos/search/").status_code, 400)
+
+
+class TrackingTestCase(LogisticsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cargo = make_cargo(self.owner, self.region, self.unit)
+        vehicle = Vehicle.objects.create(vehicle="Isuzu", driver=self.driver, capacity=10, plate_number="01A123BC")
+        self.tracking = Tracking.objects.create(cargo=self.cargo, driver=self.driver, vehicle=vehicle)
+
+
+class TrackingPositionTests(TrackingTestCase):
+    def test_ping_is_an_insert_plus_pointer_update(self):
+        with self.assertNumQueries(5):  # savepoint + INSERT + UPDATE + jurnal INSERT + release
+            position = self.tracking.record_position(41.3, 69.2, speed=60)
+        self.tracking.refresh_from_db()
+        self.assertEqual(self.tracking.last_position, position)
+
+    def test_late_ping_does_not_move_latest_position(self):
+        now = timezone.now()
+        latest = self.tracking.record_position(41.3, 69.2, recorded_at=now)
+        self.tracking.record_position(41.0, 69.0, recorded_at=now - timedelta(minutes=5))
+        self.tracking.refresh_from_db()
+        self.assertEqual(self.tracking.last_position, latest)
+        self.assertEqual(self.tracking.positions.count(), 2)
+
+    def test_history_is_filtered_by_time_range(self):
+        now = timezone.now()
+        for minutes in (30, 20, 10):
+            self.tracking.record_position(41.3, 69.2, recorded_at=now - timedelta(minutes=minutes))
+        response = self.client.get(f"/trackings/{self.tracking.id}/positions/",
+                                   {"since": (now - timedelta(minutes=25)).isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+
+
+class TrackingPingIngestionTests(TrackingTestCase):
+    def setUp(self):
+        super().setUp()
+        grant(self.carrier_user, "add_tracking")
+        self.carrier_user.has_perm("main.add_tracking")  # ruxsatlar keshini isitamiz
+        self.client.force_authenticate(self.carrier_user)
+
+    def test_batch_of_pings_for_several_cargos_is_one_insert(self):
+        other_cargo = make_cargo(self.owner, self.region, self.unit)
+        other_tracking = Tracking.objects.create(cargo=other_cargo, driver=self.driver, vehicle=self.tracking.vehicle)
+        now = timezone.now()
+        pings = [
+            {"cargo": cargo.id, "latitude": 41 + i / 100, "longitude": 69, "recorded_at": (now + timedelta(seconds=i)).isoformat()}
+            for i in range(10) for cargo in (self.cargo, other_cargo)
+        ]
+        with self.assertNumQueries(7):  # id-lar + savepoint + INSERT + UPDATE + jurnal INSERT + release + hodisalar
+            response = self.client.post("/trackings/pings/", pings, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {"accepted": 20})
+        for tracking in (self.tracking, other_tracking):
+            tracking.refresh_from_db()
+            self.assertEqual(tracking.last_position.recorded_at, now + timedelta(seconds=9))
+
+    def test_ndjson_stream_is_accepted(self):
+        body = "\n".join(json.dumps({"cargo": self.cargo.id, "latitude": 41, "longitude": 69}) for _ in range(3))
+        response = self.client.post("/trackings/pings/", body, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.tracking.positions.count(), 3)
+
+    def test_ndjson_parsing_stops_at_the_item_limit(self):
+        line = json.dumps({"cargo": self.cargo.id, "latitude": 41, "longitude": 69}).encode() + b"\n"
+
+        def stream():
+            yield from [line] * 1001
+            raise AssertionError("limitdan keyin o'qilmasligi kerak")
+
+        with self.assertRaisesMessage(ParseError, "1000 tadan ortiq"):
+            NDJSONParser().parse(stream())
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=100)
+    def test_oversized_ndjson_body_is_rejected(self):
+        body = "\n".join(json.dumps({"cargo": self.cargo.id, "latitude": 41, "longitude": 69}) for _ in range(3))
+        response = self.client.post("/trackings/pings/", body, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.tracking.positions.count(), 0)
+
+    def test_unknown_cargo_rejects_whole_batch(self):
+        pings = [{"cargo": self.cargo.id, "latitude": 41, "longitude": 69}, {"cargo": 0, "latitude": 41, "longitude": 69}]
+        response = self.client.post("/trackings/pings/", pings, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.tracking.positions.count(), 0)
+
+
+class CargoEventStreamTests(TrackingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = str(AccessToken.for_user(self.owner_user))
+
+    def record_position(self, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tracking.record_position(*args)
+
+    async def test_subscriber_gets_snapshot_then_positions(self):
+        response = await self.async_client.get(f"/cargos/{self.cargo.id}/events/", {"token": self.token})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertIn(b"event: snapshot", await anext(stream))
+
+        await sync_to_async(self.record_position)(41.3, 69.2)
+        event = await anext(stream)
+        self.assertIn(b"event: position", event)
+        self.assertIn(b'"latitude": 41.3', event)
+        await stream.aclose()
+
+    async def test_other_owners_cannot_subscribe(self):
+        stranger = await sync_to_async(make_user)("+998931234567", "owner")
+        token = str(AccessToken.for_user(stranger))
+        response = await self.async_client.get(f"/cargos/{self.cargo.id}/events/", {"token": token})
+        self.assertEqual(response.status_code, 403)
+
+
+class PostgresBrokerTests(SimpleTestCase):
+    def test_listener_reconnects_with_backoff(self):
+        import psycopg2
+
+        class Stop(BaseException):
+            pass
+
+        broker = PostgresBroker()
+        with mock.patch.object(broker, "_connect", side_effect=[psycopg2.OperationalError(), psycopg2.OperationalError(), Stop()]) as connect, \
+                mock.patch("main.pubsub.time.sleep") as sleep, self.assertLogs("main.pubsub", "ERROR"), self.assertRaises(Stop):
+            broker._listen()
+        self.assertEqual(connect.call_count, 3)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [1, 2])
+
+    async def test_dead_listener_is_restarted_on_subscribe(self):  # obuna event loop ichida yaratiladi
+        broker = PostgresBroker()
+        dead = broker._listener = threading.Thread(target=lambda: None)
+        dead.start()
+        dead.join()
+        with mock.patch.object(broker, "_listen") as listen:
+            broker.subscribe("cargo.1").close()
+            broker._listener.join(1)
+        self.assertIsNot(broker._listener, dead)
+        listen.assert_called_once()
+
+
+class CapacityMatchingTests(LogisticsTestCase):
+    def test_units_are_normalized_on_write(self):
+        cargo = make_cargo(self.owner, self.region, self.unit, weight=Decimal("2.5"), weight_unit="T",
+                           volume=300, volume_unit="L")
+        self.assertEqual(cargo.weight_kg, Decimal("2500"))
+        self.assertEqual(cargo.volume_l, Decimal("300"))
+
+    def test_vehicle_gets_only_pending_cargos_that_fit(self):
+        vehicle = Vehicle.objects.create(vehicle="Isuzu", driver=self.driver, capacity=5, capacity_unit="T",
+                                         volume_capacity=20, plate_number="01A123BC")
+        fits = make_cargo(self.owner, self.region, self.unit, weight=4500, weight_unit="Kg", volume=20)
+        make_cargo(self.owner, self.region, self.unit, weight=6, weight_unit="T", volume=1)
+        make_cargo(self.owner, self.region, self.unit, weight=1, weight_unit="T", volume=21)
+        make_cargo(self.owner, self.region, self.unit, weight=1, weight_unit="T", volume=1, cargo_status="completed")
+
+        response = self.client.get(f"/vehicles/{vehicle.id}/matching-cargos/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([cargo["id"] for cargo in response.data["results"]], [fits.id])
+        self.assertIsNone(response.data["next_cursor"])
+
+    def test_matching_cargos_are_paged_by_cursor(self):
+        vehicle = Vehicle.objects.create(vehicle="Isuzu", driver=self.driver, capacity=20, capacity_unit="T",
+                                         plate_number="01A123BC")
+        now = timezone.now()
+        later = make_cargo(self.owner, self.region, self.unit, loading_time=now + timedelta(days=1))
+        undated = make_cargo(self.owner, self.region, self.unit)
+        sooner = make_cargo(self.owner, self.region, self.unit, loading_time=now)
+        undated_later = make_cargo(self.owner, self.region, self.unit)
+
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 1, **({"cursor": cursor} if cursor else {})}
+            data = self.client.get(f"/vehicles/{vehicle.id}/matching-cargos/", params).data
+            seen += [cargo["id"] for cargo in data["results"]]
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, [sooner.id, later.id, undated.id, undated_later.id])
+
+
+class DriverRankingTests(LogisticsTestCase):
+    def make_driver(self, n, capacity=None, position=None, verified=True):
+        user = make_user(f"+99890000000{n}", "carrier")
+        driver = Driver.objects.create(carrier=user, license_number=f"L{n}", passport_number=f"P{n}", is_verified=verified)
+        if capacity is not None:
+            vehicle = Vehicle.objects.create(vehicle="Isuzu", driver=driver, capacity=capacity, plate_number=f"V{n}")
+            if position is not None:
+                cargo = make_cargo(self.owner, self.region, self.unit)
+                Tracking.objects.create(cargo=cargo, driver=driver, vehicle=vehicle).record_position(*position)
+        return driver
+
+    def test_fitting_drivers_are_ranked_by_distance_to_pickup(self):
+        AdministrativeUnit.objects.filter(pk=self.unit.pk).update(latitude=41.3, longitude=69.2)
+        far = self.make_driver(1, capacity=20, position=(39.6, 66.9))
+        near = self.make_driver(2, capacity=20, position=(41.31, 69.21))
+        self.make_driver(3, capacity=2, position=(41.3, 69.2))  # sig'maydi
+        self.make_driver(4)  # mashinasi yo'q
+        self.make_driver(5, capacity=20, position=(41.3, 69.2), verified=False)
+        cargo = make_cargo(self.owner, self.region, self.unit, weight=10, weight_unit="T")
+
+        self.assertEqual([driver for driver, _ in rank_drivers(cargo)], [near.id, far.id])
+
+    def test_top_k_matrix(self):
+        drivers = DriverFeatures([1, 2, 3], [1000, 5000, np.nan], [np.nan] * 3, [np.nan] * 3, [0, 10, 0], [0, 9, 0], [0, 0, 0])
+        cargos = CargoFeatures([10, 20], [900, 4000], [np.nan] * 2, [np.nan] * 2)
+        ranking = top_k(drivers, cargos, k=2)
+        self.assertEqual([driver for driver, _ in ranking[10]], [1, 2])
+        self.assertEqual([driver for driver, _ in ranking[20]], [2])
+
+
+class BidTestCase(LogisticsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cargo = make_cargo(self.owner, self.region, self.unit)
+
+    def bid(self, price, **kwargs):
+        return Bid.objects.create(driver=self.driver, cargo=self.cargo, propose="Olaman", proposed_price=price, **kwargs)
+
+
+class BidSummaryTests(BidTestCase):
+    def test_summary_follows_bid_changes(self):
+        self.bid(300)
+        cheapest = self.bid(100)
+        self.bid(200).delete()
+        cheapest.accept()  # accepted_bid ni faqat accept() yozadi
+
+        summary = CargoBidSummary.objects.get(cargo=self.cargo)
+        self.assertEqual((summary.bid_count, summary.lowest_price, summary.highest_price, summary.accepted_bid),
+                         (2, 100, 300, cheapest))
+
+    def test_stale_recompute_keeps_accepted_bid(self):
+        winner = self.bid(100)
+        stale = CargoBidSummary.compute([self.cargo.id])  # accept() dan oldin olingan holat
+        winner.accept()
+        with mock.patch.object(CargoBidSummary, "compute", return_value=stale):
+            CargoBidSummary.refresh([self.cargo.id])
+        self.assertEqual(CargoBidSummary.objects.get(cargo=self.cargo).accepted_bid_id, winner.id)
+
+    def test_bid_without_summary_row_can_be_accepted(self):
+        # Yig'indidan oldin yaratilgan bid: qatori yo'q
+        winner, loser = self.bid(100), self.bid(200)
+        CargoBidSummary.objects.all().delete()
+        winner.accept()
+        summary = CargoBidSummary.objects.get(cargo=self.cargo)
+        self.assertEqual((summary.bid_count, summary.accepted_bid_id), (2, winner.id))
+        self.assertEqual(Bid.objects.get(pk=loser.pk).status, "rejected")
+        with self.assertRaises(ValidationError):
+            loser.accept()
+
+    def test_refresh_command_backfills_missing_summaries(self):
+        self.bid(100)
+        self.bid(300)
+        CargoBidSummary.objects.all().delete()
+        call_command("refresh_bid_summaries", stdout=io.StringIO())
+        summary = CargoBidSummary.objects.get(cargo=self.cargo)
+        self.assertEqual((summary.bid_count, summary.lowest_price, summary.highest_price), (2, 100, 300))
+
+    def test_deleting_cargo_removes_summary(self):
+        self.bid(100)
+        self.cargo.delete()
+        self.assertFalse(CargoBidSummary.objects.exists())
+
+    def test_new_bid_is_refused_once_a_bid_is_accepted(self):
+        self.bid(100, status="accepted")
+        self.client.force_authenticate(self.carrier_user)
+        response = self.client.post("/bids/", {"driver": self.driver.id, "cargo": self.cargo.id,
+                                               "propose": "Arzonroq", "proposed_price": 90})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Bid.objects.count(), 1)
+
+    def test_owner_bid_list_skips_accepted_cargos(self):
+        open_bid = self.bid(100)
+        other = make_cargo(self.owner, self.region, self.unit)
+        Bid.objects.create(driver=self.driver, cargo=other, propose="Olaman", proposed_price=1, status="accepted")
+        response = self.client.get("/bids/")
+        self.assertEqual([bid["cargo"] for bid in response.data["results"]], [open_bid.cargo_id])
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class BidSummaryConcurrencyTests(TransactionTestCase):
+    def test_bid_created_during_accept_does_not_reopen_cargo(self):
+        region = Region.objects.create(name="toshkent")
+        unit = AdministrativeUnit.objects.create(region=region, name="chilonzor")
+        owner = OwnerDispatcher.objects.create(user=make_user("+998901234567", "owner"), passport_number="AA1234567")
+        driver = Driver.objects.create(carrier=make_user("+998911234567", "carrier"), license_number="L1", passport_number="P1")
+        cargo = make_cargo(owner, region, unit)
+        winner = Bid.objects.create(driver=driver, cargo=cargo, propose="Olaman", proposed_price=100)
+
+        snapshot_taken = threading.Event()
+        compute = CargoBidSummary.compute
+
+        def slow_compute(cargo_ids):
+            summaries = compute(cargo_ids)
+            if threading.current_thread().name == "bidder":
+                snapshot_taken.set()
+                time.sleep(0.5)  # accept() shu oraliqda commit bo'lishga urinadi
+            return summaries
+
+        def run(target):
+            try:
+                target()
+            finally:
+                connection.close()
+
+        def bid():
+            Bid.objects.create(driver=driver, cargo=cargo, propose="Arzonroq", proposed_price=90)
+
+        def accept():
+            snapshot_taken.wait(5)
+            winner.accept()
+
+        with mock.patch.object(CargoBidSummary, "compute", slow_compute):
+            threads = [threading.Thread(target=run, args=(bid,), name="bidder"), threading.Thread(target=run, args=(accept,))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(10)
+
+        summary = CargoBidSummary.objects.get(cargo=cargo)
+        self.assertEqual((summary.accepted_bid_id, summary.bid_count), (winner.id, 2))
+        self.assertEqual(set(Bid.objects.exclude(pk=winner.pk).values_list("status", flat=True)), {"rejected"})
+
+
+class BidAcceptanceTests(BidTestCase):
+    def test_accept_rejects_siblings_in_one_step(self):
+        winner, loser = self.bid(100), self.bid(200)
+        with self.assertNumQueries(7):  # savepoint + 2 UPDATE + rad etiladiganlar id + UPDATE + jurnal INSERT + release
+            winner.accept()
+        self.assertEqual(dict(Bid.objects.values_list("id", "status")), {winner.id: "accepted", loser.id: "rejected"})
+        self.assertEqual(CargoBidSummary.objects.get(cargo=self.cargo).accepted_bid_id, winner.id)
+
+    def test_second_accept_is_refused(self):
+        first, second = self.bid(100), self.bid(200)
+        first.accept()
+        with self.assertRaises(ValidationError):
+            second.accept()
+        self.assertEqual(Bid.objects.get(pk=first.pk).status, "accepted")
+
+    def test_database_allows_one_accepted_bid_per_cargo(self):
+        self.bid(100, status="accepted")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Bid.objects.filter(pk=self.bid(200).pk).update(status="accepted")
+
+    def test_owner_accepts_through_update_status(self):
+        winner, loser = self.bid(100), self.bid(200)
+        response = self.client.patch(f"/bids/{winner.id}/update-status/", {"status": "accepted"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["bid"], {"status": "accepted"})
+        self.assertEqual(Bid.objects.get(pk=loser.pk).status, "rejected")
+
+
+class ChangedFieldsSaveTests(TrackingTestCase):
+    def test_unchanged_instance_is_not_written(self):
+        user = User.objects.get(pk=self.owner_user.pk)
+        with self.assertNumQueries(0):
+            user.save()
+
+    def test_only_changed_columns_are_written_without_group_sync(self):
+        user = User.objects.get(pk=self.owner_user.pk)
+        user.first_name = "Ali"
+        with self.assertNumQueries(1) as queries:
+            user.save()
+        self.assertNotIn("last_name", queries.captured_queries[0]["sql"])
+
+    def test_role_change_syncs_group(self):
+        user = User.objects.get(pk=self.owner_user.pk)
+        user.role = "dispatcher"
+        user.save()
+        self.assertTrue(user.groups.filter(name="dispatcher_group").exists())
+
+    def test_tracking_label_update_does_not_touch_cargo(self):
+        tracking = Tracking.objects.get(pk=self.tracking.pk)
+        tracking.current_location = "Samarqand"
+        with self.assertNumQueries(2):  # tracking UPDATE + jurnal INSERT
+            tracking.save()
+
+    def test_tracking_status_change_updates_cargo_status_only(self):
+        tracking = Tracking.objects.get(pk=self.tracking.pk)
+        tracking.status = "in_transit"
+        with self.assertNumQueries(5):  # cargo yuklash + cargo va tracking UPDATE, har biriga jurnal INSERT
+            tracking.save()
+        self.assertEqual(Cargo.objects.get(pk=self.cargo.pk).cargo_status, "in_progress")
+
+    def test_delivery_confirmation_completes_cargo_and_tracking(self):
+        confirmation = DeliveryConfirmation.objects.create(cargo=self.cargo, driver=self.driver, receiver=self.owner)
+        confirmation = DeliveryConfirmation.objects.get(pk=confirmation.pk)
+        confirmation.is_delivered_by_driver = confirmation.is_received_by_receiver = True
+        with self.assertNumQueries(9):  # cargo yuklash + savepoint + 3 ta UPDATE + tracking id + 2 jurnal INSERT + release
+            confirmation.check_delivery_status()
+        self.assertEqual(Cargo.objects.get(pk=self.cargo.pk).cargo_status, "completed")
+        self.assertEqual(Tracking.objects.get(pk=self.tracking.pk).status, "delivered")
+        self.assertTrue(DeliveryConfirmation.objects.get(pk=confirmation.pk).dispatcher_notified)
+
+
+@override_settings(OTP_SEND_LIMIT=2, OTP_MAX_ATTEMPTS=2)
+class OTPTests(LogisticsTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.user = make_user("+998931112233", "owner", is_active=False)
+
+    def test_code_is_stored_hashed_in_cache_not_on_user(self):
+        code = otp_store.issue("verify", self.user.phone_number)
+        entry = cache.get("otp:verify:+998931112233")
+        self.assertNotIn(code, str(entry))
+        self.assertEqual(otp_store.check("verify", "+998 93 111-22-33", code), {})
+        self.assertIsNone(otp_store.check("verify", "+998931112233", code))  # bir martalik
+
+    def test_resend_does_not_write_user_row(self):
+        with self.assertNumQueries(1):  # faqat mavjudligini tekshirish
+            response = self.client.post("/users/resend_verification_code/", {"phone_number": "+998931112233"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_sends_are_throttled_per_number(self):
+        for _ in range(2):
+            otp_store.issue("verify", "+998931112233")
+        response = self.client.post("/users/resend_verification_code/", {"phone_number": "+998931112233"})
+        self.assertEqual(response.status_code, 429)
+
+    def test_code_is_dropped_after_too_many_wrong_attempts(self):
+        code = otp_store.issue("verify", "+998931112233")
+        wrong = "000000" if code != "000000" else "111111"
+        self.assertIsNone(otp_store.check("verify", "+998931112233", wrong))
+        self.assertIsNone(otp_store.check("verify", "+998931112233", wrong))
+        self.assertIsNone(otp_store.check("verify", "+998931112233", code))
+
+    def test_parallel_guesses_share_one_attempt_budget(self):
+        code = otp_store.issue("verify", "+998931112233")
+        wrong = "000000" if code != "000000" else "111111"
+        barrier = threading.Barrier(6)
+
+        def guess():
+            barrier.wait()
+            otp_store.check("verify", "+998931112233", wrong)
+
+        threads = [threading.Thread(target=guess) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIsNone(otp_store.check("verify", "+998931112233", code))
+
+    def test_code_is_redeemed_once_under_concurrency(self):
+        code = otp_store.issue("verify", "+998931112233", user_id=1)
+        entry = cache.get("otp:verify:+998931112233")
+        with mock.patch.object(cache, "get", return_value=entry):  # ikkala so'rov ham yozuvni o'qib ulgurgan
+            results = [otp_store.check("verify", "+998931112233", code) for _ in range(2)]
+        self.assertEqual(results, [{"user_id": 1}, None])
+
+    def test_verify_code_activates_user(self):
+        code = otp_store.issue("verify", "+998931112233")
+        response = self.client.post("/users/verify_code/", {"phone_number": "+998931112233", "auth_code": code})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get(pk=self.user.pk).is_active)
+
+    def test_code_is_found_by_any_number_format(self):
+        code = otp_store.issue("verify", "+998931112233")
+        response = self.client.post("/users/verify_code/", {"phone_number": "93 111 22 33", "auth_code": code})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get(pk=self.user.pk).is_active)
+
+    def test_reset_code_is_found_by_any_number_format(self):
+        code = otp_store.issue("reset", "+998931112233")
+        response = self.client.post("/users/reset_password/", {
+            "phone_number": "998931112233", "auth_code": code,
+            "new_password": "yangi-parol-123", "new_password_confirmation": "yangi-parol-123",
+        })
+        self.assertEqual(response.status_code, 200)
+
+    def test_unparsable_number_is_rejected(self):
+        response = self.client.post("/users/resend_verification_code/", {"phone_number": "abc"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("phone_number", response.data)
+
+    def test_phone_change_is_confirmed_from_cache(self):
+        self.client.force_authenticate(self.owner_user)
+        response = self.client.post("/users/change_phone_request/", {"new_phone_number": "+998944445566"})
+        self.assertEqual(User.objects.get(pk=self.owner_user.pk).phone_number, "+998901234567")
+        response = self.client.post("/users/confirm_phone_change/", {"auth_code": response.data["test_auth_code"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(User.objects.get(pk=self.owner_user.pk).phone_number, "+998944445566")
+
+
+class PhoneNumberValidationTests(TestCase):
+    def test_normalizes_and_prefers_longest_operator_code(self):
+        self.assertEqual(normalize_phone_number("+998 90 123-45-67"), "+998901234567")
+        self.assertEqual(normalize_phone_number("+77011234567"), "+77011234567")
+
+    def test_error_messages_are_unchanged(self):
+        cases = {
+            "+4412345678": "davlat kodi",
+            "+998111234567": "operator kodi",
+            "+99890123456": "uzunligi",
+        }
+        for phone, message in cases.items():
+            with self.assertRaisesMessage(DjangoValidationError, message):
+                normalize_phone_number(phone)
+
+    def test_batch_reports_errors_by_index(self):
+        normalized, errors = normalize_phone_numbers(["+998 90 123 45 67", "+4412345678", "+998 90 123 45 67"])
+        self.assertEqual(normalized, ["+998901234567", None, "+998901234567"])
+        self.assertEqual(list(errors), [1])
+
+
+class LoginTests(LogisticsTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner_user.set_password("parol123")
+        self.owner_user.save()
+
+    def login(self, phone_number, password):
+        with mock.patch.object(base_user, "check_password", wraps=base_user.check_password) as check:
+            response = self.client.post("/api/token/login/", {"phone_number": phone_number, "password": password})
+        return response, check.call_count
+
+    def test_password_is_hashed_once_per_login(self):
+        response, hashes = self.login("+998901234567", "parol123")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(hashes, 1)
+        self.assertEqual(response.data["phone_number"], "+998901234567")
+        self.assertEqual(AccessToken(response.data["access"])["phone_number"], "+998901234567")
+
+    def test_wrong_password_is_rejected_after_one_hash(self):
+        response, hashes = self.login("+998901234567", "xato")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(hashes, 1)
+
+    def test_inactive_user_gets_no_tokens(self):
+        User.objects.filter(pk=self.owner_user.pk).update(is_active=False)
+        response, _ = self.login("+998901234567", "parol123")
+        self.assertEqual(response.status_code, 401)
+
+
+class StatelessJWTTests(LogisticsTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.carrier_user.set_password("parol123")
+        self.carrier_user.save()
+        grant(self.carrier_user, "view_region")
+        response = self.client.post("/api/token/login/", {"phone_number": "+998911234567", "password": "parol123"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        patcher = mock.patch.object(APIView, "authentication_classes", [StatelessJWTAuthentication])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_requests_are_authorized_without_user_or_permission_queries(self):
+        self.client.get("/regions/")  # versiya va ruxsatlar keshga tushadi
+        with self.assertNumQueries(1):  # faqat viloyatning o'zi
+            response = self.client.get(f"/regions/{self.region.id}/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_password_change_revokes_issued_tokens(self):
+        self.assertEqual(self.client.get("/regions/").status_code, 200)
+        user = User.objects.get(pk=self.carrier_user.pk)
+        user.set_password("yangi-parol")
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(self.client.get("/regions/").status_code, 401)
+
+    def test_deleting_user_revokes_issued_tokens(self):
+        self.assertEqual(self.client.get("/regions/").status_code, 200)  # versiya keshda
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(pk=self.carrier_user.pk).delete()
+        self.assertEqual(self.client.get("/regions/").status_code, 401)
+
+    def test_permission_changes_are_picked_up(self):
+        self.assertEqual(self.client.post("/trackings/pings/", [], format="json").status_code, 403)
+        grant(self.carrier_user, "add_tracking")  # keshlangan ruxsatlar eskiradi
+        self.assertEqual(self.client.post("/trackings/pings/", [], format="json").status_code, 400)
+
+
+class PermissionCacheTests(LogisticsTestCase):
+    def has_perm(self, perm):
+        return User.objects.get(pk=self.carrier_user.pk).has_perm(perm)  # har safar yangi obyekt
+
+    def test_permission_checks_are_cached_across_user_instances(self):
+        self.assertFalse(self.has_perm("main.add_cargo"))
+        user = User.objects.get(pk=self.carrier_user.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(user.has_perm("main.add_cargo"))
+
+    def test_group_permission_change_is_visible_to_members(self):
+        self.assertFalse(self.has_perm("main.add_cargo"))
+        group = Group.objects.get(name="carrier_group")
+        group.permissions.add(Permission.objects.get(codename="add_cargo"))
+        self.assertTrue(self.has_perm("main.add_cargo"))
+        group.user_set.remove(self.carrier_user)
+        self.assertFalse(self.has_perm("main.add_cargo"))
+
+    def test_permissions_cached_before_commit_are_dropped_after_it(self):
+        group = Group.objects.get(name="carrier_group")
+        with self.captureOnCommitCallbacks(execute=True):
+            group.permissions.add(Permission.objects.get(codename="add_cargo"))
+            grant(self.carrier_user, "add_tracking")
+            # Parallel so'rov commit dan oldingi (eski) ruxsatlarni yangi versiya ostida keshlab qo'ydi
+            entry = {"groups": (group.pk,), "perms": set()}
+            cache.set(f"perms:user:{self.carrier_user.pk}", entry)
+            cache.set(f"perms:groups:{permission_cache._version()}:{group.pk}", set())
+        self.assertTrue(self.has_perm("main.add_cargo"))
+        self.assertTrue(self.has_perm("main.add_tracking"))
+
+    def test_direct_permission_change_is_visible(self):
+        self.assertFalse(self.has_perm("main.add_tracking"))
+        grant(self.carrier_user, "add_tracking")
+        self.assertTrue(self.has_perm("main.add_tracking"))
+
+
+class ReferenceSnapshotTests(LogisticsTestCase):
+    def test_snapshot_supports_etag(self):
+        response = self.client.get("/regions/snapshot/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["regions"], [
+            {"id": self.region.id, "name": "toshkent", "units": [
+                {"id": self.unit.id, "name": "chilonzor", "latitude": None, "longitude": None},
+            ]},
+        ])
+        with self.assertNumQueries(0):
+            response = self.client.get("/regions/snapshot/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_bump_the_version(self):
+        etag = self.client.get("/regions/snapshot/")["ETag"]
+        unit = AdministrativeUnit.objects.create(region=self.region, name="yunusobod")
+        response = self.client.get("/regions/snapshot/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(unit.id, [item["id"] for item in response.data["regions"][0]["units"]])
+
+    def test_units_are_served_from_memory(self):
+        self.client.get("/regions/snapshot/")
+        with self.assertNumQueries(0):
+            response = self.client.get(f"/regions/{self.region.id}/units/")
+        self.assertEqual(response.data[0]["region"], {"id": self.region.id, "name": "toshkent"})
+        self.assertEqual(self.client.get("/regions/999/units/").status_code, 404)
+
+    def test_cargo_location_must_belong_to_region(self):
+        other = Region.objects.create(name="samarqand")
+        data = {
+            "customer": self.owner.id, "pickup_region": other.id, "pickup_location": self.unit.id,
+            "delivery_region": self.region.id, "delivery_location": self.unit.id,
+            "cargo_type": "Mebel", "weight": 10, "weight_unit": "T", "volume": 20,
+            "readiness_choice": "ready", "placement_method": "Orqadan", "payment_method": "card",
+            "transport_type": "Fura",
+        }
+        serializer = CargoSerializer(data=data)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("pickup_location", serializer.errors)
+        serializer = CargoSerializer(data={**data, "pickup_region": self.region.id})
+        with self.assertNumQueries(1):  # faqat customer, viloyat/tumanlar xotiradan
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.save().pickup_location_id, self.unit.id)
+
+
+class ConditionalGetTests(BidTestCase):
+    def test_unchanged_list_returns_304_before_serialization(self):
+        self.bid(100)
+        response = self.client.get("/cargos/")
+        self.assertIn("Last-Modified", response)
+        self.assertEqual(self.client.get("/cargos/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        response = self.client.get(f"/cargos/{self.cargo.pk}/")  # detail javob keshlanmaydi
+        with self.assertNumQueries(1):  # faqat agregat
+            response = self.client.get(f"/cargos/{self.cargo.pk}/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_validators_cover_only_the_page(self):
+        self.client.force_authenticate(self.carrier_user)
+        for number in range(3):
+            Driver.objects.create(carrier=make_user(f"+99893000000{number}", "carrier"),
+                                  license_number=f"L{number}", passport_number=f"P{number}")
+        first = self.client.get("/drivers/", {"page_size": 1})
+        second = self.client.get(first.data["next"])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(first.data["next"], HTTP_IF_NONE_MATCH=second["ETag"])
+        self.assertEqual(response.status_code, 304)
+        [query] = queries.captured_queries  # faqat sahifa, LIMIT bilan; COUNT/MAX yo'q
+        self.assertIn("LIMIT", query["sql"])
+        self.assertNotIn("COUNT(", query["sql"])
+        self.assertNotIn("MAX(", query["sql"])
+
+        Driver.objects.filter(license_number="L0").update(updated_at=timezone.now())  # boshqa sahifadagi qator
+        self.assertEqual(self.client.get(first.data["next"], HTTP_IF_NONE_MATCH=second["ETag"]).status_code, 304)
+        Driver.objects.filter(pk=second.data["results"][0]["id"]).update(updated_at=timezone.now())
+        self.assertEqual(self.client.get(first.data["next"], HTTP_IF_NONE_MATCH=second["ETag"]).status_code, 200)
+
+    def test_expanded_relations_invalidate_the_etag(self):
+        etag = self.client.get("/cargos/", {"expand": "customer"})["ETag"]
+        detail_etag = self.client.get(f"/cargos/{self.cargo.pk}/", {"expand": "customer"})["ETag"]
+        OwnerDispatcher.objects.filter(pk=self.owner.pk).update(updated_at=timezone.now() + timedelta(seconds=5))
+        response_cache.bump(Cargo)  # faqat ETag tekshiriladi, kesh emas
+        self.assertEqual(self.client.get("/cargos/", {"expand": "customer"}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(f"/cargos/{self.cargo.pk}/", {"expand": "customer"},
+                                         HTTP_IF_NONE_MATCH=detail_etag).status_code, 200)
+
+    def test_bid_changes_invalidate_the_cargo_etag(self):
+        bid = self.bid(100)
+        bid_etag = self.client.get(f"/bids/{bid.pk}/")["ETag"]
+        self.bid(90)
+        self.assertEqual(self.client.get(f"/bids/{bid.pk}/", HTTP_IF_NONE_MATCH=bid_etag).status_code, 304)
+        etag = self.client.get("/cargos/")["ETag"]
+        bid.accept()
+        self.assertEqual(self.client.get("/cargos/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_uses_its_own_validators(self):
+        response = self.client.get(f"/cargos/{self.cargo.pk}/")
+        self.assertEqual(self.client.get(f"/cargos/{self.cargo.pk}/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.cargo.cargo_type = "Qurilish"
+        self.cargo.save()
+        self.assertEqual(self.client.get(f"/cargos/{self.cargo.pk}/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+        self.assertEqual(self.client.get("/cargos/999/").status_code, 404)
+
+
+class ResponseCacheTests(BidTestCase):
+    def test_board_is_served_from_cache_until_a_bid_changes(self):
+        self.bid(100)
+        self.assertEqual(self.client.get("/cargos/")["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            response = self.client.get("/cargos/")
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.data["results"][0]["bid_summary"]["bid_count"], 1)
+
+        self.bid(90)
+        response = self.client.get("/cargos/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"][0]["bid_summary"]["bid_count"], 2)
+
+    def test_cached_etag_answers_304_without_queries(self):
+        etag = self.client.get("/cargos/")["ETag"]
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/cargos/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_bid_lists_are_scoped_per_owner(self):
+        self.bid(100)
+        self.assertEqual(len(self.client.get("/bids/").data["results"]), 1)
+        other = make_user("+998935556677", "owner")
+        OwnerDispatcher.objects.create(user=other, passport_number="AC1234567", is_verified=True)
+        self.client.force_authenticate(other)
+        self.assertEqual(len(self.client.get("/bids/").data["results"]), 0)
+
+    def test_accept_invalidates_without_signals(self):
+        bid = self.bid(100)
+        self.client.get("/cargos/")
+        bid.accept()
+        self.assertEqual(self.client.get("/cargos/").data["results"][0]["bid_summary"]["accepted_bid"], bid.pk)
+
+    def test_expanded_relations_invalidate_the_cache(self):
+        response = self.client.get("/cargos/", {"expand": "customer"})
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(self.client.get("/cargos/", {"expand": "customer"})["X-Cache"], "HIT")
+        self.owner.passport_number = "AB7654321"
+        self.owner.save()
+        response = self.client.get("/cargos/", {"expand": "customer"})
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"][0]["customer"]["passport_number"], "AB7654321")
+
+    def test_stats_are_exposed_to_admins(self):
+        self.client.get("/cargos/")
+        self.client.get("/cargos/")
+        self.client.force_authenticate(make_user("+998977778899", "dispatcher", is_staff=True))
+        self.assertEqual(self.client.get("/cache-stats/").data["CargoViewSet"], {"hit": 1, "miss": 1})
+
+
+class KeysetPaginationTests(LogisticsTestCase):
+    def test_pages_follow_newest_first_without_counting(self):
+        cargos = [make_cargo(self.owner, self.region, self.unit) for _ in range(5)]
+        with self.assertNumQueries(3):  # sahifa (id/vaqt) + yuklar + bid-lar
+            first = self.client.get("/cargos/", {"page_size": 2}).data
+        self.assertNotIn("count", first)
+        self.assertEqual([cargo["id"] for cargo in first["results"]], [cargos[4].id, cargos[3].id])
+        second = self.client.get(first["next"]).data
+        self.assertEqual([cargo["id"] for cargo in second["results"]], [cargos[2].id, cargos[1].id])
+
+    def test_count_is_opt_in(self):
+        make_cargo(self.owner, self.region, self.unit)
+        self.assertEqual(self.client.get("/cargos/", {"count": "exact"}).data["count"], 1)
+        self.assertIsNone(self.client.get("/cargos/", {"count": "estimate"}).data["count"])  # SQLite da baho yo'q
+
+
+class SparseFieldsetTests(BidTestCase):
+    def test_compact_board_skips_bids_and_their_query(self):
+        self.bid(100)
+        with self.assertNumQueries(2):  # sahifa (id/vaqt) + yuklar (bid-lar prefetch qilinmaydi)
+            response = self.client.get("/cargos/", {"view": "compact"})
+        cargo = response.data["results"][0]
+        self.assertNotIn("bids", cargo)
+        self.assertEqual(cargo["bid_summary"]["bid_count"], 1)
+
+    def test_fields_narrow_the_selected_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/cargos/", {"fields": "id,cargo_status"})
+        self.assertEqual(response.data["results"], [{"id": self.cargo.id, "cargo_status": "pending"}])
+        page_sql = queries.captured_queries[-1]["sql"]
+        self.assertIn("cargo_status", page_sql)
+        self.assertNotIn("special_requirements", page_sql)
+
+    def test_expand_nests_related_object_in_one_query(self):
+        self.client.force_authenticate(self.carrier_user)
+        with self.assertNumQueries(2):  # sahifa (id/vaqt) + haydovchilar (carrier JOIN bilan)
+            response = self.client.get("/drivers/", {"expand": "carrier", "fields": "id"})
+        carrier = response.data["results"][0]["carrier"]
+        self.assertEqual(carrier["phone_number"], "+998911234567")
+        self.assertNotIn("password", carrier)
+
+    def test_expanded_bid_list_does_not_query_per_bid(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/bids/", {"expand": "driver"})
+            self.assertEqual(response.data["results"][0]["driver"]["license_number"], "LIC1")
+            return len(queries)
+
+        self.bid(100)
+        one = count_queries()
+        for price in range(5):
+            self.bid(price)
+        self.assertEqual(count_queries(), one)
+
+    def test_fields_are_ignored_on_writes(self):
+        response = self.client.post("/bids/?fields=cargo", {
+            "driver": self.driver.id, "cargo": self.cargo.id, "propose": "Olaman", "proposed_price": 100,
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("proposed_price", response.data)
+
+
+@override_settings(CHANGE_FEED_SETTLE=0)
+class ChangeFeedTests(BidTestCase):
+    def feed(self, **params):
+        response = self.client.get("/changes/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_changes_after_cursor_include_current_data_and_tombstones(self):
+        cursor = self.feed()["cursor"]
+        bid = self.bid(100)
+        self.cargo.special_requirements = "Muzlatgich"
+        self.cargo.save()
+        self.bid(200).delete()
+
+        data = self.feed(after=cursor)
+        changes = [(change["model"], change["action"]) for change in data["changes"]]
+        self.assertEqual(changes, [("bid", "upsert"), ("cargo", "upsert"), ("bid", "upsert"), ("bid", "delete")])
+        self.assertEqual(data["changes"][0]["object_id"], bid.id)
+        self.assertEqual(data["changes"][0]["data"]["proposed_price"], "100.00")
+        self.assertEqual(data["changes"][1]["data"]["special_requirements"], "Muzlatgich")
+        self.assertIsNone(data["changes"][3]["data"])
+        self.assertEqual(self.feed(after=data["cursor"])["changes"], [])
+
+    def test_bulk_updates_are_recorded(self):
+        winner, loser = self.bid(100), self.bid(200)
+        cursor = self.feed()["cursor"]
+        winner.accept()
+        changes = self.feed(after=cursor, models="bid")["changes"]
+        self.assertEqual([change["object_id"] for change in changes], [winner.id, loser.id])
+        # /bids/ kabi: tasdiqlangan yukning bid-lari egasiga endi ko'rinmaydi
+        self.assertEqual([change["data"] for change in changes], [None, None])
+
+    def test_limit_pages_through_the_log(self):
+        for price in (100, 200, 300):
+            self.bid(price)
+        first = self.feed(limit=2, models="bid")
+        self.assertTrue(first["has_more"])
+        second = self.feed(after=first["cursor"], limit=2, models="bid")
+        self.assertFalse(second["has_more"])
+        self.assertEqual(len(first["changes"]) + len(second["changes"]), 3)
+
+    def test_bids_are_scoped_like_the_bids_endpoint(self):
+        self.bid(100)
+        dispatcher = make_user("+998931234567", "dispatcher")
+        OwnerDispatcher.objects.create(user=dispatcher, passport_number="AC1234567")
+        self.client.force_authenticate(dispatcher)
+        self.assertEqual([change["data"] for change in self.feed(models="bid")["changes"]], [None])
+        self.assertEqual(self.client.get("/bids/").data["results"], [])
+
+    def test_data_uses_absolute_urls_like_the_list(self):
+        self.bid(100)
+        [change] = [change for change in self.feed(models="cargo")["changes"] if change["object_id"] == self.cargo.pk]
+        listed = self.client.get("/cargos/").data["results"][0]
+        self.assertEqual(change["data"]["bids"], listed["bids"])
+        self.assertTrue(change["data"]["bids"][0]["update_url"].startswith("http://testserver/"))
+
+    def test_other_owners_bids_are_hidden(self):
+        other = OwnerDispatcher.objects.create(user=make_user("+998931234567", "owner"), passport_number="AC1234567")
+        self.client.force_authenticate(other.user)
+        self.bid(100)
+        changes = self.feed(models="bid")["changes"]
+        self.assertEqual(len(changes), 1)
+        self.assertIsNone(changes[0]["data"])
+
+    def test_entries_follow_commit_order_not_id_order(self):
+        # Keyinroq boshlangan (txid katta), lekin kichikroq id olgan tranzaksiya yozuvi kursor ortida qolmasin
+        cursor = self.feed()["cursor"]
+        late = ChangeLog.objects.create(model="bid", object_id=1, txid=20)
+        early = ChangeLog.objects.create(model="bid", object_id=2, txid=10)
+        data = self.feed(after=cursor, limit=1)
+        self.assertEqual([change["id"] for change in data["changes"]], [early.id])
+        self.assertEqual(data["cursor"], f"10:{early.id}")
+        self.assertEqual([change["id"] for change in self.feed(after=data["cursor"])["changes"]], [late.id])
+
+    def test_malformed_cursor_is_rejected(self):
+        self.assertEqual(self.client.get("/changes/", {"after": "15"}).status_code, 400)
+
+    @override_settings(CHANGE_FEED_SETTLE=60)
+    def test_recent_entries_wait_until_settled(self):
+        self.bid(100)
+        self.assertEqual(self.feed()["changes"], [])
+
+
+class AdminQueryBudgetTests(LogisticsTestCase):
+    PAGES = ["cargo", "bid", "tracking", "payment", "vehicle", "driver", "ownerdispatcher", "deliveryconfirmation",
+             "dispatcherorder"]
+
+    def setUp(self):
+        super().setUp()
+        self.admin_user = make_user("+998991234567", "dispatcher", is_staff=True, is_superuser=True)
+        self.dispatcher = OwnerDispatcher.objects.create(user=self.admin_user, passport_number="AD1234567")
+        self.client.force_login(self.admin_user)
+        self.rows = 0
+
+    def add_rows(self, count):
+        for _ in range(count):
+            self.rows += 1
+            user = make_user(f"+99893{self.rows:07d}", "carrier", first_name="Ali")
+            driver = Driver.objects.create(carrier=user, license_number=f"L{self.rows}", passport_number=f"P{self.rows}")
+            vehicle = Vehicle.objects.create(vehicle="Isuzu", driver=driver, capacity=10, plate_number=f"01A{self.rows:03d}BC")
+            cargo = make_cargo(self.owner, self.region, self.unit)
+            Bid.objects.create(driver=driver, cargo=cargo, propose="Olaman", proposed_price=100)
+            Tracking.objects.create(cargo=cargo, driver=driver, vehicle=vehicle)
+            Payment.objects.create(cargo=cargo, amount=100)
+            DeliveryConfirmation.objects.create(cargo=cargo, driver=driver, receiver=self.owner)
+            DispatcherOrder.objects.create(dispatcher=self.dispatcher, cargo=cargo, assigned_driver=driver)
+
+    def count_queries(self, url):
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.add_rows(2)
+        [self.count_queries(f"/admin/main/{page}/") for page in self.PAGES]  # keshlarni isitamiz
+        before = {page: self.count_queries(f"/admin/main/{page}/") for page in self.PAGES}
+        self.add_rows(5)
+        after = {page: self.count_queries(f"/admin/main/{page}/") for page in self.PAGES}
+        self.assertEqual(after, before)
+        for page, count in after.items():
+            self.assertLessEqual(count, 8, page)  # sessiya + foydalanuvchi + son + sahifa (+ savepoint lar)
+
+    def test_change_forms_render_without_full_dropdowns(self):
+        self.add_rows(2)
+        cargo = Cargo.objects.first()
+        urls = [f"/admin/main/cargo/{cargo.pk}/change/", f"/admin/main/bid/{cargo.bids.get().pk}/change/",
+                f"/admin/main/tracking/{cargo.tracking.pk}/change/", "/admin/main/cargo/add/"]
+        [self.count_queries(url) for url in urls]  # content type va ma'lumotnoma keshlarini isitamiz
+        before = [self.count_queries(url) for url in urls]
+        self.add_rows(5)
+        self.assertEqual([self.count_queries(url) for url in urls], before)  # tanlash ro'yxatlari qatorlar soniga bog'liq emas
+        self.assertLessEqual(max(before), 14)
+
+    def test_autocomplete_pages_are_ordered(self):
+        self.add_rows(2)
+        fields = [("bid", "driver"), ("cargo", "customer"), ("tracking", "vehicle")]
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", UnorderedObjectListWarning)
+            for model_name, field_name in fields:
+                params = {"app_label": "main", "model_name": model_name, "field_name": field_name, "term": ""}
+                self.assertEqual(self.client.get("/admin/autocomplete/", params).status_code, 200, model_name)
+
+    def test_autocomplete_is_limited_like_the_form_queryset(self):
+        self.add_rows(1)
+        params = {"app_label": "main", "model_name": "bid", "field_name": "driver", "term": ""}
+        response = self.client.get("/admin/autocomplete/", params)
+        self.assertEqual([int(item["id"]) for item in response.json()["results"]], [self.driver.pk])  # faqat tasdiqlangan
+
+
+class BulkImportTests(LogisticsTestCase):
+    DRIVERS_CSV = (
+        "phone_number,first_name,license_number,passport_number,vehicle,plate_number,capacity,capacity_unit\n"
+        "+998 93 000 00 01,Ali,LIC100,AA0000001,Isuzu,01A100AA,10,T\n"
+        "+998930000002,Vali,LIC101,AA0000002,,,,\n"
+        "+998930000003,Soli,LIC100,AA0000003,,,,\n"  # guvohnoma faylda takrorlangan
+        "+998911234567,Gani,LIC102,AA0000004,,,,\n"  # raqam bazada bor
+        "+99893000,Hamid,LIC103,AA0000005,,,,\n"  # raqam noto'g'ri
+        "+998930000006,Olim,LIC104,AA0000006,Kamaz,,20,T\n"  # transport to'liq emas
+    )
+
+    def run_import(self, kind, content, *args):
+        path = f"/tmp/bulk-import-test.{'ndjson' if content.startswith('{') else 'csv'}"
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+        out, err = io.StringIO(), io.StringIO()
+        call_command("bulk_import", kind, path, *args, stdout=out, stderr=err)
+        return out.getvalue(), [json.loads(line) for line in err.getvalue().splitlines()]
+
+    def test_drivers_are_created_and_bad_rows_reported(self):
+        out, errors = self.run_import("drivers", self.DRIVERS_CSV, "--chunk-size", "4")
+        self.assertIn("6 ta qator, 2 ta yaratildi, 4 ta xato", out)
+        self.assertEqual(
+            [(error["line"], sorted(error["errors"])) for error in errors],
+            [(4, ["license_number"]), (5, ["phone_number", "username"]), (6, ["phone_number"]),
+             (7, ["plate_number"])],
+        )
+        driver = Driver.objects.get(license_number="LIC100")
+        self.assertEqual(driver.carrier.phone_number, "+998930000001")
+        self.assertTrue(driver.carrier.groups.filter(name="carrier_group").exists())
+        self.assertFalse(driver.carrier.has_usable_password())
+        self.assertEqual(driver.vehicle.capacity_kg, 10_000)
+
+    def test_chunk_queries_do_not_grow_with_rows(self):
+        def rows(start, count):
+            return "".join(
+                json.dumps({"phone_number": f"+99894{i:07d}", "license_number": f"L{i}", "passport_number": f"P{i}",
+                            "vehicle": "Isuzu", "plate_number": f"V{i}", "capacity": 5}) + "\n"
+                for i in range(start, start + count)
+            )
+        with CaptureQueriesContext(connection) as small:
+            self.run_import("drivers", rows(0, 3))
+        with CaptureQueriesContext(connection) as large:
+            self.run_import("drivers", rows(100, 30))
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(Vehicle.objects.filter(plate_number__startswith="V").count(), 33)
+
+    def test_cargos_resolve_reference_names_and_owners(self):
+        content = (
+            "customer,pickup_region,pickup_location,delivery_region,delivery_location,cargo_type,weight,weight_unit,"
+            "volume,readiness_choice,placement_method,payment_method,transport_type\n"
+            f"+998901234567,Toshkent,Chilonzor,{self.region.id},{self.unit.id},Мебель,2,T,10,ready,Orqadan,card,Fura\n"
+            "+998901234567,Toshkent,Yunusobod,toshkent,chilonzor,Meva,2,T,10,ready,Orqadan,card,Fura\n"
+        )
+        out, errors = self.run_import("cargos", content)
+        self.assertEqual(errors, [{"line": 3, "errors": {"pickup_location": ["Tuman/shahar topilmadi yoki boshqa viloyatga tegishli."]}}])
+        cargo = Cargo.objects.get()
+        self.assertEqual((cargo.customer, cargo.pickup_location, cargo.weight_kg), (self.owner, self.unit, 2000))
+        self.assertEqual(cargo.search_document, "mebel fura orqadan")
+        self.assertTrue(ChangeLog.objects.filter(model="cargo", object_id=cargo.pk).exists())
+
+    def test_admin_upload(self):
+        admin_user = make_user("+998991234567", "dispatcher", is_staff=True, is_superuser=True)
+        self.client.force_login(admin_user)
+        upload = SimpleUploadedFile("fleet.csv", self.DRIVERS_CSV.encode("utf-8-sig"), content_type="text/csv")
+        response = self.client.post("/admin/main/driver/import/", {"file": upload}, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("6 ta qator, 2 ta yaratildi, 4 ta xato.", [str(message) for message in response.context["messages"]])
+        self.assertEqual(Driver.objects.filter(license_number__in=["LIC100", "LIC101"]).count(), 2)
+
+
+def make_photo(name="photo.jpg", size=(3000, 2000), orientation=None):
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    Image.new("RGB", size, "navy").save(buffer, "JPEG", exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+class DocumentImageTests(LogisticsTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, MEDIA_DELIVERY=None, DEBUG=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_authenticate(self.carrier_user)
+        self.client.force_login(self.carrier_user)  # media view - oddiy Django view (sessiya yoki JWT)
+
+    def upload_license(self, photo):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.driver.license_image = photo
+            self.driver.save()
+        image_worker.join()
+        return self.driver.license_image.name
+
+    def test_derivatives_are_resized_and_rotated_in_background(self):
+        name = self.upload_license(make_photo(orientation=6))  # 90° aylantirilgan telefon rasmi
+        storage = self.driver.license_image.storage
+        with Image.open(storage.path(derivative_name(name, "preview"))) as preview:
+            self.assertEqual((preview.format, preview.size), ("WEBP", (853, 1280)))
+        with Image.open(storage.path(derivative_name(name, "thumbnail"))) as thumbnail:
+            self.assertEqual(thumbnail.format, "JPEG")
+            self.assertEqual(max(thumbnail.size), 320)
+            self.assertNotIn("exif", thumbnail.info)
+
+    def test_unchanged_image_is_not_reprocessed(self):
+        self.upload_license(make_photo())
+        self.driver.refresh_from_db()
+        with mock.patch.object(image_worker, "submit") as submit, self.captureOnCommitCallbacks(execute=True):
+            self.driver.is_verified = False
+            self.driver.save()
+        submit.assert_not_called()
+
+    def test_api_returns_derivative_urls(self):
+        name = self.upload_license(make_photo())
+        response = self.client.get(f"/drivers/{self.driver.id}/")
+        self.assertEqual(
+            response.data["license_image_derivatives"]["thumbnail"],
+            f"http://testserver/media/{derivative_name(name, 'thumbnail')}",
+        )
+        self.assertIsNone(response.data["passport_image_derivatives"])
+
+    def test_media_view_falls_back_to_original_until_derivative_exists(self):
+        with mock.patch.object(image_worker, "submit"):
+            name = self.upload_license(make_photo())
+        response = self.client.get(f"/media/{derivative_name(name, 'preview')}")
+        self.assertEqual((response.status_code, response["Content-Type"]), (200, "image/jpeg"))
+        self.assertEqual(self.client.get("/media/../settings.py").status_code, 404)
+        self.assertEqual(self.client.get(f"/media/{name}.missing").status_code, 403)  # egasi emas: mavjudligi ham oshkor qilinmaydi
+
+    def test_documents_are_visible_to_owner_and_staff_only(self):
+        url = f"/media/{derivative_name(self.upload_license(make_photo()), 'thumbnail')}"
+        self.assertEqual(self.client.get(url)["Cache-Control"], "private")
+        stranger = APIClient()
+        self.assertEqual(stranger.get(url).status_code, 401)
+        stranger.force_login(self.owner_user)
+        self.assertEqual(stranger.get(url).status_code, 403)
+        staff = make_user("+998977778899", "dispatcher", is_staff=True)
+        token = AccessToken.for_user(staff)
+        self.assertEqual(APIClient().get(url, HTTP_AUTHORIZATION=f"Bearer {token}").status_code, 200)
+
+    def test_python_delivery_is_refused_outside_debug(self):
+        name = self.upload_license(make_photo())
+        with self.settings(DEBUG=False), self.assertRaises(ImproperlyConfigured):
+            self.client.get(f"/media/{name}")
+
+    def test_media_is_handed_off_to_the_web_server(self):
+        name = self.upload_license(make_photo())
+        thumbnail = derivative_name(name, "thumbnail")
+        with self.settings(MEDIA_DELIVERY="x-accel"):
+            response = self.client.get(f"/media/{thumbnail}")
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{thumbnail}")
+        self.assertEqual((response["Content-Type"], response.content), ("image/jpeg", b""))
+        with self.settings(MEDIA_DELIVERY="x-sendfile"):
+            response = self.client.get(f"/media/{thumbnail}")
+        self.assertEqual(response["X-Sendfile"], self.driver.license_image.storage.path(thumbnail))
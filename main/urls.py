@@ -18,6 +18,9 @@ router.register('administreviteUnits', AdministraviteUnitViewSet)
 
 urlpatterns = [
     path('register/', UserViewSet.as_view({'post': 'create'}), name='register'),  
+    path('cargos/<int:pk>/events/', cargo_events, name='cargo-events'),
+    path('cache-stats/', ResponseCacheStatsView.as_view(), name='cache-stats'),
+    path('changes/', ChangeFeedView.as_view(), name='changes'),
     path('', include(router.urls)),
     path("bids/<int:pk>/update-status/", BidViewSet.as_view({'patch': 'update_status'}), name="bid-update-status")
 ]
\ No newline at end of file
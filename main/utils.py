@@ -1,4 +1,5 @@
 import random
+import re
 import phonenumbers
 
 from phonenumbers import parse, is_valid_number, NumberParseException
@@ -22,21 +23,69 @@ PRIORITY_COUNTRIES_CODES = {
     '+966': {'valid_codes': ['50', '53', '54', '55', '56', '57', '58', '59'], 'length': 7},
 }
 
-def validate_priority_phone_number(phone: str):
+def _alternation(values):
+    """Regex alternativasi: uzunlari avval (eng uzun kod birinchi tekshiriladi)"""
+    return "|".join(re.escape(value) for value in sorted(values, key=len, reverse=True))
+
+
+# Jadval import vaqtida bir marta kompilyatsiya qilinadi
+_COUNTRY_RE = re.compile(f"({_alternation(PRIORITY_COUNTRIES_CODES)})")
+_OPERATOR_RES = {
+    prefix: re.compile(f"({_alternation(info['valid_codes'])})")
+    for prefix, info in PRIORITY_COUNTRIES_CODES.items()
+}
+
+
+def normalize_phone_number(phone: str):
+    """Bo'sh joy va chiziqchalarni olib tashlaydi, raqamni tekshiradi va normallashgan ko'rinishini qaytaradi"""
     phone = phone.replace(' ', '').replace('-', '')
 
-    for prefix, info in PRIORITY_COUNTRIES_CODES.items():
-        if phone.startswith(prefix):
-            without_prefix = phone[len(prefix):]
-
-            # Har xil uzunlikdagi operator kodlari (2 yoki 3 belgili)
-            possible_codes = sorted(info['valid_codes'], key=len, reverse=True)  # eng uzun kodni avval tekshiramiz
-            for code in possible_codes:
-                if without_prefix.startswith(code):
-                    number_part = without_prefix[len(code):]
-                    if len(number_part) != info['length']:
-                        raise ValidationError(f"{prefix} raqam uzunligi noto‘g‘ri: {code} dan keyin {info['length']} ta raqam bo‘lishi kerak.")
-                    return True
-
-            raise ValidationError(f"{prefix} uchun operator kodi noto‘g‘ri.")
-    raise ValidationError("Telefon raqam ruxsat berilmagan davlat kodi bilan boshlanmoqda.")
\ No newline at end of file
+    country = _COUNTRY_RE.match(phone)
+    if country is None:
+        raise ValidationError("Telefon raqam ruxsat berilmagan davlat kodi bilan boshlanmoqda.")
+    prefix = country.group(1)
+    info = PRIORITY_COUNTRIES_CODES[prefix]
+
+    # Har xil uzunlikdagi operator kodlari (2 yoki 3 belgili)
+    operator = _OPERATOR_RES[prefix].match(phone, len(prefix))
+    if operator is None:
+        raise ValidationError(f"{prefix} uchun operator kodi noto‘g‘ri.")
+    if len(phone) - operator.end() != info['length']:
+        code = operator.group(1)
+        raise ValidationError(f"{prefix} raqam uzunligi noto‘g‘ri: {code} dan keyin {info['length']} ta raqam bo‘lishi kerak.")
+    return phone
+
+
+def validate_priority_phone_number(phone: str):
+    normalize_phone_number(phone)
+    return True
+
+
+def normalize_phone_numbers(phones):
+    """Ko'p raqamni birdan tekshirish (ommaviy import uchun).
+    (normallashgan raqamlar ro'yxati - xato bo'lsa None, {indeks: xato matni}) ni qaytaradi"""
+    normalized, errors = [], {}
+    for index, phone in enumerate(phones):
+        try:
+            normalized.append(normalize_phone_number(phone))
+        except ValidationError as exc:
+            normalized.append(None)
+            errors[index] = exc.messages[0]
+    return normalized, errors
+
+
+# Kirill yozuvini o'zbek lotin yozuviga o'giramiz: "Фура" va "Fura", "рефрижератор" va "refrijerator" bir xil
+_CYRILLIC_TO_LATIN = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo', 'ж': 'j', 'з': 'z', 'и': 'i',
+    'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't',
+    'у': 'u', 'ф': 'f', 'х': 'x', 'ц': 's', 'ч': 'ch', 'ш': 'sh', 'щ': 'sh', 'ъ': '', 'ы': 'i', 'ь': '',
+    'э': 'e', 'ю': 'yu', 'я': 'ya', 'ў': 'o', 'қ': 'q', 'ғ': 'g', 'ҳ': 'h',
+})
+_APOSTROPHES_RE = re.compile(r"['`‘’ʻʼ]")  # o‘/oʻ/o' - hammasi o
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def normalize_search_text(*values):
+    """Qidiruv uchun matn: kichik harf, lotin yozuvi, apostrof va tinish belgilarisiz, so'zlar bitta bo'shliq bilan"""
+    text = " ".join(value for value in values if value).lower().translate(_CYRILLIC_TO_LATIN)
+    return " ".join(_NON_WORD_RE.sub(" ", _APOSTROPHES_RE.sub("", text)).split())
@@ -1,4 +1,5 @@
 from rest_framework.exceptions import ValidationError
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from rest_framework.permissions import BasePermission, IsAdminUser, IsAuthenticated
@@ -7,7 +8,37 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework import permissions, status
 from rest_framework.views import APIView
-from .utils import generate_auth_code
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from .pubsub import get_broker, cargo_channel
+from .ranking import rank_drivers
+import asyncio
+import json
+import mimetypes
+import os
+from urllib.parse import quote
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.utils._os import safe_join
+from django.views.static import serve as static_serve
+from .images import original_name
+from rest_framework.parsers import JSONParser
+from .parsers import NDJSONParser
+from .otp import otp_store
+from .reference import get_snapshot
+from .search import search_cargos
+from .mixins import ConditionalGetMixin, ResponseCacheMixin, SparseFieldsetsMixin
+from .response_cache import response_cache
+from django.db import transaction
+from django.db.models.functions import Coalesce, Greatest
+from django.utils.cache import get_conditional_response
+from rest_framework.exceptions import NotFound
+from .authentication import db_user
+from rest_framework.settings import api_settings
 
 class IsAuthenticatedOrPostOnly(BasePermission):
     def has_permission(self, request, view):
@@ -28,35 +59,36 @@ class UserViewSet(ModelViewSet):
             return UserCreateSerializer
         elif self.action == 'verify_code':
             return VerifyCodeSerializer
-        elif self.action in ['resend_verification_code', 'test', 'send_reset_code', 'reset_password']:
+        elif self.action in ['resend_verification_code', 'send_reset_code', 'reset_password']:
             return serializers.Serializer
         elif self.action == 'change_phone_request':
             return ChangePhoneRequestSerializer
         elif self.action == 'confirm_phone_change':
             return ConfirmPhoneChangeSerializer
         return UserUpdateSerializer
+
+    def perform_create(self, serializer):
+        user = serializer.save()
+        auth_code = otp_store.issue('verify', user.phone_number)
+        print(f"TEST MODE: {user.phone_number} uchun tasdiqlash kodi: {auth_code}")
     
     @action(detail=False, methods=['post'], permission_classes=[])
     def resend_verification_code(self, request):
-        phone_number = request.data.get("phone_number")
-        try:
-            user = User.objects.get(phone_number=phone_number, is_active=False)
-        except User.DoesNotExist:
+        phone_number = otp_store.phone_number(request.data.get("phone_number"))
+        if not User.objects.filter(phone_number=phone_number, is_active=False).exists():
             return Response(
                 {"error": "Foydalanuvchi topilmadi yoki allaqachon tasdiqlangan!"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Auth code yangilash
-        user.auth_code = generate_auth_code()  # Utilsdan import qilingan funksiya
-        user.save()
+        # Kod keshga yoziladi, User jadvaliga emas
+        auth_code = otp_store.issue('verify', phone_number)
 
-
-        print(f"TEST MODE: {phone_number} uchun tasdiqlash kodi: {user.auth_code}")
+        print(f"TEST MODE: {phone_number} uchun tasdiqlash kodi: {auth_code}")
 
         return Response({
             "message": "Tasdiqlash kodi qayta yuborildi!",
-            "test_auth_code": user.auth_code  # faqat test rejimi uchun
+            "test_auth_code": auth_code  # faqat test rejimi uchun
         }, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'], permission_classes=[])
@@ -65,34 +97,27 @@ class UserViewSet(ModelViewSet):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        phone_number = serializer.validated_data[request.user.phone_number]
+        phone_number = otp_store.phone_number(serializer.validated_data["phone_number"])
         auth_code = serializer.validated_data["auth_code"]
-        try:
-            user = User.objects.get(phone_number=phone_number, auth_code=auth_code, is_active=False)
-        except User.DoesNotExist:
+        if otp_store.check('verify', phone_number, auth_code) is None or not User.objects.filter(
+            phone_number=phone_number, is_active=False
+        ).update(is_active=True, updated_at=timezone.now()):
             return Response(
                 {"error": "Tasdiqlash kodi noto‘g‘ri yoki allaqachon faollashtirilgan!"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        user.is_active = True
-        user.auth_code = None
-        user.save()
-
         return Response({"message": "Foydalanuvchi muvaffaqiyatli faollashtirildi!"}, status=status.HTTP_200_OK)
     
     @action(detail=False, methods=['post'], permission_classes=[])
     def send_reset_code(self, request):
-        phone_number = request.data.get("phone_number")
-        try:
-            user = User.objects.get(phone_number=phone_number)
-        except User.DoesNotExist:
+        phone_number = otp_store.phone_number(request.data.get("phone_number"))
+        if not User.objects.filter(phone_number=phone_number).exists():
             return Response({"error": "Bu raqam bilan foydalanuvchi topilmadi!"}, status=404)
 
-        user.auth_code = generate_auth_code()
-        user.save()
+        auth_code = otp_store.issue('reset', phone_number)
 
-        print(f"[TEST MODE] Parol tiklash kodi: {user.auth_code}")
+        print(f"[TEST MODE] Parol tiklash kodi: {auth_code}")
         return Response({"message": "Parolni tiklash uchun kod yuborildi!"}, status=200)
     
     @action(detail=False, methods=['post'], permission_classes=[])
@@ -101,16 +126,14 @@ class UserViewSet(ModelViewSet):
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
 
-        try:
-            user = User.objects.get(
-                phone_number=data['phone_number'],
-                auth_code=data['auth_code']
-            )
-        except User.DoesNotExist:
+        phone_number = otp_store.phone_number(data['phone_number'])
+        user = None
+        if otp_store.check('reset', phone_number, data['auth_code']) is not None:
+            user = User.objects.filter(phone_number=phone_number).first()
+        if user is None:
             return Response({"error": "Kod noto‘g‘ri yoki foydalanuvchi topilmadi!"}, status=400)
 
         user.set_password(data['new_password'])
-        user.auth_code = None
         user.save()
         return Response({"message": "Parol muvaffaqiyatli o‘zgartirildi!"})
 
@@ -120,16 +143,14 @@ class UserViewSet(ModelViewSet):
         serializer.is_valid(raise_exception=True)
 
         new_phone = serializer.validated_data['new_phone_number']
-        user = request.user
-        user.auth_code = generate_auth_code()
-        user.temp_phone_number = new_phone  # Bu fieldni User modelga qo‘shamiz
-        user.save()
+        # Yangi raqam kod bilan birga keshda saqlanadi, tasdiqlanguncha User o'zgarmaydi
+        auth_code = otp_store.issue('phone_change', request.user.pk, phone_number=new_phone, new_phone_number=new_phone)
 
-        print(f"TEST MODE: {new_phone} raqamga yuborilgan kod: {user.auth_code}")
+        print(f"TEST MODE: {new_phone} raqamga yuborilgan kod: {auth_code}")
         
         return Response({
             "message": "Yangi telefon raqamga tasdiqlash kodi yuborildi.",
-            "test_auth_code": user.auth_code  # test rejimi uchun
+            "test_auth_code": auth_code  # test rejimi uchun
         }, status=status.HTTP_200_OK)
     
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
@@ -137,49 +158,41 @@ class UserViewSet(ModelViewSet):
         serializer = ConfirmPhoneChangeSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
 
-        user = request.user
-        user.phone_number = user.temp_phone_number
-        user.temp_phone_number = None
-        user.auth_code = None
+        user = db_user(request.user)  # stateless JWT rejimida ClaimsUser bo'ladi
+        user.phone_number = serializer.validated_data['new_phone_number']
         user.save()
 
         return Response({
             "message": "Telefon raqam muvaffaqiyatli o‘zgartirildi."
         }, status=status.HTTP_200_OK)
 
-    @action(detail=False, methods=['post'], permission_classes=[])
-    def test(self, request):   
-        """Test rejimi: telefon raqam bo‘yicha auth_code ni ko‘rsatish"""
-        phone_number = request.data.get("phone_number")
-
-        if not phone_number:
-            return Response({"error": "Telefon raqam yuboring!"}, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            user = User.objects.get(phone_number=phone_number)
-        except User.DoesNotExist:
-            return Response({"error": "Foydalanuvchi topilmadi!"}, status=status.HTTP_404_NOT_FOUND)
-
-        return Response({
-            "phone_number": phone_number,
-            "auth_code": user.auth_code  # Endi bu yerda foydalanuvchining auth_code qiymati ko'rsatiladi
-        }, status=status.HTTP_200_OK)
 
-
-class RegionViewSet(ReadOnlyModelViewSet):
+class RegionViewSet(ResponseCacheMixin, ReadOnlyModelViewSet):
     queryset = Region.objects.all()
     serializer_class = RegionSerializer
+    cache_dependencies = (Region,)
 
     @action(detail=True, methods=["get"])
     def units(self, request, pk=None):
-        """Viloyatga bog‘langan shahar/tumanlarni qaytaradi"""
-        region = self.get_object()
-        units = AdministrativeUnit.objects.filter(region=region)
-        serializer = AdministrativeUnitSerializer(units, many=True)
-        return Response(serializer.data)
-
-
-class DriverViewSet(ModelViewSet):
+        """Viloyatga bog‘langan shahar/tumanlarni qaytaradi (xotiradagi ma'lumotnomadan)"""
+        snapshot = get_snapshot()
+        try:
+            units = snapshot.units_by_region[int(pk)]
+        except (KeyError, ValueError):
+            raise NotFound()
+        return Response([snapshot.unit_data(unit) for unit in units])
+
+    @action(detail=False, methods=["get"])
+    def snapshot(self, request):
+        """Barcha viloyatlar va tumanlar bitta javobda. ETag o'zgarmagan bo'lsa 304 qaytadi"""
+        snapshot = get_snapshot()
+        not_modified = get_conditional_response(request._request, etag=snapshot.etag)
+        if not_modified is not None:
+            return not_modified
+        return Response(snapshot.as_data(), headers={"ETag": snapshot.etag})
+
+
+class DriverViewSet(ConditionalGetMixin, SparseFieldsetsMixin, ModelViewSet):
     queryset = Driver.objects.all()
     serializer_class = DriverSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -197,7 +210,7 @@ class DriverViewSet(ModelViewSet):
         return Response(serializer.errors, status=400)
 
 
-class OwnerDispatcherViewSet(ModelViewSet):
+class OwnerDispatcherViewSet(ConditionalGetMixin, SparseFieldsetsMixin, ModelViewSet):
     queryset = OwnerDispatcher.objects.all()
     serializer_class = Owner_dispatcherSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -215,56 +228,198 @@ class OwnerDispatcherViewSet(ModelViewSet):
         return Response(serializer.errors, status=400)
 
 
-class VehicleViewSet(ModelViewSet):
+class VehicleViewSet(ConditionalGetMixin, SparseFieldsetsMixin, ModelViewSet):
     queryset = Vehicle.objects.all()
     serializer_class = VehicleSerializer
 
+    @action(detail=True, methods=['get'], url_path='matching-cargos')
+    def matching_cargos(self, request, pk=None):
+        """Ushbu mashinaga sig'adigan kutilayotgan yuklar (yuklash vaqti bo'yicha keyset sahifalash)"""
+        vehicle = self.get_object()
+        params = CargoCursorSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        cargos = Cargo.objects.for_board().fitting(vehicle)
+        loading_time, pk = data.get('cursor', (None, None))
+        limit = data['limit'] + 1
+        # Avval yuklash vaqti bor yuklar (keyset oraliq bilan), sahifa to'lmasa - vaqti yo'qlari (id bo'yicha)
+        page = []
+        if loading_time is not None or pk is None:
+            dated = cargos.filter(loading_time__isnull=False)
+            if loading_time is not None:
+                dated = dated.after(loading_time, pk)
+            page = list(dated.order_by('loading_time', 'id')[:limit])
+        if len(page) < limit:
+            undated = cargos.filter(loading_time__isnull=True)
+            if loading_time is None and pk is not None:
+                undated = undated.filter(id__gt=pk)
+            page += undated.order_by('id')[:limit - len(page)]
+        has_next = len(page) > data['limit']
+        page = page[:data['limit']]
+        serializer = CargoSerializer(page, many=True, context=self.get_serializer_context())
+        return Response({
+            "results": serializer.data,
+            "next_cursor": CargoCursorSerializer.encode_cursor(page[-1]) if has_next else None,
+        })
+
 
-class TrackingViewSet(ModelViewSet):
-    queryset = Tracking.objects.all()
+class TrackingViewSet(ResponseCacheMixin, ConditionalGetMixin, SparseFieldsetsMixin, ModelViewSet):
+    queryset = Tracking.objects.select_related('last_position')
     serializer_class = TrackingSerializer
+    last_modified_field = 'last_updated'
+    cache_dependencies = (Tracking,)
+
+    @action(detail=True, methods=['get', 'post'], serializer_class=TrackingPositionSerializer)
+    def positions(self, request, pk=None):
+        """GET: vaqt oralig'i bo'yicha marshrut tarixi, POST: yangi GPS nuqta qo'shish"""
+        tracking = self.get_object()
+        if request.method == 'POST':
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            position = tracking.record_position(**serializer.validated_data)
+            return Response(self.get_serializer(position).data, status=status.HTTP_201_CREATED)
+
+        params = TrackingHistorySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        positions = tracking.positions.order_by('recorded_at')
+        if 'since' in params.validated_data:
+            positions = positions.filter(recorded_at__gte=params.validated_data['since'])
+        if 'until' in params.validated_data:
+            positions = positions.filter(recorded_at__lt=params.validated_data['until'])
+        serializer = self.get_serializer(positions[:params.validated_data['limit']], many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def pings(self, request):
+        """Bir yoki bir nechta yuk uchun GPS nuqtalarni paket bilan qabul qilish (JSON massiv yoki NDJSON)"""
+        serializer = TrackingPingSerializer(
+            data=request.data, many=True, allow_empty=False, max_length=NDJSONParser.max_items
+        )
+        serializer.is_valid(raise_exception=True)
+        pings = serializer.validated_data
 
+        trackings = dict(
+            Tracking.objects.filter(cargo_id__in={ping['cargo'] for ping in pings}).values_list('cargo_id', 'id')
+        )
+        unknown = sorted({ping['cargo'] for ping in pings} - trackings.keys())
+        if unknown:
+            return Response(
+                {"error": "Bu yuklar uchun kuzatuv mavjud emas!", "cargos": unknown},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-class PaymentViewSet(ModelViewSet):
+        now = timezone.now()
+        positions = TrackingPosition.bulk_record([
+            TrackingPosition(
+                tracking_id=trackings[ping['cargo']],
+                latitude=ping['latitude'], longitude=ping['longitude'], speed=ping.get('speed'),
+                recorded_at=ping.get('recorded_at') or now,
+            )
+            for ping in pings
+        ])
+        return Response({"accepted": len(positions)}, status=status.HTTP_201_CREATED)
+
+
+class PaymentViewSet(ConditionalGetMixin, SparseFieldsetsMixin, ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
 
 
-class CargoViewSet(ModelViewSet):
-    queryset = Cargo.objects.all()
+class CargoViewSet(ResponseCacheMixin, ConditionalGetMixin, SparseFieldsetsMixin, ModelViewSet):
+    queryset = Cargo.objects.for_board()
     serializer_class = CargoSerializer
+    cache_dependencies = (Cargo, Bid)  # ro'yxatda bid-lar va yig'indi ham bor
+
+    def get_last_modified_expression(self):
+        # Ro'yxatda bid-lar ham bor: ularning o'zgarishi yig'indi qatorining updated_at ida aks etadi
+        return Greatest('updated_at', Coalesce('bid_summary__updated_at', 'updated_at'))
+
+    @action(detail=False, methods=['get'], url_path='route-search')
+    def route_search(self, request):
+        """Marshrut bo'yicha ochiq yuklarni qidirish (loading_time bo'yicha keyset sahifalash)"""
+        params = CargoRouteSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        cargos = Cargo.objects.for_board().on_route(
+            pickup_region=data.get('pickup_region'),
+            pickup_location=data.get('pickup_location'),
+            delivery_region=data.get('delivery_region'),
+            delivery_location=data.get('delivery_location'),
+        ).filter(cargo_status=data['cargo_status'], loading_time__isnull=False)
+        if 'loading_from' in data:
+            cargos = cargos.filter(loading_time__gte=data['loading_from'])
+        if 'loading_to' in data:
+            cargos = cargos.filter(loading_time__lt=data['loading_to'])
+        if 'cursor' in data:
+            cargos = cargos.after(*data['cursor'])
+
+        page = list(cargos.order_by('loading_time', 'id')[:data['limit'] + 1])
+        has_next = len(page) > data['limit']
+        page = page[:data['limit']]
+        serializer = self.get_serializer(page, many=True)
+        return Response({
+            "results": serializer.data,
+            "next_cursor": CargoRouteSearchSerializer.encode_cursor(page[-1]) if has_next else None,
+        })
+
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Yuk turi, transport, yuklash usuli va talablar bo'yicha qidiruv (xato yozilgan so'zlar ham), moslik tartibida"""
+        params = CargoTextSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        cargos = search_cargos(
+            Cargo.objects.for_board().filter(cargo_status=data['cargo_status']), data['q'], limit=data['limit']
+        )
+        serializer = self.get_serializer(cargos, many=True)
+        return Response({
+            "results": [{**item, "rank": round(cargo.rank, 4)} for cargo, item in zip(cargos, serializer.data)],
+        })
 
 
-class DeliveryConfirmationViewSet(ModelViewSet):
+class DeliveryConfirmationViewSet(SparseFieldsetsMixin, ModelViewSet):
     queryset = DeliveryConfirmation.objects.all()
     serializer_class = DeliverySerializer
 
 
-class DispatcherViewSet(ModelViewSet):
+class DispatcherViewSet(ConditionalGetMixin, SparseFieldsetsMixin, ModelViewSet):
     queryset = DispatcherOrder.objects.all()
     serializer_class = DispatcherOrderSerializer
 
+    @action(detail=True, methods=['get'], url_path='suggested-drivers')
+    def suggested_drivers(self, request, pk=None):
+        """Buyurtma yukiga eng mos k ta tasdiqlangan haydovchi (ball bo'yicha kamayish tartibida)"""
+        order = self.get_object()
+        params = DriverRankingSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        ranking = rank_drivers(order.cargo, k=params.validated_data['k'])
+        return Response([{"driver": driver_id, "score": score} for driver_id, score in ranking])
+
 
-class BidViewSet(ModelViewSet):
+class BidViewSet(ResponseCacheMixin, ConditionalGetMixin, SparseFieldsetsMixin, ModelViewSet):
     queryset = Bid.objects.all()
     serializer_class = BidSerializer
     permission_classes = [IsAuthenticated]
+    cache_dependencies = (Bid, Cargo)
+
+    def get_response_scope(self):
+        return self.request.user.pk  # har bir yuk egasining o'z bid-lari
 
     def get_queryset(self):
+        queryset = super().get_queryset()  # ?fields= / ?expand= SQL ga ham qo'llanadi (SparseFieldsetsMixin)
         if self.request.user.is_authenticated:
-            owner_dispatcher = OwnerDispatcher.objects.filter(user=self.request.user).first()
-            if owner_dispatcher:
-                return Bid.objects.filter(
-                    cargo__customer=owner_dispatcher,
-                    cargo__bids__status__in=['pending', 'rejected']  # accepted bo‘lmaganlar
-                ).distinct()
-        return Bid.objects.none()
+            return queryset.for_owner(self.request.user)  # /changes/ ham shu doirani ishlatadi
+        return queryset.none()
 
     def update_status(self, request, pk=None):
         bid = get_object_or_404(Bid, id=pk)
 
         # Faqat yuk egasi bid statusini o'zgartira oladi
-        owner_dispatcher = OwnerDispatcher.objects.filter(user=request.user).first()
+        owner_dispatcher = OwnerDispatcher.objects.filter(user_id=request.user.pk).first()
         if not owner_dispatcher or bid.cargo.customer != owner_dispatcher:
             return Response(
                 {"error": "Siz faqat o'zingizning yuklaringizga berilgan bid-larni boshqara olasiz!"},
@@ -273,22 +428,209 @@ class BidViewSet(ModelViewSet):
 
         serializer = BidStatusUpdateSerializer(bid, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            if serializer.validated_data.get('status') == 'accepted':
+                bid.accept()  # qolgan takliflar ham shu tranzaksiyada rad etiladi
+            else:
+                serializer.save()
             return Response({"message": "Bid statusi yangilandi!", "bid": serializer.data}, status=status.HTTP_200_OK)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     def perform_create(self, serializer):
         cargo = serializer.validated_data['cargo']
-        
-        # Agar bu yukga allaqachon accepted holatidagi bid bo‘lsa
-        if Bid.objects.filter(cargo=cargo, status='accepted').exists():
-            raise ValidationError({"detail": "Bu yukga allaqachon biror taklif tasdiqlangan. Yangi taklif yuborish mumkin emas."})
-        
-        serializer.save()
+
+        # Agar bu yukga allaqachon accepted holatidagi bid bo‘lsa. Tekshiruv va yozish yuk qatori qulfi ostida:
+        # bir vaqtdagi Bid.accept() yoki oldin tugaydi (bu yerda ko'rinadi), yoki yangi bid ni ham rad etadi
+        with transaction.atomic():
+            Cargo.lock_rows([cargo.pk])
+            if CargoBidSummary.objects.filter(cargo_id=cargo.pk, accepted_bid__isnull=False).exists():
+                raise ValidationError({"detail": "Bu yukga allaqachon biror taklif tasdiqlangan. Yangi taklif yuborish mumkin emas."})
+            serializer.save()
+
 
 
+class ResponseCacheStatsView(APIView):
+    """Javob keshi statistikasi (hit/miss) endpointlar bo'yicha, faqat adminlar uchun"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(response_cache.stats())
+
+
+class ChangeFeedView(APIView):
+    """
+    O'zgarishlar oqimi: ?after=<cursor> dan keyingi barcha o'zgarishlar (o'chirilganlar ham) tartib bilan.
+    Mijoz javobdagi cursor ni saqlab, keyingi safar faqat yangi o'zgarishlarni oladi (to'liq ro'yxat o'rniga).
+    upsert yozuvlarida obyektning joriy holati (data) bo'ladi; obyekt ko'rinmasa yoki keyin o'chirilgan bo'lsa null.
+    """
+    permission_classes = [IsAuthenticated]
+    sources = {
+        'cargo': (Cargo.objects.for_board, CargoSerializer),
+        'bid': (Bid.objects.all, BidSerializer),
+        'tracking': (lambda: Tracking.objects.select_related('last_position'), TrackingSerializer),
+        'dispatcherorder': (DispatcherOrder.objects.all, DispatcherOrderSerializer),
+    }
+
+    def visible(self, model, queryset):
+        if model != 'bid':
+            return queryset
+        return queryset.for_owner(self.request.user)  # /bids/ bilan bir xil doira
+
+    def get(self, request):
+        params = ChangeFeedSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        after, limit = params.validated_data['after'], params.validated_data['limit']
+
+        entries = ChangeLog.feed(after, settings.CHANGE_FEED_SETTLE)
+        if 'models' in params.validated_data:
+            entries = entries.filter(model__in=params.validated_data['models'])
+        entries = list(entries[:limit + 1])
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        # Har bir model uchun joriy holatni bitta so'rov bilan yuklaymiz
+        upserts = {}
+        for entry in entries:
+            if entry.action == 'upsert':
+                upserts.setdefault(entry.model, set()).add(entry.object_id)
+        current = {}
+        for model, ids in upserts.items():
+            queryset, serializer_class = self.sources[model]
+            objects = list(self.visible(model, queryset()).filter(pk__in=ids))
+            serializer = serializer_class(objects, many=True, context={'request': request})  # to'liq URL lar
+            current[model] = dict(zip((obj.pk for obj in objects), serializer.data))
+
+        changes = [
+            {**ChangeLogSerializer(entry).data, 'data': current.get(entry.model, {}).get(entry.object_id)}
+            for entry in entries
+        ]
+        cursor = entries[-1].cursor if entries else '{}:{}'.format(*after)
+        return Response({"changes": changes, "cursor": cursor, "has_more": has_more})
+
 
 class AdministraviteUnitViewSet(ModelViewSet):
     queryset = AdministrativeUnit.objects.all()
-    serializer_class = AdministrativeUnitSerializer 
\ No newline at end of file
+    serializer_class = AdministrativeUnitSerializer
+
+
+def _stream_user(request):
+    """EventSource sarlavha yubora olmaydi, shuning uchun token ?token= orqali ham qabul qilinadi"""
+    authentication = next(
+        (auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES if issubclass(auth, JWTAuthentication)),
+        JWTAuthentication(),
+    )
+    try:
+        result = authentication.authenticate(request)
+        if result is None and request.GET.get('token'):
+            return authentication.get_user(authentication.get_validated_token(request.GET['token']))
+        return result and result[0]
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def _can_watch_cargo(user, pk):
+    """Yuk egasi, dispetcherlar va adminlar kuzata oladi"""
+    owner_id = Cargo.objects.filter(pk=pk).values_list('customer__user_id', flat=True).first()
+    if owner_id is None:
+        return None
+    return user.is_staff or user.role == 'dispatcher' or owner_id == user.id
+
+
+def _cargo_snapshot(pk):
+    cargo = Cargo.objects.select_related('tracking__last_position').get(pk=pk)
+    snapshot = {'type': 'snapshot', 'cargo': cargo.id, 'cargo_status': cargo.cargo_status}
+    tracking = getattr(cargo, 'tracking', None)
+    if tracking is not None:
+        snapshot['tracking_status'] = tracking.status
+        if tracking.last_position:
+            snapshot['position'] = TrackingPositionSerializer(tracking.last_position).data
+    return snapshot
+
+
+def _sse(message):
+    return f"event: {message['type']}\ndata: {json.dumps(message, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def cargo_events(request, pk):
+    """Yuk holati va joylashuvi o'zgarishlarini Server-Sent Events orqali uzatadi (ASGI ostida ishlaydi)"""
+    user = await sync_to_async(_stream_user)(request)
+    if user is None:
+        return JsonResponse({"error": "Avtorizatsiyadan o'tilmagan!"}, status=401)
+    allowed = await sync_to_async(_can_watch_cargo)(user, pk)
+    if allowed is None:
+        return JsonResponse({"error": "Yuk topilmadi!"}, status=404)
+    if not allowed:
+        return JsonResponse({"error": "Bu yukni kuzatishga ruxsat yo'q!"}, status=403)
+
+    async def stream():
+        subscription = get_broker().subscribe(cargo_channel(pk))  # snapshotdan oldin: oradagi xabarlar yo'qolmaydi
+        try:
+            yield _sse(await sync_to_async(_cargo_snapshot)(pk))
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.get(), timeout=settings.TRACKING_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse(message)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx javobni buferlamasin
+    return response
+
+
+
+def _can_view_media(user, name):
+    """Hujjat rasmlari (va ularning nusxalari) faqat xodimlarga va egasining o'ziga ko'rinadi.
+    Qidiruv foydalanuvchi bo'yicha (indeksli), fayl nomi ustunlari bo'yicha emas"""
+    if user.is_staff:
+        return True
+    documents = [
+        *Driver.objects.filter(carrier_id=user.pk).values_list('license_image', 'passport_image'),
+        *OwnerDispatcher.objects.filter(user_id=user.pk).values_list('passport_image'),
+    ]
+    return any(name in row for row in documents)
+
+
+def serve_media(request, path):
+    """
+    MEDIA_URL ostidagi fayllar (hujjat rasmlari): faqat xodimlar (sessiya yoki JWT) va egasi uchun.
+    Fayl tanasini settings.MEDIA_DELIVERY bo'yicha veb-server yuboradi ('x-accel' - nginx
+    X-Accel-Redirect, 'x-sendfile' - Apache/lighttpd), None - Django o'zi (faqat DEBUG da).
+    Rasm nusxasi (main.images) hali yaratilmagan bo'lsa asl fayl beriladi.
+    """
+    if settings.MEDIA_DELIVERY is None and not settings.DEBUG:
+        raise ImproperlyConfigured("Productionda MEDIA_DELIVERY ('x-accel' yoki 'x-sendfile') sozlanishi kerak")
+    user = request.user if request.user.is_authenticated else _stream_user(request)
+    if user is None:
+        return JsonResponse({"error": "Avtorizatsiyadan o'tilmagan!"}, status=401)
+
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    document = original_name(path) or path
+    if not _can_view_media(user, document):
+        return JsonResponse({"error": "Bu faylni ko'rishga ruxsat yo'q!"}, status=403)
+    if not os.path.isfile(full_path):
+        if document == path:
+            raise Http404
+        full_path = safe_join(settings.MEDIA_ROOT, document)  # nusxa hali tayyor emas
+        if not os.path.isfile(full_path):
+            raise Http404
+    path = os.path.relpath(full_path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+    if settings.MEDIA_DELIVERY is None:
+        response = static_serve(request, path, document_root=settings.MEDIA_ROOT)
+    else:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        response = HttpResponse(content_type=content_type or 'application/octet-stream')
+        if settings.MEDIA_DELIVERY == 'x-accel':
+            response['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_PREFIX + path)
+        else:
+            response['X-Sendfile'] = full_path
+    response['Cache-Control'] = 'private'  # shaxsiy hujjatlar umumiy keshlarda saqlanmasin
+    return response